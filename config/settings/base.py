@@ -83,6 +83,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': str(ROOT_DIR.path('dbv2.sqlite3')),
+        # 测试库使用文件而非内存数据库，多线程测试才能正常加锁等待
+        'TEST': {
+            'NAME': str(ROOT_DIR.path('test_dbv2.sqlite3')),
+        },
     }
 }
 
@@ -149,8 +153,78 @@ REST_FRAMEWORK = {
 }
 
 
+# api.check_signature使用的nonce存储，可选DatabaseNonceStore、CacheNonceStore、LocalNonceStore
+# 见project/sua/nonces.py
+
+NONCE_STORE = {
+    'BACKEND': 'project.sua.nonces.DatabaseNonceStore',
+}
+
+# default缓存保存导航栏、学生筛选条件和首页片段，写入数据后由写入的进程使它们失效(project/sua/versions.py)；
+# run_jobs/cron的worker和各个web进程必须共用这个缓存，不能使用LocMemCache等进程内的缓存，
+# 否则其他进程的修改要等缓存到期(FRAGMENT_CACHE_TIMEOUT、NAV_CACHE_TIMEOUT)后才显示。
+# 默认使用同一台机器上各进程共享的文件缓存，多台服务器部署时换成memcached、redis等。
+# nonces为CacheNonceStore使用的缓存，MAX_ENTRIES需大于EXPIRE_TIME内的请求数，否则未过期的nonce会被淘汰
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('DJANGO_CACHE_ROOT', default=str(ROOT_DIR.path('cache'))),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'nonces': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nonces',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000000,
+        },
+    },
+}
+
+STUDENT_FACETS_TIMEOUT = 600  # 学生筛选条件统计的缓存时间(秒)，学生或公益时变化时会立即失效
+NAV_CACHE_TIMEOUT = 3600  # 导航栏中学生信息的缓存时间(秒)，学生或公益时变化时会立即失效，见project/sua/navs.py
+FRAGMENT_CACHE_TIMEOUT = 600  # 首页标签页表格、记录数及公示的缓存时间(秒)，相关记录变化时会立即失效，见project/sua/versions.py
+
+# 公益时记录PDF的字体和学院标志，见project/sua/transcript.py；字体文件不存在时使用reportlab内置的STSong-Light
+TRANSCRIPT_FONT = str(APPS_DIR.path('sua/views/student/STSONG.ttf'))
+TRANSCRIPT_LOGO = str(APPS_DIR.path('sua/static/sua/images/logo-icon.png'))
+TRANSCRIPT_WORKERS = 4  # 批量导出公益时记录时生成PDF的最大进程数(同时不超过CPU核数)
+TRANSCRIPT_SYNC_MAX = 30  # GET在请求中直接导出公益时记录的最大学生数，更多时需要POST提交后台任务
+IMPORT_WORKERS = 4  # 批量导入学生时计算密码哈希的最大进程数，见project/sua/imports.py
+
+# 后台任务队列，见project/sua/jobs.py；由manage.py run_jobs或下面的cron.runJobs执行
+JOBS_EAGER = env.bool('DJANGO_JOBS_EAGER', False)  # 为True时在请求中直接执行任务
+JOB_TIMEOUT = 3600  # 开始后超过此时间(秒)仍未结束的任务视为worker已退出，重新排队
+JOB_RETRY_DELAY = 30  # 第一次重试前等待的秒数，之后每次加倍
+JOB_FILES_ROOT = str(ROOT_DIR('jobs'))  # 任务生成的文件(导出的ZIP等)，只能通过/jobs/<id>/download/下载
+JOB_KEEP_DAYS = 7  # cron.runJobs删除超过此天数的已结束任务及其文件
+
+
 # Cronjobs config
 
 CRONJOBS = [
     ('*/2 * * * *', 'sua.cron.cleanNonce'),
+    ('* * * * *', 'sua.cron.runJobs'),
 ]
+
+NONCE_CLEAN_BATCH_SIZE = 1000  # cleanNonce每次DELETE的最大行数
+
+
+# Logging config
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'project.sua': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
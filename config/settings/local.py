@@ -7,6 +7,8 @@ SECRET_KEY = env(
 
 DEBUG = env.bool('DJANGO_DEBUG', default=True)
 
+JOBS_EAGER = env.bool('DJANGO_JOBS_EAGER', default=True)  # 开发时不需要运行run_jobs
+
 ALLOWED_HOSTS = [
     '172.16.19.130',
     'localhost',
@@ -10,3 +10,4 @@ admin.site.register(SuaGroup)
 admin.site.register(Activity)
 admin.site.register(Publicity)
 admin.site.register(Appeal)
+admin.site.register(Job)
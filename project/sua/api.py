@@ -1,4 +1,5 @@
 from .models import Nonce
+from . import nonces
 import time
 
 EXPIRE_TIME = 120
@@ -12,14 +13,10 @@ def check_signature(request):
         if nonce is None or timestamp is None or signature is None or (int(time.time()) - int(timestamp)) >= EXPIRE_TIME:
             return False
         else:
-            non = Nonce.objects.filter(nonce=int(nonce), timestamp=int(timestamp))
-            if non.count() == 0:
-                non = Nonce.objects.create(nonce=int(nonce), timestamp=int(timestamp))
-                if non.getSignature() == signature:
-                    return True
-                else:
-                    return False
-            else:
+            nonce, timestamp = int(nonce), int(timestamp)
+            # 先校验签名，签名错误的请求不占用nonce
+            if Nonce(nonce=nonce, timestamp=timestamp).getSignature() != signature:
                 return False
+            return nonces.get_store().add(nonce, timestamp, timestamp + EXPIRE_TIME)
     else:
         return False
@@ -6,3 +6,4 @@ class SuaConfig(AppConfig):
 
     def ready(self):
         import project.sua.signals.handlers
+        import project.sua.tasks
@@ -0,0 +1,105 @@
+"""
+为一个活动批量添加参与人(Sua)
+
+BulkSuaSerializer一起校验所有条目：学生用两次查询(id、学号)取出，已参与该活动的学生用一次查询找出，
+条目之间不能重复；add_suas()用bulk_create创建所有Sua，各学生的公益时增量由ledger合并写入。
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from rest_framework import serializers
+
+from project.sua import ledger, versions
+from project.sua.models import Student, Sua
+
+MAX_ENTRIES = 1000  # 每次最多添加的参与人数
+
+
+class SuaEntrySerializer(serializers.Serializer):
+    student = serializers.IntegerField(required=False)  # 学生id
+    number = serializers.IntegerField(required=False)  # 或学号
+    team = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    suahours = serializers.FloatField(min_value=0)
+
+    def validate(self, data):
+        if ('student' in data) == ('number' in data):
+            raise serializers.ValidationError('student和number需要且只能填写一个')
+        return data
+
+
+class BulkSuaSerializer(serializers.Serializer):
+    """
+    {"suas": [{"student": id或"number": 学号, "team": 组别, "suahours": 公益时数}, ...]}，
+    context中需要activity；校验后各条目的student为学生id
+    """
+    suas = SuaEntrySerializer(many=True, allow_empty=False)
+
+    def validate_suas(self, entries):
+        if len(entries) > MAX_ENTRIES:
+            raise serializers.ValidationError('每次最多添加%d人' % MAX_ENTRIES)
+        students = Student.objects.filter(deleted_at=None)
+        ids = set(students.filter(
+            pk__in=[entry['student'] for entry in entries if 'student' in entry]
+        ).values_list('pk', flat=True))
+        numbers = defaultdict(list)
+        for number, pk in students.filter(
+            number__in=[entry['number'] for entry in entries if 'number' in entry]
+        ).values_list('number', 'pk'):
+            numbers[number].append(pk)
+        errors = []
+        for entry in entries:
+            error = {}
+            if 'number' in entry:
+                found = numbers.get(entry['number'], [])
+                if len(found) == 1:
+                    entry['student'] = found[0]
+                else:
+                    error['number'] = ['学号不存在' if not found else '学号对应多个学生']
+            elif entry['student'] not in ids:
+                error['student'] = ['学生不存在']
+            errors.append(error)
+        joined = set(Sua.objects.filter(
+            activity=self.context['activity'],
+            deleted_at=None,
+            student_id__in=[entry['student'] for entry in entries if 'student' in entry],
+        ).values_list('student_id', flat=True))
+        seen = {}
+        for index, (entry, error) in enumerate(zip(entries, errors)):
+            if error:
+                continue
+            field = 'number' if 'number' in entry else 'student'
+            if entry['student'] in joined:
+                error[field] = ['已参与该活动']
+            elif entry['student'] in seen:
+                error[field] = ['与第%d条重复' % (seen[entry['student']] + 1)]
+            else:
+                seen[entry['student']] = index
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return entries
+
+    def create(self, validated_data):
+        return add_suas(self.context['activity'], validated_data['owner'], validated_data['suas'])
+
+
+def add_suas(activity, owner, entries, is_valid=True):
+    """
+    为activity创建entries(校验过的条目)的Sua并更新台账，返回创建的Sua
+    """
+    suas = [
+        Sua(
+            owner=owner,
+            activity=activity,
+            student_id=entry['student'],
+            team=entry.get('team', ''),
+            suahours=entry['suahours'],
+            is_valid=is_valid,
+        )
+        for entry in entries
+    ]
+    with transaction.atomic():
+        deltas = ledger.account_new(suas)
+        Sua.objects.bulk_create(suas)
+        ledger.apply(deltas)
+        versions.bump(Sua)  # bulk_create不发送post_save
+    return suas
@@ -1,11 +1,34 @@
+from django.conf import settings
+from project.sua import jobs
 from project.sua.models import Nonce
 from .api import EXPIRE_TIME
+import logging
+import os
 import time
 
+logger = logging.getLogger('project.sua.cron')
+
 
 def cleanNonce():
-        cleanNonces = Nonce.objects.filter(timestamp__lte=int(time.time())-EXPIRE_TIME)
-        cleanedNonceIDs = []
-        for nonce in cleanNonces:
-            cleanedNonceIDs.append(nonce.pk)
-            nonce.delete()
+        # 按timestamp索引分批删除过期的nonce，每批单独提交，不会长时间占用SQLite的写锁
+        batch_size = getattr(settings, 'NONCE_CLEAN_BATCH_SIZE', 1000)
+        expired = Nonce.objects.filter(timestamp__lte=int(time.time())-EXPIRE_TIME).order_by('timestamp')
+        start = time.perf_counter()
+        purged = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            purged += Nonce.objects.filter(pk__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                break
+        logger.info('cleanNonce: purged %d nonces in %.3fs', purged, time.perf_counter() - start)
+        return purged
+
+
+def runJobs():
+        # 执行积压的后台任务，50秒后不再领取新任务，避免与下一分钟的cron重叠太多
+        count = jobs.work('cron-%d' % os.getpid(), burst=True, time_limit=50)
+        purged = jobs.purge(settings.JOB_KEEP_DAYS)
+        logger.info('runJobs: ran %d jobs, purged %d', count, purged)
+        return count
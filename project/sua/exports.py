@@ -0,0 +1,254 @@
+"""
+按年级、班级(及学年区间)批量导出
+
+transcripts_zip()把筛选出的学生的公益时记录PDF(与Download相同的版式)打包为ZIP，
+PDF在进程池中并行生成(请求中直接导出时在当前进程中生成)，ZIP边生成边输出，不需要先在内存或磁盘中保存整个文件。
+hours_table()生成学生各学年公益时的表格，由csv_chunks()、xlsx_chunks()边读取边输出。
+学生及其Sua、学年汇总分别按学号排序读取后合并，不需要把所有记录读入内存。
+"""
+import csv
+import logging
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Sum
+
+from project.sua import transcript
+from project.sua.models import Sua, StudentYearHours, academic_year_dates
+
+logger = logging.getLogger('project.sua.exports')
+
+CHUNK_SIZE = 2000  # 每次从数据库读取的行数
+
+
+def pool_size(workers, jobs, limit=None):
+    """
+    进程数：不超过limit(默认为settings.TRANSCRIPT_WORKERS)、CPU核数和任务数
+    """
+    limit = limit or settings.TRANSCRIPT_WORKERS
+    workers = min(workers or limit, limit, os.cpu_count() or 1, jobs)
+    return max(workers, 1)
+
+
+def transcripts(students, years=None):
+    """
+    按学号顺序生成每个学生的(学号, 姓名, 公益时总数, 记录)，记录为(活动名称, 活动团体, 公益时数)；
+    years为学年区间(year_begin, year_end)，为None时不限学年。Sua按学生分组流式读取，共三次查询
+    """
+    ids = students.order_by().values('pk')  # 作为子查询，学生较多时也不受参数个数限制
+    suas = Sua.objects.filter(
+        student__in=ids,
+        deleted_at=None,
+        is_valid=True,
+        activity__is_valid=True,
+    )
+    if years is not None:
+        start_date, end_date = academic_year_dates(*years)
+        suas = suas.filter(activity__date__gte=start_date, activity__date__lt=end_date)
+        hours = dict(StudentYearHours.objects.filter(
+            student__in=ids,
+            academic_year__gte=years[0],
+            academic_year__lt=years[1],
+        ).order_by().values('student').annotate(total=Sum('suahours')).values_list('student', 'total'))
+    records = suas.order_by('student__number', 'student_id', 'pk').values_list(
+        'student_id', 'activity__title', 'activity__group', 'suahours',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    students = students.order_by('number', 'pk').values_list('pk', 'number', 'name', 'suahours')
+    for (pk, number, name, total), rows in _join(students, records):
+        if years is not None:
+            total = hours.get(pk) or 0
+        yield number, name, total, rows
+
+
+def _join(parents, children):
+    # parents的第一列为主键，children的第一列为parent的主键，两者按相同的顺序排列；
+    # 依次生成(parent, 该parent的children(去掉第一列))
+    groups = groupby(children, key=itemgetter(0))
+    current = next(groups, None)
+    for parent in parents:
+        rows = []
+        if current is not None and current[0] == parent[0]:
+            rows = [row[1:] for row in current[1]]
+            current = next(groups, None)
+        yield parent, rows
+
+
+class _Chunks(object):
+    # ZipFile的输出，收集写入的数据，由transcripts_zip()分块取出
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def transcripts_zip(students, years=None, workers=None, progress=None, pool=True):
+    """
+    生成ZIP文件的各个分块，每个学生一个"学号_姓名.pdf"。
+    workers为进程数(见pool_size)；progress(done, total)在每完成一个PDF后调用；
+    pool为False时在当前进程中逐个生成(请求中直接导出少量学生时，不在web进程中创建进程池)
+    """
+    total = students.count()
+    transcript.resources()  # 在创建进程前加载，fork出的进程不必再加载
+    out = _Chunks()
+    archive = zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED)  # PDF已经压缩过
+    if not pool:
+        for done, item in enumerate(transcripts(students, years), 1):
+            archive.writestr('%s_%s.pdf' % (item[0], item[1]), transcript.render_pdf(item))
+            if progress is not None:
+                progress(done, total)
+            yield out.pop()
+        archive.close()
+        yield out.pop()
+        return
+    workers = pool_size(workers, total)
+    pool = ProcessPoolExecutor(workers)
+    pending = deque()
+    done = 0
+    logger.info('exporting %d transcripts with %d workers', total, workers)
+    try:
+        data = transcripts(students, years)
+        while True:
+            # 最多同时提交workers*2个任务，其余学生的记录在前面的PDF写入ZIP后再读取
+            for item in data:
+                pending.append(('%s_%s.pdf' % (item[0], item[1]), pool.submit(transcript.render_pdf, item)))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            name, future = pending.popleft()
+            archive.writestr(name, future.result())
+            done += 1
+            if progress is not None:
+                progress(done, total)
+            yield out.pop()
+        archive.close()
+        yield out.pop()
+    finally:
+        for name, future in pending:
+            future.cancel()
+        pool.shutdown()
+
+
+def hours_table(students, years=None):
+    """
+    生成表格的各行：第一行为表头，之后每个学生一行(学号、姓名、班级、年级、各学年公益时、总公益时)。
+    years为学年区间(year_begin, year_end)，为None时列出这些学生有公益时的所有学年
+    """
+    year_hours = StudentYearHours.objects.filter(student__in=students.order_by().values('pk'))
+    if years is not None:
+        columns = list(range(*years))
+        year_hours = year_hours.filter(academic_year__gte=years[0], academic_year__lt=years[1])
+    else:
+        columns = sorted(year_hours.order_by().values_list('academic_year', flat=True).distinct())
+    yield ['学号', '姓名', '班级', '年级'] + ['%d-%d学年' % (year, year + 1) for year in columns] + ['总公益时']
+    students = students.order_by('number', 'pk').values_list(
+        'pk', 'number', 'name', 'classtype', 'grade', 'suahours',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    year_hours = year_hours.order_by('student__number', 'student_id').values_list(
+        'student_id', 'academic_year', 'suahours',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for (pk, number, name, classtype, grade, total), hours in _join(students, year_hours):
+        hours = dict(hours)
+        row = [hours.get(year, 0.0) for year in columns]
+        if years is not None:
+            total = sum(row)
+        yield [number, name, classtype, grade] + row + [total]
+
+
+class _Lines(object):
+    # csv.writer的输出
+    def write(self, line):
+        return line
+
+
+def csv_chunks(rows, size=500):
+    """
+    把rows转换为CSV(UTF-8，带BOM以便Excel识别编码)，每size行输出一次
+    """
+    writer = csv.writer(_Lines())
+    lines = ['\ufeff']
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= size:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    yield ''.join(lines).encode('utf-8')
+
+
+XLSX_FILES = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="xl/workbook.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="公益时" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+     '</Relationships>'),
+)
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return '<c><v>%r</v></c>' % value
+    return '<c t="inlineStr"><is><t>%s</t></is></c>' % escape(XML_INVALID.sub('', str(value)))
+
+
+def xlsx_chunks(rows, size=500):
+    """
+    把rows写成只有一个工作表的XLSX(单元格为数字或内联字符串)，工作表边生成边压缩输出，每size行输出一次
+    """
+    out = _Chunks()
+    archive = zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED)
+    for name, content in XLSX_FILES:
+        archive.writestr(name, content)
+    with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+        sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+        lines = []
+        for row in rows:
+            lines.append('<row>%s</row>' % ''.join(_xlsx_cell(value) for value in row))
+            if len(lines) >= size:
+                sheet.write(''.join(lines).encode('utf-8'))
+                lines = []
+                yield out.pop()
+        sheet.write(''.join(lines).encode('utf-8'))
+        sheet.write(b'</sheetData></worksheet>')
+    archive.close()
+    yield out.pop()
@@ -0,0 +1,110 @@
+"""
+学生列表的筛选条件(年级、班级)及各条件下的学生人数、公益时总数
+
+按(年级, 班级)分组的统计由一条聚合查询得到并保存在默认缓存中；学生的增删改、
+软删除/恢复以及台账更新公益时后调用invalidate()使缓存失效。
+学生列表、添加Sua时的学生选择和导出都通过filter_students()按这些条件筛选学生，
+学生选择的搜索见search_students()。
+"""
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from project.sua import versions
+from project.sua.models import Student
+
+CACHE_KEY = 'sua:student_facets'
+NUMBER_DIGITS = 10  # 学号(IntegerField)最多10位
+NUMBER_RE = re.compile(r'^[0-9]+$')
+
+
+def _compute():
+    rows = Student.objects.filter(deleted_at=None).order_by().values('grade', 'classtype').annotate(
+        students=Count('id'),
+        suahours=Sum('suahours'),
+    ).order_by('grade', 'classtype')
+    return [dict(row) for row in rows]
+
+
+def classes():
+    """
+    每个(年级, 班级)一项：{'grade', 'classtype', 'students', 'suahours'}，按年级、班级排序
+    """
+    rows = cache.get(CACHE_KEY)
+    if rows is None:
+        rows = _compute()
+        cache.set(CACHE_KEY, rows, settings.STUDENT_FACETS_TIMEOUT)
+    return rows
+
+
+def _group(rows, key):
+    groups = OrderedDict()
+    for row in sorted(rows, key=lambda row: row[key]):
+        group = groups.setdefault(row[key], {key: row[key], 'students': 0, 'suahours': 0.0})
+        group['students'] += row['students']
+        group['suahours'] += row['suahours'] or 0.0
+    return list(groups.values())
+
+
+def student_facets():
+    """
+    返回{'classes': classes(), 'grades': [...], 'classtypes': [...]}，
+    grades/classtypes中每项含该年级/班级的学生人数及公益时总数
+    """
+    rows = classes()
+    return {
+        'classes': rows,
+        'grades': _group(rows, 'grade'),
+        'classtypes': _group(rows, 'classtype'),
+    }
+
+
+def filter_students(queryset, params):
+    """
+    按params(request.GET等)中的grade、classtype筛选学生，没有给出的条件不筛选；
+    年级不是整数时返回空的QuerySet
+    """
+    if params.get('grade'):
+        try:
+            queryset = queryset.filter(grade=int(params['grade']))
+        except ValueError:
+            return queryset.none()
+    if params.get('classtype'):
+        queryset = queryset.filter(classtype=params['classtype'])
+    return queryset
+
+
+def _number_prefix(prefix):
+    # 学号以prefix开头即落在某个位数下的区间内，每个区间都可以使用学号索引
+    value = int(prefix)
+    condition = Q()
+    for digits in range(len(prefix), NUMBER_DIGITS + 1):
+        scale = 10 ** (digits - len(prefix))
+        condition |= Q(number__gte=value * scale, number__lt=(value + 1) * scale)
+    return condition
+
+
+def _text_prefix(field, prefix):
+    # 用区间比较代替LIKE，不区分大小写的LIKE在部分数据库上不能使用索引
+    return Q(**{field + '__gte': prefix, field + '__lt': prefix + '\uffff'})
+
+
+def search_students(queryset, query):
+    """
+    按学号前缀(query全为数字时)或姓名、班级的前缀搜索学生，query为空时不筛选
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if NUMBER_RE.match(query):
+        if query.startswith('0') or len(query) > NUMBER_DIGITS:
+            return queryset.none()
+        return queryset.filter(_number_prefix(query))
+    return queryset.filter(_text_prefix('name', query) | _text_prefix('classtype', query))
+
+
+def invalidate():
+    versions.after_commit(lambda: cache.delete(CACHE_KEY))
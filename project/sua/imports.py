@@ -0,0 +1,253 @@
+"""
+从CSV或XLSX文件批量创建学生及其登录用户(用户名为学号)，用于每学年导入新生
+
+import_students()逐行读取并校验文件，每BATCH_SIZE行用一次number__in/username__in查询找出已存在的学号；
+校验通过的行的密码在进程池中计算哈希(PBKDF2，逐个计算800个要一分多钟)，最后在一个事务中分批bulk_create User和Student。
+文件中有格式错误的行时不创建任何学生；已存在或在文件中重复的学号跳过并记在报告中，修改文件后可以重新导入。
+"""
+import codecs
+import csv
+import io
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import fromstring, iterparse
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework import serializers
+
+from project.sua import exports, facets, versions
+from project.sua.models import Student
+
+logger = logging.getLogger('project.sua.imports')
+
+BATCH_SIZE = 500  # 每次检查重复和写入数据库的行数
+HASH_CHUNK = 25  # 每个进程任务计算的密码哈希数
+DEFAULT_PASSWORD = '12345678'  # 与创建学生表单(AddUserSerializer)的默认密码相同
+
+# 表头 -> 字段，表头也可以直接写字段名；与导出的公益时表格(exports.hours_table)的表头一致
+COLUMNS = {
+    '学号': 'number',
+    '姓名': 'name',
+    '班级': 'classtype',
+    '年级': 'grade',
+    '电话': 'phone',
+    '密码': 'password',
+}
+FIELDS = ('number', 'name', 'classtype', 'grade', 'phone', 'password')
+REQUIRED = FIELDS[:4]
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+class StudentRowSerializer(serializers.Serializer):
+    number = serializers.IntegerField(min_value=1)
+    name = serializers.CharField(max_length=100)
+    classtype = serializers.CharField(max_length=100)
+    grade = serializers.IntegerField(min_value=2000, max_value=2100)
+    phone = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    password = serializers.CharField(max_length=128, required=False, allow_blank=True, default='', trim_whitespace=False)
+
+
+def _csv_lines(file):
+    # 不带BOM时先用开头的内容判断是UTF-8还是GB18030(Excel在中文系统中另存的CSV)
+    head = file.read(4096)
+    file.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'gb18030'
+    for line, values in enumerate(csv.reader(io.TextIOWrapper(file, encoding=encoding, newline='')), 1):
+        yield line, values
+
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _xlsx_text(element):
+    # 单元格或共享字符串中所有<t>的文本(带格式的文本分为多段)
+    return ''.join(t.text or '' for t in element.iter(XLSX_NS + 't'))
+
+
+def _xlsx_sheet(archive):
+    # 第一个工作表在压缩包中的路径
+    workbook = archive.read('xl/workbook.xml')
+    rels = archive.read('xl/_rels/workbook.xml.rels')
+    sheet = fromstring(workbook).find('%ssheets/%ssheet' % (XLSX_NS, XLSX_NS))
+    if sheet is None:
+        raise ImportFileError('XLSX文件中没有工作表')
+    rel_id = sheet.get(XLSX_REL_NS + 'id')
+    for rel in fromstring(rels):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    raise ImportFileError('XLSX文件中没有工作表')
+
+
+def _xlsx_lines(archive, sheet):
+    # 逐行解析工作表，处理完的行立即丢弃；共享字符串表需要全部读入
+    shared = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        with archive.open('xl/sharedStrings.xml') as strings:
+            for event, element in iterparse(strings):
+                if element.tag == XLSX_NS + 'si':
+                    shared.append(_xlsx_text(element))
+                    element.clear()
+    with archive.open(sheet) as sheet:
+        line = 0
+        for event, element in iterparse(sheet):
+            if element.tag != XLSX_NS + 'row':
+                continue
+            line = int(element.get('r') or line + 1)
+            values = []
+            for cell in element.iter(XLSX_NS + 'c'):
+                match = XLSX_REF.match(cell.get('r') or '')
+                if match:
+                    column = 0
+                    for letter in match.group(1):
+                        column = column * 26 + ord(letter) - ord('A') + 1
+                    values.extend([''] * (column - 1 - len(values)))
+                kind = cell.get('t')
+                value = cell.find(XLSX_NS + 'v')
+                if kind == 'inlineStr':
+                    values.append(_xlsx_text(cell))
+                elif value is None:
+                    values.append('')
+                elif kind == 's':
+                    values.append(shared[int(value.text)])
+                else:
+                    values.append(value.text or '')
+            element.clear()
+            yield line, values
+
+
+def read_rows(file, name):
+    """
+    按扩展名读取CSV或XLSX(第一个工作表)，依次生成(行号, {字段: 值})，跳过空行，忽略不认识的列
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        lines = _csv_lines(file)
+    elif extension == '.xlsx':
+        try:
+            archive = zipfile.ZipFile(file)
+            sheet = _xlsx_sheet(archive)
+        except (zipfile.BadZipFile, KeyError):
+            raise ImportFileError('不是有效的XLSX文件')
+        lines = _xlsx_lines(archive, sheet)
+    else:
+        raise ImportFileError('只能导入CSV或XLSX文件')
+    fields = None
+    for line, values in lines:
+        values = [value.strip() for value in values]
+        if not any(values):
+            continue
+        if fields is None:
+            fields = [COLUMNS.get(value, value) for value in values]
+            missing = [field for field in REQUIRED if field not in fields]
+            if missing:
+                raise ImportFileError('缺少列：%s' % '、'.join(missing))
+            continue
+        yield line, {field: value for field, value in zip(fields, values) if field in FIELDS}
+
+
+def _hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def import_students(file, name, dry_run=False, workers=None, progress=None):
+    """
+    导入学生，返回报告{rows, valid, created, duplicates, errors}：
+    duplicates为跳过的行[{line, number, reason}]，errors为格式错误的行[{line, errors}]，有errors时不创建学生。
+    dry_run为True时只校验；workers为计算密码哈希的进程数(见exports.pool_size，不超过IMPORT_WORKERS)；
+    progress(done, total)在每计算完一批哈希后调用
+    """
+    report = {'rows': 0, 'valid': 0, 'created': 0, 'duplicates': [], 'errors': []}
+    valid = []
+    seen = {}
+
+    def check(batch):
+        # 一次查询找出这一批中已存在的学号和用户名(软删除的学生仍占用用户名)
+        numbers = [row['number'] for line, row in batch]
+        existing = set(Student.objects.filter(deleted_at=None, number__in=numbers).values_list('number', flat=True))
+        taken = set(User.objects.filter(username__in=[str(number) for number in numbers]).values_list('username', flat=True))
+        for line, row in batch:
+            if row['number'] in existing:
+                report['duplicates'].append({'line': line, 'number': row['number'], 'reason': '学号已存在'})
+            elif str(row['number']) in taken:
+                report['duplicates'].append({'line': line, 'number': row['number'], 'reason': '用户名已被使用'})
+            else:
+                valid.append(row)
+
+    batch = []
+    for line, data in read_rows(file, name):
+        report['rows'] += 1
+        serializer = StudentRowSerializer(data=data)
+        if not serializer.is_valid():
+            report['errors'].append({'line': line, 'errors': serializer.errors})
+            continue
+        row = serializer.validated_data
+        if row['number'] in seen:
+            report['duplicates'].append({'line': line, 'number': row['number'], 'reason': '与第%d行重复' % seen[row['number']]})
+            continue
+        seen[row['number']] = line
+        batch.append((line, row))
+        if len(batch) >= BATCH_SIZE:
+            check(batch)
+            batch = []
+    check(batch)
+    report['valid'] = len(valid)
+    report['duplicates'].sort(key=lambda duplicate: duplicate['line'])
+    if not report['errors'] and not dry_run and valid:
+        report['created'] = _create(valid, workers, progress)
+    logger.info('imported %s: %d rows, %d created, %d duplicates, %d errors', name, report['rows'],
+                report['created'], len(report['duplicates']), len(report['errors']))
+    return report
+
+
+def _create(rows, workers, progress):
+    # 在进程池中计算密码哈希后，在一个事务中分批创建User和Student
+    chunks = [
+        [row['password'] or DEFAULT_PASSWORD for row in rows[start:start + HASH_CHUNK]]
+        for start in range(0, len(rows), HASH_CHUNK)
+    ]
+    passwords = []
+    with ProcessPoolExecutor(exports.pool_size(workers, len(chunks), settings.IMPORT_WORKERS)) as pool:
+        for hashes in pool.map(_hash_passwords, chunks):
+            passwords.extend(hashes)
+            if progress is not None:
+                progress(len(passwords), len(rows))
+    with transaction.atomic():
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            usernames = [str(row['number']) for row in batch]
+            User.objects.bulk_create([
+                User(username=username, password=password)
+                for username, password in zip(usernames, passwords[start:start + BATCH_SIZE])
+            ])
+            # bulk_create在sqlite/MySQL中不返回主键，按用户名(唯一索引)查回
+            users = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+            Student.objects.bulk_create([
+                Student(
+                    user_id=users[username],
+                    number=row['number'],
+                    name=row['name'],
+                    classtype=row['classtype'],
+                    grade=row['grade'],
+                    phone=row['phone'],
+                )
+                for username, row in zip(usernames, batch)
+            ])
+    facets.invalidate()  # bulk_create不发送post_save
+    versions.bump(Student)
+    return len(rows)
@@ -0,0 +1,216 @@
+"""
+保存在数据库(Job表)中的后台任务队列，不需要额外的消息中间件
+
+任务函数用@task(name)登记(见project/sua/tasks.py)，enqueue()保存任务后立即返回，
+由manage.py run_jobs常驻执行，或由cron.runJobs每分钟执行一次积压的任务。
+- 领取任务时用带status条件的UPDATE，多个worker同时运行也不会重复执行同一个任务；
+- 每个任务名有并发数限制(concurrency)，在同一条UPDATE中检查，达到上限时该任务名的其他任务留在队列中；
+- 失败的任务推迟JOB_RETRY_DELAY*2^(n-1)秒后重试，共执行max_attempts次；
+- 开始超过JOB_TIMEOUT秒仍未结束的任务(worker已退出)会重新排队。
+settings.JOBS_EAGER为True时enqueue()直接在当前进程中执行任务(开发环境)。
+"""
+import datetime
+import json
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, connection
+from django.db.models import Count, F, IntegerField, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from project.sua.models import Job
+
+logger = logging.getLogger('project.sua.jobs')
+
+TASKS = {}
+PROGRESS_INTERVAL = 1  # 进度最多每秒写入一次数据库
+
+files = FileSystemStorage(location=settings.JOB_FILES_ROOT)  # 任务生成的文件，不在MEDIA_ROOT中公开
+
+
+class Task(object):
+    def __init__(self, name, func, concurrency, max_attempts):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+
+def task(name, concurrency=1, max_attempts=3):
+    """
+    登记任务函数，函数的参数和返回值都必须可以转换为JSON
+    """
+    def register(func):
+        TASKS[name] = Task(name, func, concurrency, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, owner=None, **arguments):
+    """
+    把任务加入队列，返回Job
+    """
+    job = Job.objects.create(
+        name=name,
+        arguments=json.dumps(arguments),
+        owner=owner,
+        max_attempts=TASKS[name].max_attempts,
+    )
+    if settings.JOBS_EAGER:
+        claimed = claim('eager', pk=job.pk)
+        if claimed is not None:  # 达到并发数上限时留在队列中
+            job = run(claimed)
+    return job
+
+
+def _release_stale(now):
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started__lt=now - datetime.timedelta(seconds=settings.JOB_TIMEOUT),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='timeout', finished=now,
+    )
+    released = stale.update(status=Job.QUEUED, worker='')
+    if released:
+        logger.warning('requeued %d stale jobs', released)
+
+
+def _running(name):
+    # 该任务名正在执行的任务数(子查询)
+    count = Job.objects.filter(name=name, status=Job.RUNNING).order_by().values('name').annotate(
+        count=Count('id'),
+    ).values('count')
+    return Coalesce(Subquery(count, output_field=IntegerField()), 0)
+
+
+def claim(worker, pk=None):
+    """
+    领取一个可以执行的任务并标记为执行中，没有时返回None
+    """
+    now = timezone.now()
+    _release_stale(now)
+    # 先跳过已达到并发数上限的任务名，减少无效的UPDATE；是否领取以下面UPDATE中的检查为准
+    running = Job.objects.filter(status=Job.RUNNING).order_by().values('name').annotate(count=Count('id'))
+    full = [row['name'] for row in running if row['name'] in TASKS and row['count'] >= TASKS[row['name']].concurrency]
+    candidates = Job.objects.filter(status=Job.QUEUED, run_after__lte=now, name__in=list(TASKS)).exclude(name__in=full)
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    for pk, name in candidates.order_by('run_after', 'pk').values_list('pk', 'name')[:10]:
+        # 并发数在同一条UPDATE中检查：多个worker同时领取时不会超过上限
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).annotate(
+            running=_running(name),
+        ).filter(running__lt=TASKS[name].concurrency).update(
+            status=Job.RUNNING, worker=worker, started=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+class _Progress(object):
+    # 当前执行的任务，供progress()写入进度
+    job = None
+    saved = 0
+
+
+def progress(done, total):
+    """
+    在任务函数中报告进度，保存在Job.result中，完成后被任务的返回值替换
+    """
+    job = _Progress.job
+    if job is None or (done < total and time.monotonic() - _Progress.saved < PROGRESS_INTERVAL):
+        return
+    _Progress.saved = time.monotonic()
+    Job.objects.filter(pk=job.pk).update(result=json.dumps({'done': done, 'total': total}))
+
+
+def run(job):
+    """
+    执行claim()领取的任务，保存结果或安排重试
+    """
+    _Progress.job, _Progress.saved = job, 0
+    try:
+        result = TASKS[job.name].func(**json.loads(job.arguments))
+    except Exception:
+        logger.exception('job %s failed (attempt %d/%d)', job, job.attempts, job.max_attempts)
+        job.error = traceback.format_exc()
+        job.worker = ''
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + datetime.timedelta(
+                seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+            job.finished = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.result = json.dumps(result)
+        job.error = ''
+        job.finished = timezone.now()
+    finally:
+        _Progress.job = None
+    job.save(update_fields=['status', 'result', 'error', 'worker', 'run_after', 'finished'])
+    return job
+
+
+def _close_old_connections():
+    # 与请求之间一样关闭出错或超过CONN_MAX_AGE的连接；在事务中调用时(如测试)不关闭
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def work(worker, burst=False, sleep=1, time_limit=None):
+    """
+    循环领取并执行任务。burst为True时队列为空即返回；time_limit(秒)后不再领取新任务。
+    返回执行的任务数
+    """
+    start = time.monotonic()
+    count = 0
+    while time_limit is None or time.monotonic() - start < time_limit:
+        _close_old_connections()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(sleep)
+            continue
+        run(job)
+        count += 1
+    _close_old_connections()
+    return count
+
+
+def status(job):
+    """
+    任务状态的JSON表示，用于轮询
+    """
+    return {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created': job.created,
+        'finished': job.finished,
+    }
+
+
+def purge(days):
+    """
+    删除days天前结束的任务及其生成的文件，返回删除的任务数
+    """
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished__lt=timezone.now() - datetime.timedelta(days=days),
+    )
+    for result in finished.filter(result__startswith='{').values_list('result', flat=True):
+        name = json.loads(result).get('file')
+        if name:
+            files.delete(name)
+    return finished.delete()[0]
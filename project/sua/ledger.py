@@ -0,0 +1,277 @@
+"""
+学生公益时总数台账(Student.suahours)及学年汇总(StudentYearHours)
+
+Student.suahours 保存学生当前有效的公益时总数，StudentYearHours 保存每个学年的
+公益时数和计入的Sua数。两者只在 Sua、Sua 所属活动的有效性/日期或软删除状态发生变化时
+更新；读取时直接使用保存的值，不再临时求和。
+
+Sua.added 记录该Sua当前计入台账的公益时数，始终满足
+Student.suahours == sum(student.suas.added)。
+单个Sua保存时只按 added 的变化对学生行做一次 F() 增量更新(并发保存不会丢失更新)；
+批量变化(活动失效、软删除、恢复)则按学生整体重算，并同步各Sua的 added。
+批量创建的Sua由account_new()合并增量，所有学生的增量写成一条UPDATE。
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractYear
+from django.db.models.query import QuerySet
+
+from project.sua import facets, navs, versions
+from project.sua.models import Student, StudentYearHours, Sua, ACADEMIC_YEAR_BEGIN_MONTH, academic_year_of
+
+_local = threading.local()
+
+
+def valid_suas():
+    """
+    计入公益时总数的Sua：未删除、本身有效且所属活动有效
+    """
+    return Sua.objects.filter(deleted_at=None, is_valid=True, activity__is_valid=True)
+
+
+def _total_expression():
+    total = valid_suas().filter(
+        student=OuterRef('pk')
+    ).order_by().values('student').annotate(
+        total=Sum('suahours')
+    ).values('total')
+    return Coalesce(Subquery(total, output_field=FloatField()), Value(0.0))
+
+
+def _academic_year_expression():
+    return Case(
+        When(
+            activity__date__month__gte=ACADEMIC_YEAR_BEGIN_MONTH,
+            then=ExtractYear('activity__date'),
+        ),
+        default=ExtractYear('activity__date') - 1,
+        output_field=IntegerField(),
+    )
+
+
+def _refresh_year_hours(students):
+    rows = valid_suas().filter(
+        student__in=students
+    ).annotate(
+        academic_year=_academic_year_expression()
+    ).order_by().values('student_id', 'academic_year').annotate(
+        total=Sum('suahours'),
+        activity_count=Count('id'),
+    )
+    StudentYearHours.objects.filter(student__in=students).delete()
+    StudentYearHours.objects.bulk_create([
+        StudentYearHours(
+            student_id=row['student_id'],
+            academic_year=row['academic_year'],
+            suahours=row['total'],
+            activities=row['activity_count'],
+        ) for row in rows
+    ])
+
+
+def _refresh_added(suas):
+    valid = valid_suas().filter(pk__in=suas.values('pk'))
+    valid.update(added=F('suahours'))
+    suas.exclude(pk__in=valid.values('pk')).exclude(added=0.0).update(added=0.0)
+
+
+def refresh_students(student_ids):
+    """
+    重新计算给定学生的公益时总数及学年汇总，返回更新的学生数。
+    student_ids可以是id的集合，也可以是返回学生id的QuerySet(作为子查询使用)
+    """
+    if not isinstance(student_ids, QuerySet):
+        student_ids = set(pk for pk in student_ids if pk is not None)
+        if not student_ids:
+            return 0
+    with transaction.atomic(savepoint=False):
+        count = Student.objects.filter(pk__in=student_ids).update(suahours=_total_expression())
+        _refresh_year_hours(student_ids)
+        _refresh_added(Sua.objects.filter(student__in=student_ids))
+        if isinstance(student_ids, QuerySet):
+            student_ids = Student.objects.filter(pk__in=student_ids).values_list('pk', flat=True)
+        navs.invalidate(student_ids)
+        versions.bump(Student)
+    facets.invalidate()
+    return count
+
+
+def refresh_activities(activity_ids):
+    """
+    重新计算参与了给定活动的所有学生的公益时
+    """
+    activity_ids = set(pk for pk in activity_ids if pk is not None)
+    if not activity_ids:
+        return 0
+    return refresh_students(
+        Sua.objects.filter(activity_id__in=activity_ids).values_list('student_id', flat=True).distinct()
+    )
+
+
+def rebuild():
+    """
+    重建所有学生的公益时台账及学年汇总(用于数据迁移或人工修正)
+    """
+    with transaction.atomic(savepoint=False):
+        count = Student.objects.update(suahours=_total_expression())
+        _refresh_year_hours(Student.objects.all())
+        _refresh_added(Sua.objects.all())
+        navs.invalidate(Student.objects.values_list('pk', flat=True))
+        versions.bump(Student)
+    facets.invalidate()
+    return count
+
+
+class _Deltas(object):
+    def __init__(self):
+        self.students = defaultdict(float)
+        self.years = defaultdict(lambda: [0.0, 0])
+
+    def add(self, student_id, year, hours, count):
+        self.students[student_id] += hours
+        cell = self.years[(student_id, year)]
+        cell[0] += hours
+        cell[1] += count
+
+    def flush(self):
+        students = {pk: hours for pk, hours in self.students.items() if hours}
+        if students:
+            # 所有学生的增量合并为一条UPDATE
+            Student.objects.filter(pk__in=students).update(suahours=F('suahours') + Case(
+                *[When(pk=pk, then=Value(hours)) for pk, hours in students.items()],
+                default=Value(0.0), output_field=FloatField()
+            ))
+            facets.invalidate()
+            navs.invalidate(students)
+            versions.bump(Student)
+        years = defaultdict(dict)
+        for (student_id, year), (hours, count) in self.years.items():
+            if hours or count:
+                years[year][student_id] = hours, count
+        for year, cells in years.items():
+            if len(cells) == 1:
+                student_id, (hours, count) = cells.popitem()
+                _add_year_hours(student_id, year, hours, count)
+            else:
+                _add_year_hours_many(year, cells)
+        self.students.clear()
+        self.years.clear()
+
+
+def _add_year_hours(student_id, year, hours, count):
+    cells = StudentYearHours.objects.filter(student_id=student_id, academic_year=year)
+    if cells.update(suahours=F('suahours') + hours, activities=F('activities') + count):
+        return
+    try:
+        with transaction.atomic():
+            StudentYearHours.objects.create(
+                student_id=student_id, academic_year=year, suahours=hours, activities=count,
+            )
+    except IntegrityError:  # 其他事务同时创建了该学年的记录
+        cells.update(suahours=F('suahours') + hours, activities=F('activities') + count)
+
+
+def _add_year_hours_many(year, cells):
+    # 同一学年多个学生的增量：已有的记录合并为一条UPDATE，其余bulk_create
+    existing = set(StudentYearHours.objects.filter(
+        student_id__in=cells, academic_year=year,
+    ).values_list('student_id', flat=True))
+    if existing:
+        StudentYearHours.objects.filter(student_id__in=existing, academic_year=year).update(
+            suahours=F('suahours') + Case(
+                *[When(student_id=pk, then=Value(cells[pk][0])) for pk in existing],
+                default=Value(0.0), output_field=FloatField()
+            ),
+            activities=F('activities') + Case(
+                *[When(student_id=pk, then=Value(cells[pk][1])) for pk in existing],
+                default=Value(0), output_field=IntegerField()
+            ),
+        )
+    missing = [pk for pk in cells if pk not in existing]
+    try:
+        with transaction.atomic():
+            StudentYearHours.objects.bulk_create([
+                StudentYearHours(student_id=pk, academic_year=year, suahours=cells[pk][0], activities=cells[pk][1])
+                for pk in missing
+            ])
+    except IntegrityError:  # 其他事务同时创建了其中某些记录
+        for pk in missing:
+            _add_year_hours(pk, year, *cells[pk])
+
+
+def _contribution(sua):
+    if sua.deleted_at is None and sua.is_valid and sua.activity.is_valid:
+        return sua.suahours
+    return 0.0
+
+
+def account(sua):
+    """
+    在Sua保存前调用(需要在事务中，见Sua.save)：计算该Sua计入台账的公益时变化并更新sua.added，
+    返回待写入的增量，由apply()在保存后写入
+    """
+    # 先用不改变数据的UPDATE锁住该行(sqlite上select_for_update不加锁，事务中先读后写会直接报database is locked)：
+    # 并发保存同一Sua时后者等前者的事务(Sua.save)提交后才读取added，不会两次按同一个旧值计算增量
+    old = None
+    if sua.pk is not None and Sua.objects.filter(pk=sua.pk).update(added=F('added')):
+        old = Sua.objects.filter(pk=sua.pk).values('student_id', 'added', 'activity__date').first()
+    deltas = _Deltas()
+    added = _contribution(sua)
+    year = academic_year_of(sua.activity.date)
+    if old is not None and old['added']:
+        deltas.add(old['student_id'], academic_year_of(old['activity__date']), -old['added'], -1)
+    if added:
+        deltas.add(sua.student_id, year, added, 1)
+    sua.added = added
+    return deltas
+
+
+def account_new(suas):
+    """
+    在bulk_create新的Sua前调用(bulk_create不发送pre_save/post_save)：
+    设置各sua.added并返回所有Sua合并后的增量，由apply()在创建后写入
+    """
+    deltas = _Deltas()
+    for sua in suas:
+        sua.added = _contribution(sua)
+        if sua.added:
+            deltas.add(sua.student_id, academic_year_of(sua.activity.date), sua.added, 1)
+    return deltas
+
+
+def apply(deltas):
+    """
+    写入account()返回的增量；在batch()中时先合并，事务提交前统一写入
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        deltas.flush()
+        return
+    for student_id, hours in deltas.students.items():
+        pending.students[student_id] += hours
+    for key, (hours, count) in deltas.years.items():
+        cell = pending.years[key]
+        cell[0] += hours
+        cell[1] += count
+
+
+@contextmanager
+def batch(using=None):
+    """
+    在一个事务中保存多个Sua：各Sua的增量在内存中合并，
+    事务提交前每个学生只更新一次
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = _Deltas()
+    try:
+        with transaction.atomic(using=using):
+            yield
+            _local.pending.flush()
+    finally:
+        _local.pending = None
@@ -0,0 +1,41 @@
+"""
+管理命令(explain_dashboard、bench_*)共用的工具：在回滚的事务中准备测试数据，并统计耗时和查询次数
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back(using=None):
+    """
+    在事务中执行，结束时回滚，不会在数据库中留下任何数据
+    """
+    try:
+        with transaction.atomic(using=using):
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def measure(result):
+    """
+    统计代码块的耗时(秒)和查询次数，写入result字典
+    """
+    result['queries'] = 0
+
+    def count(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - start
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework import serializers
+
+from project.sua.management import dataset
+from project.sua.management.benchmark import rolled_back
+from project.sua.models import Application
+from project.sua.read_serializers import ApplicationReadSerializer, DisplayDateTimeField
+from project.sua.serializers import ApplicationSerializer
+import project.sua.views.utils.tools as tools
+
+
+class Command(BaseCommand):
+    help = ('比较申请列表中日期的两种显示处理方式的每行耗时：序列化为ISO字符串后在视图中解析再格式化，'
+            '以及由DisplayDateTimeField直接格式化。测试数据在回滚的事务中生成')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--applications', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            counts = dataset.default_counts(options['applications'])
+            counts['applications'] = options['applications']
+            dataset.populate(counts, prefix='bench-display', seed=options['seed'], rebuild=False)
+            applications = Application.objects.filter(deleted_at=None).order_by('-created')
+            request = RequestFactory().get('/')
+            created = list(applications.values_list('created', flat=True))
+            rows = len(created)
+
+            iso, display = serializers.DateTimeField(), DisplayDateTimeField()
+
+            def reparse():
+                for value in created:
+                    tools.DateTime2String_SHOW(tools.TZString2DateTime(iso.to_representation(value)))
+
+            def format():
+                for value in created:
+                    display.to_representation(value)
+
+            def old_list():
+                data = ApplicationSerializer(applications.all(), many=True, context={'request': request}).data
+                for application in data:
+                    application['created'] = tools.DateTime2String_SHOW(
+                        tools.TZString2DateTime(application['created']))
+
+            def new_list():
+                ApplicationReadSerializer(applications.all(), many=True, context={'request': request}).data
+
+            self.stdout.write('%d applications, best of %d' % (rows, options['repeat']))
+            self.stdout.write('%-44s  %9s  %10s' % ('', 'seconds', 'us/row'))
+            for name, func in (
+                    ('created: ISO + parse + strftime', reparse),
+                    ('created: DisplayDateTimeField', format),
+                    ('list: ApplicationSerializer + view reparse', old_list),
+                    ('list: ApplicationReadSerializer', new_list)):
+                seconds = self.best(func, options['repeat'])
+                self.stdout.write('%-44s  %9.4f  %10.2f' % (name, seconds, seconds / rows * 1e6))
+
+    def best(self, func, repeat):
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,43 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from project.sua import exports
+from project.sua.management import dataset
+from project.sua.management.benchmark import measure, rolled_back
+from project.sua.models import Student
+
+
+class Command(BaseCommand):
+    help = ('统计公益时导出(CSV/XLSX)的耗时、查询次数和Python内存峰值(tracemalloc)，'
+            '依次导出前sizes个学生以比较内存是否随行数增长。测试数据在回滚的事务中生成')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50000)
+        parser.add_argument('--sizes', default='5000,50000', help='逗号分隔的导出学生数')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            counts = dataset.default_counts(options['students'] * 2)
+            counts.update(students=options['students'], applications=0, publicities=1, appeals=0)
+            start = time.perf_counter()
+            dataset.populate(counts, prefix='bench-export', seed=options['seed'])
+            self.stderr.write('dataset: %.1fs' % (time.perf_counter() - start))
+            numbers = Student.objects.filter(deleted_at=None).order_by('number').values_list('number', flat=True)
+            self.stdout.write('%8s  %-6s  %9s  %8s  %12s  %10s' % ('rows', 'format', 'seconds', 'queries', 'bytes', 'peak KiB'))
+            for size in [int(size) for size in options['sizes'].split(',')]:
+                last = numbers[min(size, numbers.count()) - 1]
+                students = Student.objects.filter(deleted_at=None, number__lte=last)
+                for name, chunks in (('csv', exports.csv_chunks), ('xlsx', exports.xlsx_chunks)):
+                    result = {}
+                    written = 0
+                    tracemalloc.start()
+                    with measure(result):
+                        for chunk in chunks(exports.hours_table(students)):
+                            written += len(chunk)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    self.stdout.write('%8d  %-6s  %9.2f  %8d  %12d  %10d' % (
+                        students.count(), name, result['seconds'], result['queries'], written, peak // 1024))
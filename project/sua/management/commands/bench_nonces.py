@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from project.sua import nonces
+from project.sua.api import EXPIRE_TIME
+from project.sua.models import Nonce
+
+BACKENDS = {
+    'local': {'BACKEND': 'project.sua.nonces.LocalNonceStore'},
+    'cache': {'BACKEND': 'project.sua.nonces.CacheNonceStore'},
+    'database': {'BACKEND': 'project.sua.nonces.DatabaseNonceStore'},
+}
+
+
+class Command(BaseCommand):
+    help = '比较各nonce存储每秒可处理的新nonce数，并检查重放的nonce全部被拒绝'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='每个存储写入的nonce数')
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--backends', default=','.join(sorted(BACKENDS)))
+
+    def handle(self, *args, **options):
+        self.stdout.write('%-10s  %8s  %9s  %10s  %s' % ('backend', 'requests', 'seconds', 'ops/s', 'replays'))
+        for name in options['backends'].split(','):
+            if name not in BACKENDS:
+                raise CommandError('unknown backend: %s' % name)
+            store = nonces.create_store(BACKENDS[name])
+            timestamp = int(time.time())
+            try:
+                seconds, accepted = self.run(store, timestamp, options['requests'], options['threads'])
+                replays, rejected = self.run(store, timestamp, options['requests'], options['threads'])
+            finally:
+                if name == 'database':
+                    Nonce.objects.filter(timestamp=timestamp).delete()
+            if accepted != options['requests'] or rejected:
+                raise CommandError('%s: accepted %d new nonces and %d replays' % (name, accepted, rejected))
+            self.stdout.write('%-10s  %8d  %9.3f  %10.0f  rejected' % (
+                name, options['requests'], seconds, options['requests'] / seconds))
+
+    def run(self, store, timestamp, requests, threads):
+        accepted = [0] * threads
+
+        def work(index):
+            try:
+                for nonce in range(index, requests, threads):
+                    accepted[index] += store.add(nonce, timestamp, timestamp + EXPIRE_TIME)
+            finally:
+                if threads > 1:
+                    connection.close()
+
+        start = time.perf_counter()
+        if threads == 1:
+            work(0)
+        else:
+            workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        return time.perf_counter() - start, sum(accepted)
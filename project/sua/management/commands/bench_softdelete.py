@@ -0,0 +1,55 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from project.sua.management.benchmark import measure, rolled_back
+from project.sua.models import Student, Activity, Sua, Proof, Application
+
+
+class Command(BaseCommand):
+    help = '比较逐个软删除与批量软删除一批Sua(含Application)的耗时和查询次数，数据在结束后回滚'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='逗号分隔的Sua数量')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write('%8s  %-10s  %9s  %8s  %s' % ('rows', 'mode', 'seconds', 'queries', 'deleted'))
+        for size in sizes:
+            for mode in ('per-object', 'bulk'):
+                result = {}
+                with rolled_back():
+                    activity = self.populate(size)
+                    queryset = Sua.soft_objects.filter(activity=activity)
+                    with measure(result):
+                        if mode == 'bulk':
+                            deleted = queryset.delete()[0]
+                        else:
+                            deleted = 0
+                            for sua in queryset:
+                                deleted += sua.delete(bulk=False)[0]
+                self.stdout.write('%8d  %-10s  %9.3f  %8d  %d' % (
+                    size, mode, result['seconds'], result['queries'], deleted))
+
+    def populate(self, size):
+        owner = User.objects.create(username='bench-softdelete')
+        User.objects.bulk_create([User(username='bench-softdelete-%d' % i) for i in range(100)])
+        users = User.objects.filter(username__startswith='bench-softdelete-').order_by('pk')
+        Student.objects.bulk_create([
+            Student(user=user, number=800000000 + i, name='', classtype='', grade=2017, phone='')
+            for i, user in enumerate(users)
+        ])
+        students = list(Student.objects.filter(user__in=users).order_by('pk'))
+        activity = Activity.objects.create(
+            owner=owner, title='', detail='', group='', date=datetime.date(2018, 1, 1), is_valid=True)
+        Sua.objects.bulk_create([
+            Sua(owner=owner, student=students[i % len(students)], activity=activity, suahours=1, is_valid=True)
+            for i in range(size)
+        ], batch_size=500)
+        proof = Proof.objects.create(owner=owner, is_offline=True)
+        Application.objects.bulk_create([
+            Application(owner=owner, sua_id=sua_id, proof=proof)
+            for sua_id in Sua.objects.filter(activity=activity).values_list('pk', flat=True)
+        ], batch_size=500)
+        return activity
@@ -0,0 +1,37 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+
+from project.sua import transcript
+
+
+def percentile(timings, percent):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = ('统计公益时记录PDF(project/sua/transcript.py)的渲染耗时：第一次渲染(含加载字体和学院标志)，'
+            '之后每次渲染的p50/p99。不访问数据库')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10,100,500', help='逗号分隔的记录条数')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        font, logo = transcript.resources()
+        self.stdout.write('font %s, resources loaded in %.1f ms' % (font, (time.perf_counter() - start) * 1000))
+        self.stdout.write('%6s  %6s  %9s  %9s  %9s' % ('rows', 'pages', 'bytes', 'p50 ms', 'p99 ms'))
+        for size in [int(size) for size in options['rows'].split(',')]:
+            rows = [('公益活动%d' % i, '志愿者协会', 2.0) for i in range(size)]
+            timings = []
+            for i in range(options['repeat']):
+                out = BytesIO()
+                start = time.perf_counter()
+                transcript.render(out, 2017000001, '学生', 2.0 * size, rows)
+                timings.append(time.perf_counter() - start)
+            self.stdout.write('%6d  %6d  %9d  %9.2f  %9.2f' % (
+                size, len(transcript.pages(rows)), out.tell(),
+                percentile(timings, 50) * 1000, percentile(timings, 99) * 1000))
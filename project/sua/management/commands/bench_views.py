@@ -0,0 +1,132 @@
+import json
+import statistics
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from project.sua.management import dataset
+from project.sua.management.benchmark import measure, rolled_back
+from project.sua.models import Student, Activity, Sua, Application, Publicity, Appeal, Proof
+from project.sua.views.index import tabs
+
+API_LISTS = ('students', 'activities', 'suas', 'applications', 'publicities', 'appeals', 'proofs', 'users')
+
+
+class Command(BaseCommand):
+    help = ('对首页、apis列表、Download、添加Sua、合并申请等页面计时并统计查询次数，输出JSON报告。'
+            '所有请求在回滚的事务中执行')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suas', type=int, default=0,
+            help='先生成指定数量的Sua等测试数据(结束后回滚)；为0时使用generate_dataset已生成的数据',
+        )
+        parser.add_argument('--prefix', default='dataset', help='generate_dataset使用的用户名前缀')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='报告写入的文件，默认输出到标准输出')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options['suas']:
+                samples = dataset.populate(
+                    dataset.default_counts(options['suas']), prefix='bench', seed=options['seed'],
+                )
+            else:
+                samples = self.existing(options['prefix'])
+            report = {
+                'django': django.get_version(),
+                'vendor': connection.vendor,
+                'repeat': options['repeat'],
+                'dataset': self.dataset_counts(),
+                'results': [
+                    self.run(name, user, method, url, data, options['repeat'])
+                    for name, user, method, url, data in self.endpoints(samples)
+                ],
+            }
+        output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def existing(self, prefix):
+        admin = User.objects.filter(username='%s-admin' % prefix).first()
+        if admin is None:
+            raise CommandError('no dataset with prefix "%s", run generate_dataset or pass --suas' % prefix)
+        return {
+            'admin': admin,
+            'student': Student.objects.filter(
+                user__username__startswith='%s-' % prefix, deleted_at=None,
+            ).order_by('-suahours', 'pk').select_related('user').first(),
+            'activity': Activity.objects.filter(
+                owner=admin, deleted_at=None, is_created_by_student=False,
+            ).order_by('pk').first(),
+        }
+
+    def dataset_counts(self):
+        return {
+            model._meta.model_name: {
+                'total': model.objects.count(),
+                'live': model.objects.filter(deleted_at=None).count(),
+            } for model in (Student, Activity, Sua, Application, Proof, Publicity, Appeal)
+        }
+
+    def endpoints(self, samples):
+        admin, student, activity = samples['admin'], samples['student'].user, samples['activity']
+        addable = Student.objects.filter(deleted_at=None).exclude(
+            suas__activity=activity).order_by('pk').first()
+        applications = Application.objects.filter(
+            deleted_at=None, is_checked=False).order_by('created').values_list('pk', flat=True)[:20]
+        endpoints = [
+            ('index (staff)', admin, 'get', '/', None),
+            ('index (student)', student, 'get', '/', None),
+        ]
+        endpoints += [
+            ('tabs/%s' % name, admin, 'get', '/tabs/%s/' % name, None) for name in sorted(tabs.TABS)
+        ]
+        endpoints += [
+            ('apis/%s' % name, admin, 'get', '/apis/%s/' % name, None) for name in API_LISTS
+        ]
+        endpoints += [
+            ('download', student, 'get', '/suas/export/download/', None),
+            ('add sua form', admin, 'get', '/admin/activities/%d/suas/add/' % activity.pk, None),
+            ('student search', admin, 'get', '/admin/activities/%d/suas/students/' % activity.pk, {'q': '9'}),
+        ]
+        if addable is not None:
+            endpoints.append(('add sua', admin, 'post', '/admin/activities/%d/suas/add/' % activity.pk, {
+                'student': 'http://testserver' + reverse('student-detail', args=[addable.pk]),
+                'team': '测试', 'suahours': 1,
+            }))
+        endpoints += [
+            ('merge form', admin, 'get', '/applications/merge', None),
+            ('merge', admin, 'post', '/applications/merge', dict(
+                [(str(pk), 'True') for pk in applications], activity_id=activity.pk,
+            )),
+        ]
+        return endpoints
+
+    def run(self, name, user, method, url, data, repeat):
+        client = Client()
+        client.force_login(user)
+        result = {'name': name, 'method': method.upper(), 'url': url}
+        timings = []
+        for i in range(repeat):
+            run = {}
+            try:
+                with measure(run):
+                    response = getattr(client, method)(url, data)
+                    # 流式响应(如导出的StreamingHttpResponse)的内容在读取时才生成，读取也计入耗时和查询次数
+                    content = b''.join(response.streaming_content) if response.streaming else response.content
+            except Exception as e:
+                result['error'] = '%s: %s' % (type(e).__name__, e)
+                return result
+            timings.append(run['seconds'])
+            result.update(queries=run['queries'], status=response.status_code, bytes=len(content))
+        result.update(seconds_min=min(timings), seconds_median=statistics.median(timings))
+        return result
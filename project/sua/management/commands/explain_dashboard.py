@@ -0,0 +1,81 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from project.sua.management import dataset
+from project.sua.management.benchmark import rolled_back
+from project.sua.models import Student, Activity, Sua, Application, Publicity, Appeal
+
+
+def dashboard_queries():
+    """
+    首页及管理端常用查询，与views中的过滤条件保持一致
+    """
+    now = timezone.now()
+    student = Student.objects.filter(deleted_at=None).order_by('number').first()
+    owner = User.objects.order_by('pk').first()
+    activity = Activity.objects.filter(deleted_at=None).order_by('pk').first()
+    return [
+        ('students', Student.objects.filter(deleted_at=None).order_by('number')),
+        ('students by class', Student.objects.filter(
+            deleted_at=None, classtype='1班', grade=2017).order_by('number')),
+        ('student by number', Student.objects.filter(number=getattr(student, 'number', 0))),
+        ('student suas', Sua.objects.filter(
+            student=student, deleted_at=None, is_valid=True, activity__is_valid=True)),
+        ('activity suas', Sua.objects.filter(activity=activity, deleted_at=None)),
+        ('activities', Activity.objects.filter(
+            deleted_at=None, is_created_by_student=False).order_by('-created')),
+        ('owner activities', Activity.objects.filter(
+            owner=owner, deleted_at=None, is_created_by_student=False).order_by('-created')),
+        ('applications', Application.objects.filter(deleted_at=None).order_by('is_checked', '-created')),
+        ('unchecked applications', Application.objects.filter(
+            deleted_at=None, is_checked=False).order_by('created')),
+        ('user applications', Application.objects.filter(owner=owner, deleted_at=None).order_by('-created')),
+        ('appeals', Appeal.objects.filter(deleted_at=None).order_by('is_checked', '-created')),
+        ('student appeals', Appeal.objects.filter(student=student, deleted_at=None).order_by('-created')),
+        ('publicities', Publicity.objects.filter(
+            deleted_at=None, is_published=True, begin__lte=now, end__gte=now)),
+        ('deleted suas', Sua.objects.exclude(deleted_at=None).order_by('-deleted_at')),
+    ]
+
+
+class Command(BaseCommand):
+    help = '输出首页/管理端查询的EXPLAIN QUERY PLAN，检查是否使用了索引(仅支持SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suas', type=int, default=0,
+            help='先生成指定数量的Sua等测试数据(结束后回滚，不会保留)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN is only supported on SQLite')
+        self.full_scans = 0
+        with rolled_back():
+            if options['suas']:
+                dataset.populate(
+                    dataset.default_counts(options['suas']), prefix='explain',
+                    seed=options['seed'], rebuild=False,
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            self.explain()
+        if self.full_scans:
+            raise CommandError('%d queries use a full table scan' % self.full_scans)
+
+    def explain(self):
+        for name, queryset in dashboard_queries():
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            full_scan = any(
+                step.startswith('SCAN') and 'USING' not in step for step in plan
+            )
+            self.full_scans += full_scan
+            self.stdout.write('%s %s' % ('FULL SCAN' if full_scan else 'INDEX    ', name))
+            for step in plan:
+                self.stdout.write('    ' + step)
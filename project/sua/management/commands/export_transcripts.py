@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from project.sua import exports, facets
+from project.sua.models import Student
+
+
+class Command(BaseCommand):
+    help = '按年级、班级(及学年区间)导出学生的公益时记录PDF，打包为ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='ZIP文件路径，为-时输出到标准输出')
+        parser.add_argument('--grade')
+        parser.add_argument('--classtype')
+        parser.add_argument('--year-begin', type=int)
+        parser.add_argument('--year-end', type=int)
+        parser.add_argument('--workers', type=int, help='生成PDF的进程数，不超过TRANSCRIPT_WORKERS')
+
+    def handle(self, *args, **options):
+        students = facets.filter_students(Student.objects.filter(deleted_at=None), options)
+        years = None
+        if options['year_begin'] is not None:
+            years = options['year_begin'], options['year_end'] or options['year_begin'] + 1
+
+        def progress(done, total):
+            if done == total or done % 50 == 0:
+                self.stderr.write('%d/%d' % (done, total))
+
+        chunks = exports.transcripts_zip(students, years, options['workers'], progress)
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            return
+        with open(options['output'], 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
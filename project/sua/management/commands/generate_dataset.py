@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from project.sua.management import dataset
+
+COUNTS = ('students', 'activities', 'applications', 'publicities', 'appeals')
+
+
+class Command(BaseCommand):
+    help = '生成测试数据(学生、活动、Sua、申请及证明、公示、申诉，含软删除的记录)并写入数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suas', type=int, default=10000)
+        for name in COUNTS:
+            parser.add_argument('--%s' % name, type=int, help='默认按Sua数量估算')
+        parser.add_argument('--deleted-ratio', type=float, default=0.02, help='软删除记录的比例')
+        parser.add_argument('--prefix', default='dataset', help='生成的用户名前缀')
+        parser.add_argument('--number-base', type=int, default=900000000, help='生成的学号起始值')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith='%s-' % options['prefix']).exists():
+            raise CommandError('users with prefix "%s" already exist' % options['prefix'])
+        counts = dataset.default_counts(options['suas'])
+        for name in COUNTS:
+            if options[name] is not None:
+                counts[name] = options[name]
+        with transaction.atomic():
+            samples = dataset.populate(
+                counts, prefix=options['prefix'], number_base=options['number_base'],
+                deleted_ratio=options['deleted_ratio'], seed=options['seed'],
+            )
+        for name, count in sorted(counts.items()):
+            self.stdout.write('%-14s %d' % (name, count))
+        self.stdout.write('admin user     %s' % samples['admin'].username)
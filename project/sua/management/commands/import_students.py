@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.sua import imports
+
+
+class Command(BaseCommand):
+    help = '从CSV或XLSX文件批量创建学生(表头：学号、姓名、班级、年级，可选电话、密码)，已存在的学号跳过'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV或XLSX文件路径')
+        parser.add_argument('--dry-run', action='store_true', help='只校验，不创建学生')
+        parser.add_argument('--workers', type=int, help='计算密码哈希的进程数，不超过IMPORT_WORKERS')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], 'rb') as file:
+                report = imports.import_students(file, options['file'], options['dry_run'], options['workers'])
+        except imports.ImportFileError as error:
+            raise CommandError(error)
+        for error in report['errors']:
+            self.stderr.write('第%d行：%s' % (error['line'], json.dumps(error['errors'], ensure_ascii=False)))
+        for duplicate in report['duplicates']:
+            self.stderr.write('第%d行：%s %s，跳过' % (duplicate['line'], duplicate['number'], duplicate['reason']))
+        self.stdout.write('%d行，%d行有效，创建%d个学生，跳过%d行，%d行有错误' % (
+            report['rows'], report['valid'], report['created'], len(report['duplicates']), len(report['errors'])))
+        if report['errors']:
+            raise CommandError('文件中有错误，没有创建学生')
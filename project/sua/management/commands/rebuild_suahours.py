@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+import project.sua.ledger as ledger
+
+
+class Command(BaseCommand):
+    help = '根据所有有效的Sua重建学生公益时台账(Student.suahours)'
+
+    def handle(self, *args, **options):
+        count = ledger.rebuild()
+        self.stdout.write('rebuilt suahours for %d students' % count)
@@ -0,0 +1,21 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+
+from project.sua import jobs
+
+
+class Command(BaseCommand):
+    help = '执行后台任务队列(project/sua/jobs.py)中的任务；可以同时运行多个，每个任务只会被一个进程执行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='队列为空时退出')
+        parser.add_argument('--sleep', type=float, default=1, help='队列为空时等待的秒数')
+        parser.add_argument('--time-limit', type=float, help='运行指定秒数后不再领取新任务')
+
+    def handle(self, *args, **options):
+        worker = '%s-%d' % (socket.gethostname(), os.getpid())
+        self.stderr.write('worker %s, tasks: %s' % (worker, ', '.join(sorted(jobs.TASKS))))
+        count = jobs.work(worker, options['burst'], options['sleep'], options['time_limit'])
+        self.stderr.write('ran %d jobs' % count)
@@ -0,0 +1,134 @@
+"""
+生成测试数据(explain_dashboard、generate_dataset、bench_views共用)
+
+所有数据用bulk_create写入，用户名以prefix开头，学号从number_base开始；
+按deleted_ratio的比例生成软删除的学生、活动、Sua、申请、公示和申诉。
+bulk_create不会触发信号，最后用ledger.rebuild()重建公益时台账并清除学生筛选条件的缓存。
+"""
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils import timezone
+
+from project.sua import facets, ledger
+from project.sua.models import Student, Activity, Sua, Proof, Application, Publicity, Appeal
+
+BATCH_SIZE = 500
+
+
+def default_counts(suas):
+    """
+    按Sua数量估算其他数据的数量
+    """
+    return {
+        'students': max(suas // 30, 1),
+        'activities': max(suas // 100, 1),
+        'suas': suas,
+        'applications': suas // 10,
+        'publicities': max(suas // 100, 1),
+        'appeals': suas // 100,
+    }
+
+
+def populate(counts, prefix='dataset', number_base=900000000, deleted_ratio=0.02, seed=0, rebuild=True):
+    """
+    按counts(见default_counts)生成数据，返回包含管理员、学生等示例对象的字典
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    def deleted():
+        is_deleted = rng.random() < deleted_ratio
+        return {'deleted': is_deleted, 'deleted_at': now if is_deleted else None}
+
+    admin = User.objects.create(username='%s-admin' % prefix, is_staff=True)
+    User.objects.bulk_create([
+        User(username='%s-%d' % (prefix, i)) for i in range(counts['students'])
+    ], batch_size=BATCH_SIZE)
+    users = User.objects.filter(username__startswith='%s-' % prefix).exclude(pk=admin.pk).order_by('pk')
+    Student.objects.bulk_create([
+        Student(
+            user=user, number=number_base + i, name='学生%d' % i,
+            classtype='%d班' % (i % 4 + 1), grade=2016 + i % 4, phone='', **deleted()
+        ) for i, user in enumerate(users)
+    ], batch_size=BATCH_SIZE)
+    students = list(Student.objects.filter(user__in=users).order_by('pk'))
+    live_students = [student for student in students if not student.deleted]
+
+    Activity.objects.bulk_create([
+        Activity(
+            owner=admin, title='活动%d' % i, detail='', group='', is_valid=i % 5 != 0,
+            date=datetime.date(2016, 9, 1) + datetime.timedelta(days=i % 1000),
+            **deleted()
+        ) for i in range(counts['activities'])
+    ], batch_size=BATCH_SIZE)
+    activities = list(Activity.objects.filter(owner=admin).order_by('pk'))
+
+    def sua(i):
+        # 学生或活动已删除时，Sua也是删除状态(与级联软删除的结果一致)
+        student, activity = rng.choice(students), rng.choice(activities)
+        flags = deleted()
+        if student.deleted or activity.deleted:
+            flags = {'deleted': True, 'deleted_at': now}
+        return Sua(
+            owner=admin, student=student, activity=activity,
+            team='', suahours=rng.randint(1, 8), is_valid=i % 7 != 0, **flags
+        )
+    Sua.objects.bulk_create([sua(i) for i in range(counts['suas'])], batch_size=BATCH_SIZE)
+
+    # 学生提交的申请：每个申请对应学生自己创建的一个活动、一个Sua和一份证明
+    applicants = [rng.choice(live_students) for i in range(counts['applications'])] if live_students else []
+    Activity.objects.bulk_create([
+        Activity(
+            owner_id=student.user_id, title='申请%d' % i, detail='', group='', is_valid=False,
+            date=datetime.date(2016, 9, 1) + datetime.timedelta(days=i % 1000),
+            is_created_by_student=True,
+        ) for i, student in enumerate(applicants)
+    ], batch_size=BATCH_SIZE)
+    applied = Activity.objects.filter(owner__in=users, is_created_by_student=True).order_by('pk')
+    Sua.objects.bulk_create([
+        Sua(
+            owner_id=student.user_id, student=student, activity_id=activity_id,
+            team='', suahours=rng.randint(1, 8), is_valid=False,
+        ) for student, activity_id in zip(applicants, applied.values_list('pk', flat=True))
+    ], batch_size=BATCH_SIZE)
+    Proof.objects.bulk_create([
+        Proof(owner_id=student.user_id, is_offline=i % 2 == 0) for i, student in enumerate(applicants)
+    ], batch_size=BATCH_SIZE)
+    suas = Sua.objects.filter(activity__in=applied).order_by('activity_id').values_list('pk', flat=True)
+    proofs = Proof.objects.filter(owner__in=users).order_by('pk').values_list('pk', flat=True)
+    Application.objects.bulk_create([
+        Application(
+            sua_id=sua_id, owner_id=student.user_id, proof_id=proof_id, contact='',
+            is_checked=i % 2 == 0, **deleted()
+        ) for i, (student, sua_id, proof_id) in enumerate(zip(applicants, suas, proofs))
+    ], batch_size=BATCH_SIZE)
+
+    Publicity.objects.bulk_create([
+        Publicity(
+            owner=admin, activity=activity, title='', content='', is_published=True,
+            begin=activity.date, end=activity.date + datetime.timedelta(days=7), **deleted()
+        ) for activity in activities[:counts['publicities']]
+    ], batch_size=BATCH_SIZE)
+    publicities = list(Publicity.objects.filter(owner=admin))
+    if publicities:
+        Appeal.objects.bulk_create([
+            Appeal(
+                owner_id=student.user_id, student=student, publicity=rng.choice(publicities), **deleted()
+            ) for student in (rng.choice(students) for i in range(counts['appeals']))
+        ], batch_size=BATCH_SIZE)
+
+    if rebuild:
+        ledger.rebuild()
+    facets.invalidate()
+    return {
+        'admin': admin,
+        'student': Student.objects.filter(user__in=users, deleted_at=None).annotate(
+            sua_count=Count('suas')
+        ).order_by('-sua_count', 'pk').select_related('user').first(),
+        'activity': Activity.objects.filter(
+            owner=admin, deleted_at=None, is_created_by_student=False,
+        ).order_by('pk').first(),
+    }
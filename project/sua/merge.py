@@ -0,0 +1,96 @@
+"""
+把选中的申请合并到同一个活动(ApplicationsMergeView、首页的合并表单)
+
+选中申请的Sua用一条UPDATE移动到目标活动，之后不再有有效Sua的学生创建的活动一次性软删除；
+Sua的活动变化可能改变其有效性和所属学年，最后重算相关学生的公益时台账。
+所有修改在一个事务中完成，查询次数只与选中的申请数有关。
+视图通过enqueue_posted()把合并作为后台任务(见tasks.py)提交，不在请求中执行，
+提交后跳转到合并页面的STATUS_URL，页面显示任务的进度和合并报告。
+"""
+import logging
+
+from django.db import transaction
+
+from project.sua import jobs, ledger, versions
+from project.sua.models import Activity, Sua
+
+logger = logging.getLogger('project.sua.merge')
+
+STATUS_URL = '/applications/merge?job=%d'  # 合并任务的状态(ApplicationsMergeView)
+
+
+def posted(data):
+    """
+    合并表单中被勾选的申请id(以申请的id为字段名)和activity_id(为空或'None'时不指定)
+    """
+    application_ids = set(int(key) for key in data.keys() if key.isdigit())
+    activity_id = data.get('activity_id')
+    if activity_id in (None, '', 'None'):
+        activity_id = None
+    return application_ids, activity_id
+
+
+def merge_posted(data):
+    return merge_applications(*posted(data))
+
+
+def enqueue_posted(data, owner):
+    """
+    把合并表单的合并作为后台任务(sua.merge_applications)提交，返回Job
+    """
+    application_ids, activity_id = posted(data)
+    return jobs.enqueue(
+        'sua.merge_applications', owner=owner,
+        application_ids=sorted(application_ids), activity_id=activity_id,
+    )
+
+
+def merge_applications(application_ids, activity_id=None):
+    """
+    把application_ids中未删除申请的Sua移动到activity_id对应的活动；
+    没有指定活动时使用id最小的申请当前所在的活动。
+    返回合并报告：{'activity': 目标活动id, 'applications': 合并的申请id, 'missing': 不存在或已删除的申请id,
+    'moved': 移动的Sua数, 'students': 重算台账的学生数, 'deleted_activities': 软删除的活动id}
+    """
+    application_ids = set(application_ids)
+    with transaction.atomic():
+        rows = list(Sua.objects.filter(
+            deleted_at=None,
+            application__deleted_at=None,
+            application__in=application_ids,
+        ).order_by('application').values_list('pk', 'activity_id', 'student_id', 'application'))
+        found = set(row[3] for row in rows)
+        report = {
+            'activity': None,
+            'applications': sorted(found),
+            'missing': sorted(application_ids - found),
+            'moved': 0,
+            'students': 0,
+            'deleted_activities': [],
+        }
+        if activity_id is not None:
+            activity = Activity.objects.select_for_update().get(pk=activity_id, deleted_at=None)
+        elif rows:
+            activity = Activity.objects.select_for_update().get(pk=rows[0][1])
+        else:
+            return report
+        report['activity'] = activity.pk
+
+        rows = [row for row in rows if row[1] != activity.pk]
+        if rows:
+            report['moved'] = Sua.objects.filter(pk__in=[row[0] for row in rows]).update(activity=activity)
+            versions.bump(Sua)
+            report['students'] = ledger.refresh_students(set(row[2] for row in rows))
+            old_ids = set(row[1] for row in rows)
+            orphans = Activity.objects.filter(
+                pk__in=old_ids,
+                is_created_by_student=True,
+                deleted_at=None,
+            ).exclude(  # 仍有其他未删除Sua的活动保留
+                pk__in=Sua.objects.filter(activity__in=old_ids, deleted_at=None).values('activity_id'),
+            )
+            report['deleted_activities'] = sorted(orphans.values_list('pk', flat=True))
+            if report['deleted_activities']:
+                Activity.soft_objects.filter(pk__in=report['deleted_activities']).delete()
+    logger.info('merged applications: %s', report)
+    return report
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.contrib.auth.models import User, Group
 from django.utils.translation import ugettext as _
@@ -7,6 +7,7 @@ from project.sua.storage import FileStorage
 import datetime
 import hashlib
 from project.sua.softdeletes.models import SoftDeletable
+from project.sua.softdeletes.managers import SoftDeleteQuerySet
 
 YEAR_CHOICES = []
 for r in range(2016, datetime.datetime.now().year):
@@ -14,6 +15,24 @@ for r in range(2016, datetime.datetime.now().year):
 
 EXPIRE_TIME = 86400
 
+ACADEMIC_YEAR_BEGIN_MONTH = 8  # 每个学年从8月1日开始，2017学年即2017-08-01 ~ 2018-07-31
+
+
+def academic_year_of(date):
+    if date.month >= ACADEMIC_YEAR_BEGIN_MONTH:
+        return date.year
+    return date.year - 1
+
+
+def academic_year_dates(year_begin, year_end):
+    """
+    学年year_begin至year_end的日期区间[begin, end)
+    """
+    return (
+        datetime.date(year_begin, ACADEMIC_YEAR_BEGIN_MONTH, 1),
+        datetime.date(year_end, ACADEMIC_YEAR_BEGIN_MONTH, 1),
+    )
+
 """
 实现软删除(需要继承该类)
 通过deleted_at字段保存删除的时间。
@@ -33,6 +52,9 @@ EXPIRE_TIME = 86400
 class BaseSchema(SoftDeletable, models.Model):
     deleted_by = models.CharField(max_length=100, null=True, default=None, blank=True)
 
+    objects = models.Manager()
+    soft_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()  # soft_objects.filter(...).delete()为批量软删除
+
     class Meta:
         abstract = True     #设为抽象基类，否则会出现id字段冲突的情况
 
@@ -55,20 +77,53 @@ class Student(BaseSchema):
     id = models.AutoField(primary_key=True)
     power = models.IntegerField(default=0)  # 0:普通学生  1:活动级管理员
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['number'], name='student_number_idx'),
+            models.Index(fields=['deleted_at', 'number'], name='student_live_number_idx'),
+            models.Index(fields=['deleted_at', 'grade', 'classtype', 'number'], name='student_live_class_idx'),
+            models.Index(fields=['deleted_at', 'name'], name='student_live_name_idx'),
+            models.Index(fields=['deleted_at', 'classtype'], name='student_live_classtype_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def totalhours(self):
-        total = 0
-        for sua in self.suas.filter(deleted_at=None, is_valid=True, activity__is_valid=True,):
-            total += sua.suahours
-        self.suahours = total
-        self.save()
-        return total
+        # suahours由project.sua.ledger维护，这里只读不写
+        return self.suahours
 
     def get_suas(self):
         return self.suas.filter(deleted_at=None, is_valid=True, activity__is_valid=True)
 
+    def hours_between(self, year_begin, year_end):
+        # 学年year_begin至year_end(不含)的公益时总数，直接读取学年汇总表
+        total = self.year_hours.filter(
+            academic_year__gte=year_begin,
+            academic_year__lt=year_end,
+        ).aggregate(total=models.Sum('suahours'))['total']
+        return total or 0
+
+
+class StudentYearHours(models.Model):
+    """
+    学生每个学年的公益时汇总，由project.sua.ledger随Sua的变化维护
+    """
+    student = models.ForeignKey(
+        Student,
+        related_name='year_hours',
+        on_delete=models.CASCADE,
+    )
+    academic_year = models.IntegerField('学年')
+    suahours = models.FloatField(default=0)
+    activities = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'academic_year')
+
+    def __str__(self):
+        return '%s的%d学年公益时' % (self.student, self.academic_year)
+
 
 class SuaGroup(BaseSchema):
     group = models.OneToOneField(
@@ -99,6 +154,12 @@ class Activity(BaseSchema):
     id = models.AutoField(primary_key=True)
     is_created_by_student = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'is_created_by_student', '-created'], name='activity_live_created_idx'),
+            models.Index(fields=['owner', 'deleted_at', '-created'], name='activity_owner_live_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -135,20 +196,23 @@ class Sua(BaseSchema):
     added = models.FloatField(default=0.0)
     is_valid = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'deleted_at', 'is_valid'], name='sua_student_live_idx'),
+            models.Index(fields=['activity', 'deleted_at', 'is_valid'], name='sua_activity_live_idx'),
+            models.Index(fields=['deleted_at'], name='sua_deleted_at_idx'),
+        ]
+
     def __str__(self):
         return self.student.name + '的 ' + self.activity.title
 
-    def clean_suahours(self):
-        self.student.suahours -= self.added
-        self.student.save()
-        self.added = 0.0
-
-    def update_student_suahours(self):
-        if self.added != self.suahours:
-            self.clean_suahours()
-            self.student.suahours += self.suahours
-            self.student.save()
-            self.added = self.suahours
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            super().save(*args, **kwargs)
+            return
+        # 修改已有的Sua时pre_save中锁住该行计算台账增量(ledger.account)，到post_save写入增量后才提交
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
 
     # def delete(self, using=None, keep_parents=False):
     #     self.deleted_at = timezone.now()
@@ -202,6 +266,12 @@ class Application(BaseSchema):
     feedback = models.CharField(max_length=400, blank=True)
     id = models.AutoField(primary_key=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'is_checked', '-created'], name='application_live_check_idx'),
+            models.Index(fields=['owner', 'deleted_at', '-created'], name='application_owner_live_idx'),
+        ]
+
     def __str__(self):
         return self.sua.student.name + '的 ' + self.sua.activity.title + '的 ' + '申请'
 
@@ -239,6 +309,13 @@ class Publicity(BaseSchema):
     begin = models.DateField('开始公示时间', default=timezone.now)
     end = models.DateField('结束公示时间')
     id = models.AutoField(primary_key=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'is_published', 'end', 'begin'], name='publicity_live_period_idx'),
+            models.Index(fields=['activity', 'deleted_at', '-created'], name='publicity_activity_live_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -266,6 +343,12 @@ class Appeal(BaseSchema):
     feedback = models.CharField(max_length=400, blank=True)
     id = models.AutoField(primary_key=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'is_checked', '-created'], name='appeal_live_check_idx'),
+            models.Index(fields=['student', 'deleted_at', '-created'], name='appeal_student_live_idx'),
+        ]
+
     def __str__(self):
         return '对' + str(self.publicity) + '的申诉'
 
@@ -274,8 +357,59 @@ class Nonce(models.Model):
     nonce = models.IntegerField()
     timestamp = models.IntegerField()
 
+    class Meta:
+        unique_together = ('nonce', 'timestamp')  # nonces.DatabaseNonceStore依赖此约束保证原子性
+        indexes = [
+            models.Index(fields=['timestamp'], name='nonce_timestamp_idx'),  # cron.cleanNonce
+        ]
+
     def getSignature(self):
         TOKEN = "test"
         s = bytes(str(self.nonce) + str(self.timestamp) + TOKEN, encoding='utf8')
         signature = hashlib.sha1(s).hexdigest()
         return signature
+
+
+class Job(models.Model):
+    """
+    后台任务，由project.sua.jobs登记、执行(manage.py run_jobs或cron.runJobs)
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, '等待'),
+        (RUNNING, '执行中'),
+        (DONE, '完成'),
+        (FAILED, '失败'),
+    )
+
+    name = models.CharField(max_length=100)  # jobs.task登记的任务名
+    arguments = models.TextField(default='{}')  # JSON
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    result = models.TextField(blank=True)  # JSON
+    error = models.TextField(blank=True)
+    owner = models.ForeignKey(
+        'auth.User',
+        related_name='jobs',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)  # 重试时推迟执行
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_idx'),  # jobs.claim
+            models.Index(fields=['name', 'status'], name='job_name_status_idx'),  # 并发数限制
+        ]
+
+    def __str__(self):
+        return '%s #%d (%s)' % (self.name, self.pk, self.status)
@@ -0,0 +1,61 @@
+"""
+页面导航栏(NavMixin.nav)中的当前用户和学生
+
+用户的字段直接取自request.user；学生的字段(姓名、权限、公益时总数)按学生缓存，用户对应的学生id也缓存，
+显示导航栏不需要查询数据库。缓存中的URL不含域名，读取时按当前请求补全。
+学生保存时(signals/handlers.py)及台账更新公益时总数时(ledger)调用invalidate()。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from project.sua import versions
+from project.sua.models import Student
+from project.sua.read_serializers import NavStudentSerializer, NavUserSerializer
+
+USER_KEY = 'sua:nav:user:%s'  # 用户对应的学生id，没有学生时为0
+STUDENT_KEY = 'sua:nav:student:%s'
+
+
+def _student(user_id):
+    student_id = cache.get(USER_KEY % user_id)
+    if student_id is None:
+        student_id = Student.objects.filter(user_id=user_id).values_list('pk', flat=True).first() or 0
+        cache.set(USER_KEY % user_id, student_id, settings.NAV_CACHE_TIMEOUT)
+    if not student_id:
+        return None
+    data = cache.get(STUDENT_KEY % student_id)
+    if data is None:
+        student = Student.objects.filter(pk=student_id).only('name', 'power', 'suahours').first()
+        data = dict(NavStudentSerializer(student).data) if student is not None else {}
+        cache.set(STUDENT_KEY % student_id, data, settings.NAV_CACHE_TIMEOUT)
+    return data
+
+
+def nav(request):
+    """
+    {'user': {url, id, username, is_staff}, 'student': {url, id, name, power, totalhours}}，
+    未登录或没有学生时为空dict
+    """
+    user = request.user
+    navs = {'user': {}, 'student': {}}
+    if not user.is_authenticated:
+        return navs
+    navs['user'] = NavUserSerializer(user, context={'request': request}).data
+    student = _student(user.pk)
+    if student:
+        navs['student'] = dict(student, url=request.build_absolute_uri(student['url']))
+    return navs
+
+
+def _delete(keys):
+    versions.after_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate(student_ids):
+    keys = [STUDENT_KEY % pk for pk in student_ids]
+    if keys:
+        _delete(keys)
+
+
+def invalidate_user(user_id):
+    _delete([USER_KEY % user_id])
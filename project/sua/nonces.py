@@ -0,0 +1,94 @@
+"""
+api.check_signature使用的nonce存储，用于防止签名请求被重放
+
+每个存储只提供一个原子操作add(nonce, timestamp, expire_at)：nonce未出现过时记录它并
+返回True，否则返回False。记录保留到expire_at(时间戳)为止，之后该请求本身已因超时被拒绝。
+使用哪个存储由settings.NONCE_STORE决定：
+    NONCE_STORE = {
+        'BACKEND': 'project.sua.nonces.CacheNonceStore',
+        'OPTIONS': {'alias': 'nonces'},
+    }
+"""
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+
+from project.sua.models import Nonce
+
+DEFAULT_NONCE_STORE = 'project.sua.nonces.DatabaseNonceStore'
+
+
+class BaseNonceStore(object):
+    def add(self, nonce, timestamp, expire_at):
+        raise NotImplementedError
+
+
+class DatabaseNonceStore(BaseNonceStore):
+    """
+    保存在Nonce表中，由(nonce, timestamp)的唯一约束保证原子性；过期记录由cron.cleanNonce清理
+    """
+    def add(self, nonce, timestamp, expire_at):
+        try:
+            with transaction.atomic():
+                Nonce.objects.create(nonce=nonce, timestamp=timestamp)
+        except IntegrityError:
+            return False
+        return True
+
+
+class CacheNonceStore(BaseNonceStore):
+    """
+    保存在Django缓存中，依赖cache.add的原子性；多进程部署时需使用memcached等共享缓存，
+    且缓存不能在nonce过期前将其淘汰
+    """
+    def __init__(self, alias='nonces', key_prefix='sua:nonce'):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def add(self, nonce, timestamp, expire_at):
+        timeout = max(int(expire_at - time.time()), 1)
+        key = '%s:%d:%d' % (self.key_prefix, nonce, timestamp)
+        return self.cache.add(key, 1, timeout)
+
+
+class LocalNonceStore(BaseNonceStore):
+    """
+    保存在当前进程的内存中，只适用于单进程部署(或测试)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nonces = set()
+        self.expiry = []  # (expire_at, key)组成的堆
+
+    def add(self, nonce, timestamp, expire_at):
+        key = (nonce, timestamp)
+        with self.lock:
+            self.prune(time.time())
+            if key in self.nonces:
+                return False
+            self.nonces.add(key)
+            heapq.heappush(self.expiry, (expire_at, key))
+        return True
+
+    def prune(self, now):
+        while self.expiry and self.expiry[0][0] <= now:
+            self.nonces.discard(heapq.heappop(self.expiry)[1])
+
+
+_store = None
+
+
+def create_store(config):
+    return import_string(config.get('BACKEND', DEFAULT_NONCE_STORE))(**config.get('OPTIONS', {}))
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = create_store(getattr(settings, 'NONCE_STORE', {}))
+    return _store
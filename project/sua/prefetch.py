@@ -0,0 +1,135 @@
+"""
+根据序列化器的字段自动生成select_related/prefetch_related
+
+嵌套的单个序列化器(外键、一对一)使用select_related；嵌套的many=True序列化器使用带查询集的
+Prefetch，并递归规划子序列化器；超链接/主键列表字段(如StudentSerializer.suas)只预取主键；
+反向一对一的超链接字段(如SuaSerializer.application)使用select_related。
+列表序列化器可以用prefetch_filter声明过滤条件(见FilterIsPublishedListSerializer)。
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.query import QuerySet
+from rest_framework import serializers
+
+MAX_DEPTH = 6
+
+
+def _relation(model, attrs):
+    """
+    沿source_attrs找到对应的关系字段，返回(字段, 关联的模型)；不是关系时返回(None, None)
+    """
+    field = None
+    for attr in attrs:
+        if model is None:
+            return None, None
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None, None
+        if not field.is_relation:
+            return None, None
+        model = field.related_model
+    return field, model
+
+
+def _pk_only(field, model):
+    # 只需要关联对象的主键(用于生成url)，反向外键还需要外键列以便分组
+    if field.one_to_many:
+        return model._base_manager.only(model._meta.pk.name, field.field.attname)
+    return model._base_manager.only(model._meta.pk.name)
+
+
+def _walk(serializer, model, prefix, select, prefetch, depth):
+    if depth > MAX_DEPTH:
+        return
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        relation, related_model = _relation(model, field.source_attrs)
+        if relation is None:
+            continue
+        path = prefix + '__'.join(field.source_attrs)
+        if isinstance(field, serializers.ListSerializer):
+            queryset = optimize(related_model._default_manager.all(), field.child, depth + 1)
+            filters = getattr(field, 'prefetch_filter', None)
+            if filters:
+                queryset = queryset.filter(**filters)
+            prefetch.setdefault(path, Prefetch(path, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer):
+            if relation.many_to_one or relation.one_to_one:
+                select.setdefault(path, None)
+                _walk(field, related_model, path + '__', select, prefetch, depth + 1)
+            else:
+                prefetch.setdefault(path, path)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.setdefault(path, Prefetch(path, queryset=_pk_only(relation, related_model)))
+        elif relation.one_to_one and relation.auto_created:
+            select.setdefault(path, None)
+
+
+def plan(serializer, model=None):
+    """
+    返回(select_related路径列表, prefetch_related列表)
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    elif isinstance(serializer, type):
+        serializer = serializer()
+    model = model or serializer.Meta.model
+    select, prefetch = {}, {}
+    _walk(serializer, model, '', select, prefetch, 0)
+    # select_related路径上已经包含的对象不需要再预取
+    return list(select), [lookup for path, lookup in prefetch.items() if path not in select]
+
+
+def optimize(queryset, serializer, depth=0):
+    """
+    为queryset加上serializer需要的select_related/prefetch_related
+    """
+    if depth > MAX_DEPTH:
+        return queryset
+    select, prefetch = plan(serializer, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class PrefetchListSerializer(serializers.ListSerializer):
+    """
+    序列化尚未求值的QuerySet时自动调用optimize()；已经指定了select_related/prefetch_related的不再处理
+    """
+    def to_representation(self, data):
+        if (isinstance(data, QuerySet) and data._result_cache is None and
+                not data._prefetch_related_lookups and not data.query.select_related):
+            data = optimize(data, self.child)
+        return super(PrefetchListSerializer, self).to_representation(data)
+
+
+class PrefetchMixin(object):
+    """
+    序列化器混入类：many=True时默认使用PrefetchListSerializer，Meta.list_serializer_class优先
+    """
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        if hasattr(getattr(cls, 'Meta', None), 'list_serializer_class'):
+            return super(PrefetchMixin, cls).many_init(*args, **kwargs)
+        # 与BaseSerializer.many_init相同地分配参数，只是不修改Meta
+        allow_empty = kwargs.pop('allow_empty', None)
+        list_kwargs = {'child': cls(*args, **kwargs)}
+        if allow_empty is not None:
+            list_kwargs['allow_empty'] = allow_empty
+        list_kwargs.update(
+            (key, value) for key, value in kwargs.items() if key in serializers.LIST_SERIALIZER_KWARGS
+        )
+        return PrefetchListSerializer(*args, **list_kwargs)
+
+
+class PrefetchQuerySetMixin(object):
+    """
+    视图集混入类：get_queryset()按get_serializer_class()自动预取
+    """
+    def get_queryset(self):
+        queryset = super(PrefetchQuerySetMixin, self).get_queryset()
+        return optimize(queryset, self.get_serializer_class())
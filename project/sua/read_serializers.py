@@ -0,0 +1,197 @@
+"""
+页面(模板)使用的只读序列化器
+
+与serializers.py中的同名序列化器字段相同，但不再对每个对象调用reverse()：
+url及指向其他对象的超链接由UrlTemplateField按每个视图名生成一次的URL模板格式化主键，
+反向关系列表(suas、appeals等)只输出主键。
+日期时间字段直接由原生的datetime/date按DATETIME_FORMAT_SHOW/DATE_FORMAT_SHOW格式化，
+视图不需要再解析ISO字符串。
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+
+from project.sua.models import Student, Sua, Application, Activity, Publicity, Appeal
+from project.sua.prefetch import PrefetchMixin
+from project.sua.serializers import FilterIsPublishedListSerializer
+from project.sua.views.utils.tools import DATETIME_FORMAT_SHOW, DATE_FORMAT_SHOW
+
+PK_MARKER = '0PK0'
+
+
+def url_template(field, view_name):
+    """
+    返回view_name对应的URL模板('...%s/')，同一个根序列化器(即同一个列表)内只生成一次
+    """
+    root = field.root
+    templates = root.__dict__.setdefault('_url_templates', {})
+    if view_name not in templates:
+        url = reverse(view_name, kwargs={'pk': PK_MARKER})
+        request = field.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        templates[view_name] = url.replace('%', '%%').replace(PK_MARKER, '%s')
+    return templates[view_name]
+
+
+class UrlTemplateField(serializers.Field):
+    """
+    输出与HyperlinkedIdentityField/HyperlinkedRelatedField相同的URL，source为主键或关联对象
+    """
+    def __init__(self, view_name, **kwargs):
+        self.view_name = view_name
+        kwargs['read_only'] = True
+        super(UrlTemplateField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        return url_template(self, self.view_name) % getattr(value, 'pk', value)
+
+
+class DisplayDateTimeField(serializers.ReadOnlyField):
+    """
+    按format格式化日期时间(转换为当前时区)，用于页面显示
+    """
+    def __init__(self, format=DATETIME_FORMAT_SHOW, **kwargs):
+        self.format = format
+        super(DisplayDateTimeField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime(self.format)
+
+
+class DisplayDateField(DisplayDateTimeField):
+    def __init__(self, format=DATE_FORMAT_SHOW, **kwargs):
+        super(DisplayDateField, self).__init__(format, **kwargs)
+
+
+class ReadModelSerializer(PrefetchMixin, serializers.ModelSerializer):
+    serializer_url_field = UrlTemplateField
+
+    def build_url_field(self, field_name, model_class):
+        field_class, field_kwargs = super(ReadModelSerializer, self).build_url_field(field_name, model_class)
+        field_kwargs['source'] = 'pk'
+        return field_class, field_kwargs
+
+
+class StudentReadSerializer(ReadModelSerializer):
+    user = UrlTemplateField('user-detail', source='user_id')
+
+    class Meta:
+        model = Student
+        fields = ('url', 'user', 'name', 'number', 'suahours', 'totalhours', 'grade', 'classtype', 'phone', 'suas', 'appeals', 'id', 'power', 'deleted_by')
+
+
+class StudentPickerSerializer(ReadModelSerializer):
+    class Meta:
+        model = Student
+        fields = ('url', 'id', 'name', 'number', 'grade', 'classtype')
+
+
+class NavUserSerializer(ReadModelSerializer):
+    # 导航栏及模板中nav.user只用到这些字段，见project/sua/navs.py
+    class Meta:
+        model = User
+        fields = ('url', 'id', 'username', 'is_staff')
+
+
+class NavStudentSerializer(ReadModelSerializer):
+    class Meta:
+        model = Student
+        fields = ('url', 'id', 'name', 'power', 'totalhours')
+
+
+class PublicityWithActivityReadSerializer(ReadModelSerializer):
+    created = DisplayDateTimeField()
+    begin = DisplayDateTimeField()
+    end = DisplayDateTimeField()
+
+    class Meta:
+        model = Publicity
+        list_serializer_class = FilterIsPublishedListSerializer
+        fields = ('url', 'id', 'created', 'title', 'content', 'contact', 'is_published', 'begin', 'end' )
+
+
+class ActivityForAdminReadSerializer(ReadModelSerializer):
+    date = DisplayDateField()
+    publicities = PublicityWithActivityReadSerializer(many=True)
+
+    class Meta:
+        model = Activity
+        fields = ('url', 'title', 'date', 'detail', 'group', 'is_valid', 'suas', 'publicities', 'id')
+
+
+class ActivityReadSerializer(ReadModelSerializer):
+    date = DisplayDateField()
+
+    class Meta:
+        model = Activity
+        fields = ('url', 'title', 'date', 'detail', 'group', 'is_valid', 'suas', 'publicities', 'id', 'is_created_by_student', 'deleted_by')
+
+
+class SuaReadSerializer(ReadModelSerializer):
+    activity = ActivityReadSerializer()
+    student = StudentReadSerializer()
+    application = UrlTemplateField('application-detail')
+
+    class Meta:
+        model = Sua
+        fields = ('url', 'id', 'student', 'activity', 'team', 'suahours', 'application', 'is_valid',)
+
+
+class ApplicationReadSerializer(ReadModelSerializer):
+    created = DisplayDateTimeField()
+    sua = SuaReadSerializer()
+    proof = UrlTemplateField('proof-detail', source='proof_id')
+
+    class Meta:
+        model = Application
+        fields = ('url', 'created', 'contact', 'sua', 'proof', 'is_checked', 'status', 'feedback', 'id', 'deleted_by')
+
+
+class StudentNameNumberReadSerializer(ReadModelSerializer):
+    class Meta:
+        model = Student
+        fields = ('name', 'number')
+
+
+class SuaOnlyReadSerializer(ReadModelSerializer):
+    student = StudentNameNumberReadSerializer()
+
+    class Meta:
+        model = Sua
+        fields = ('student', 'team', 'suahours', 'id')
+
+
+class ActivityWithSuaReadSerializer(ReadModelSerializer):
+    date = DisplayDateField()
+    suas = SuaOnlyReadSerializer(many=True)
+
+    class Meta:
+        model = Activity
+        fields = ('url', 'title', 'date', 'detail', 'group', 'suas', 'id')
+
+
+class PublicityReadSerializer(ReadModelSerializer):
+    created = DisplayDateTimeField()
+    begin = DisplayDateTimeField()
+    end = DisplayDateTimeField()
+    activity = ActivityWithSuaReadSerializer()
+
+    class Meta:
+        model = Publicity
+        fields = ('url', 'id', 'activity', 'created', 'title', 'content', 'is_published', 'begin', 'end', 'appeals')
+
+
+class AppealReadSerializer(ReadModelSerializer):
+    created = DisplayDateTimeField()
+    publicity = PublicityReadSerializer()
+    student = StudentReadSerializer()
+
+    class Meta:
+        model = Appeal
+        fields = ('url', 'created', 'student', 'publicity', 'content', 'is_checked', 'status', 'feedback', 'id', 'deleted_by')
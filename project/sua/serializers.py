@@ -1,41 +1,47 @@
 from django.contrib.auth.models import User, Group
+from django.db import models
 from project.sua.models import Student, SuaGroup, Sua, Application, Activity, Publicity, Appeal, Proof
 
 from rest_framework import serializers
+from project.sua.prefetch import PrefetchMixin, PrefetchListSerializer
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     password = serializers.CharField(write_only=True)
     class Meta:
         model = User
         fields = ('url', 'id', 'student', 'username', 'is_staff', 'password', 'groups', 'applications', )
 
 
-class GroupSerializer(serializers.HyperlinkedModelSerializer):
+class GroupSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Group
         fields = ('url', 'id', 'suagroup', 'name', 'user_set')
 
 
-class StudentSerializer(serializers.HyperlinkedModelSerializer):
+class StudentSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Student
         fields = ('url', 'user', 'name', 'number', 'suahours', 'totalhours', 'grade', 'classtype', 'phone', 'suas', 'appeals', 'id', 'power', 'deleted_by')
+        read_only_fields = ('suahours',)  # 由台账(project.sua.ledger)维护
 
 
-class SuaGroupSerializer(serializers.HyperlinkedModelSerializer):
+class SuaGroupSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = SuaGroup
         fields = ('url', 'id', 'group', 'name', 'is_staff', 'contact', 'rank')
 
 
-class FilterIsPublishedListSerializer(serializers.ListSerializer):
+class FilterIsPublishedListSerializer(PrefetchListSerializer):
+    prefetch_filter = {'deleted_at': None, 'is_published': True}  # 预取时直接过滤
+
     def to_representation(self, data):
-        data = data.filter(deleted_at=None,is_published=True)
+        data = data.all() if isinstance(data, models.Manager) else data
+        data = [publicity for publicity in data if publicity.deleted_at is None and publicity.is_published]
         return super(FilterIsPublishedListSerializer, self).to_representation(data)
 
 
-class PublicityWithActivitySerializer(serializers.HyperlinkedModelSerializer):
+class PublicityWithActivitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Publicity
@@ -43,7 +49,7 @@ class PublicityWithActivitySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'id', 'created', 'title', 'content', 'contact', 'is_published', 'begin', 'end' )
 
 
-class ActivityForAdminSerializer(serializers.HyperlinkedModelSerializer):
+class ActivityForAdminSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     publicities = PublicityWithActivitySerializer(many=True)
 
     class Meta:
@@ -51,19 +57,19 @@ class ActivityForAdminSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'title', 'date', 'detail', 'group', 'is_valid', 'suas', 'publicities', 'id')
 
 
-class ActivitySerializer(serializers.HyperlinkedModelSerializer):
+class ActivitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     #publicities = PublicityWithActivitySerializer()
 
     class Meta:
         model = Activity
         fields = ('url', 'title', 'date', 'detail', 'group', 'is_valid', 'suas', 'publicities', 'id', 'is_created_by_student', 'deleted_by')
 
-class ProofSerializer(serializers.HyperlinkedModelSerializer):
+class ProofSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Proof
         fields = ('url', 'is_offline', 'proof_file', 'applications')
 
-class SuaSerializer(serializers.HyperlinkedModelSerializer):
+class SuaSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     activity = ActivitySerializer()
     student = StudentSerializer()
 
@@ -72,20 +78,20 @@ class SuaSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'id', 'student', 'activity', 'team', 'suahours', 'application', 'is_valid',)
 
 
-class StudentNameNumberSerializer(serializers.ModelSerializer):
+class StudentNameNumberSerializer(PrefetchMixin, serializers.ModelSerializer):
     class Meta:
         model = Student
         fields = ('name', 'number')
 
 
-class SuaOnlySerializer(serializers.ModelSerializer):
+class SuaOnlySerializer(PrefetchMixin, serializers.ModelSerializer):
     student = StudentNameNumberSerializer()
     class Meta:
         model = Sua
         fields = ('student', 'team', 'suahours','id')
 
 
-class ActivityWithSuaSerializer(serializers.ModelSerializer):
+class ActivityWithSuaSerializer(PrefetchMixin, serializers.ModelSerializer):
     suas = SuaOnlySerializer(many=True)
 
     class Meta:
@@ -93,14 +99,14 @@ class ActivityWithSuaSerializer(serializers.ModelSerializer):
         fields = ('url', 'title', 'date', 'detail', 'group', 'suas', 'id')
 
 
-class ApplicationSerializer(serializers.HyperlinkedModelSerializer):
+class ApplicationSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     sua = SuaSerializer()
     class Meta:
         model = Application
         fields = ('url', 'created', 'contact', 'sua', 'proof', 'is_checked', 'status', 'feedback', 'id', 'deleted_by')
 
 
-class PublicitySerializer(serializers.HyperlinkedModelSerializer):
+class PublicitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     activity = ActivityWithSuaSerializer()
 
     class Meta:
@@ -108,7 +114,7 @@ class PublicitySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url','id', 'activity','created', 'title', 'content', 'is_published', 'begin', 'end', 'appeals')
 
 
-class AppealSerializer(serializers.HyperlinkedModelSerializer):
+class AppealSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     publicity = PublicitySerializer()
     student = StudentSerializer()
 
@@ -117,13 +123,13 @@ class AppealSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'created', 'student', 'publicity', 'content', 'is_checked', 'status', 'feedback', 'id', 'deleted_by')
 
 
-class AddAppealSerializer(serializers.HyperlinkedModelSerializer):
+class AddAppealSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Appeal
         fields = ('url', 'content',)
 
-class ActivityforApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class ActivityforApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Activity
@@ -2,17 +2,89 @@ from django.db.models.signals import pre_save, post_save, pre_delete, post_delet
 from django.db.models.signals import m2m_changed
 from django.dispatch import receiver
 from project.sua.models import Sua, Student, Application, Activity
+from project.sua.softdeletes.signals import post_restore, post_soft_delete
+import project.sua.facets as facets
+import project.sua.navs as navs
+import project.sua.versions as versions
+import project.sua.ledger as ledger
 
 
 @receiver(pre_save, sender=Sua, dispatch_uid="Sua_pre_save")
-def Sua_pre_save_handler(sender, **kwargs):
-    sua = kwargs['instance']
-    print('handling sua save')
-    if sua.is_valid:
-        sua.update_student_suahours()
-    else:
-        if sua.added != 0.0:
-            sua.clean_suahours()
+def Sua_pre_save_handler(sender, instance, raw=False, **kwargs):
+    # 计算本次保存对台账的增量(同时更新instance.added)，保存成功后再写入
+    instance._ledger_deltas = None if raw else ledger.account(instance)
+
+
+@receiver(post_save, sender=Sua, dispatch_uid="Sua_post_save")
+def Sua_post_save_handler(sender, instance, raw=False, **kwargs):
+    deltas = getattr(instance, '_ledger_deltas', None)
+    if raw or deltas is None:
+        return
+    instance._ledger_deltas = None
+    ledger.apply(deltas)
+
+
+@receiver(post_delete, sender=Sua, dispatch_uid="Sua_post_delete")
+def Sua_post_delete_handler(sender, instance, **kwargs):
+    if instance.deleted:  # 软删除由post_soft_delete统一处理
+        return
+    ledger.refresh_students([instance.student_id])
+
+
+@receiver(post_soft_delete, sender=Sua, dispatch_uid="Sua_post_soft_delete")
+def Sua_post_soft_delete_handler(sender, instances, **kwargs):
+    ledger.refresh_students(set(sua.student_id for sua in instances))
+
+
+@receiver(post_restore, sender=Sua, dispatch_uid="Sua_post_restore")
+def Sua_post_restore_handler(sender, queryset, **kwargs):
+    ledger.refresh_students(queryset.values('student_id'))
+
+
+@receiver(pre_save, sender=Activity, dispatch_uid="Activity_pre_save")
+def Activity_pre_save_handler(sender, instance, raw=False, **kwargs):
+    # 只有活动的有效性、日期(决定学年)或删除状态变化时才需要更新参与学生的台账
+    instance._ledger_changed = False
+    if instance.pk is None or raw:
+        return
+    old = Activity.objects.filter(pk=instance.pk).values('is_valid', 'date', 'deleted').first()
+    instance._ledger_changed = old is not None and (
+        old['is_valid'] != instance.is_valid or
+        old['date'] != instance.date or
+        old['deleted'] != instance.deleted
+    )
+
+
+@receiver(post_save, sender=Activity, dispatch_uid="Activity_post_save")
+def Activity_post_save_handler(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_ledger_changed', False):
+        ledger.refresh_activities([instance.pk])
+
+
+@receiver(post_save, sender=Student, dispatch_uid="Student_nav_post_save")
+def Student_nav_post_save_handler(sender, instance, created=False, **kwargs):
+    navs.invalidate([instance.pk])
+    if created:
+        navs.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Student, dispatch_uid="Student_post_save")
+@receiver(post_delete, sender=Student, dispatch_uid="Student_post_delete")
+@receiver(post_soft_delete, sender=Student, dispatch_uid="Student_post_soft_delete")
+@receiver(post_restore, sender=Student, dispatch_uid="Student_post_restore")
+def Student_changed_handler(sender, **kwargs):
+    facets.invalidate()
+
+
+def Versioned_changed_handler(sender, **kwargs):
+    versions.bump(sender)
+
+
+# versions.MODELS中的模型保存、删除、软删除、恢复时更新版本号
+for model in versions.MODELS:
+    for name, signal in (('post_save', post_save), ('post_delete', post_delete),
+                         ('post_soft_delete', post_soft_delete), ('post_restore', post_restore)):
+        signal.connect(Versioned_changed_handler, sender=model, dispatch_uid='%s_version_%s' % (model.__name__, name))
 
 
 # @receiver(pre_delete, sender=Sua, dispatch_uid="Sua_pre_delete")
@@ -1,10 +1,18 @@
 class SoftDeleteQuerySetMixin:
 
-    def delete(self):
+    def delete(self, time=None, bulk=True, send_signals=True):
+        """
+        Soft deletes the whole queryset: the cascade is collected once and every model is
+        marked deleted in one pass, see SoftDeletable.delete for the arguments.
+        """
+        from .models import SoftDeleteCollector
+
         assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with delete."
-        for obj in self.all():
-            obj.delete()
+        collector = SoftDeleteCollector(using=self.db)
+        collector.collect(self.filter(deleted=False) if bulk else self.all())
+        result = collector.soft_delete(time=time, bulk=bulk, send_signals=send_signals)
         self._result_cache = None
+        return result
     delete.alters_data = True
 
 
@@ -1,10 +1,13 @@
 from collections import OrderedDict, Counter
 from operator import attrgetter
 
-from django.db import models, router, transaction
-from django.db.models import signals
+from django.db import connections, models, router, transaction
+from django.db.models import Q, signals
+from django.db.models.deletion import get_candidate_relations_to_delete
 from django.utils import timezone
 
+from .signals import post_restore, post_soft_delete
+
 
 class SoftDeletable(models.Model):
     deleted = models.BooleanField(default=False)
@@ -13,79 +16,24 @@ class SoftDeletable(models.Model):
     class Meta:
         abstract = True
 
-    def sort(self):
-        sorted_models = []
-        concrete_models = set()
-        models = list(self.collector.data)
-        while len(sorted_models) < len(models):
-            found = False
-            for model in models:
-                if model in sorted_models:
-                    continue
-                dependencies = self.collector.dependencies.get(model._meta.concrete_model)
-                if not (dependencies and dependencies.difference(concrete_models)):
-                    sorted_models.append(model)
-                    concrete_models.add(model._meta.concrete_model)
-                    found = True
-            if not found:
-                return
-        self.collector.data = OrderedDict((model, self.collector.data[model])
-                                  for model in sorted_models)
-
-    def delete(self, using=None, keep_parents=False, time=None, final=False):
+    def delete(self, using=None, keep_parents=False, time=None, final=False, bulk=True, send_signals=True):
+        """
+        Soft deletes the object and everything that would be cascade deleted along with it.
+        With bulk=True every model is marked deleted with one UPDATE ... WHERE pk IN (...),
+        otherwise each instance is saved on its own. send_signals controls the per instance
+        pre_delete/post_delete signals; post_soft_delete is always sent once per model.
+        """
         if final:
             super().delete()
             return None
-        if time is None:
-            time = timezone.now()
 
         using = using or router.db_for_write(self.__class__, instance=self)
-        deleted_counter = Counter()
         assert self._get_pk_val() is not None, (
                 "{0} object can't be deleted because its {1} attribute is set to None.".format(self._meta.object_name, self._meta.pk.attname))
 
-        self.collector = models.deletion.Collector(using=using) 
+        self.collector = SoftDeleteCollector(using=using)
         self.collector.collect([self], keep_parents=keep_parents)
-
-        # sort instance collections
-        for model, instances in self.collector.data.items():
-            instances_to_delete = sorted(instances, key=attrgetter("pk"))
-
-        self.sort()
-
-        with transaction.atomic(using=using, savepoint=False):
-            # send pre_delete signals
-            for model, obj in self.collector.instances_with_model():
-                if not model._meta.auto_created:
-                    signals.pre_delete.send(sender=model, instance=obj, using=using)
-
-            # fast deletes
-            for qs in self.collector.fast_deletes:
-                # TODO make sure the queryset delete has been made a soft delete
-                for qs_instance in qs:
-                    deleted_counter.update([qs_instance._meta.model_name])
-                    qs_instance._delete(time=time)
-
-
-            for model, instances in self.collector.data.items():
-                for instance in instances:
-                    deleted_counter.update([instance._meta.model_name])
-                    instance._delete(time=time)
-                    if not model._meta.auto_created:
-                        signals.post_delete.send(
-                            sender=model, instance=obj, using=using
-                        )
-
-        # update collected instances
-        for model, instances_for_fieldvalues in self.collector.field_updates.items():
-            for (field, value), instances in instances_for_fieldvalues.items():
-                for obj in instances:
-                    setattr(obj, field.attname, value)
-
-        for model, instances in self.collector.data.items():
-            for instance in instances:
-                setattr(instance, model._meta.pk.attname, None)
-        return sum(deleted_counter.values()), dict(deleted_counter)
+        return self.collector.soft_delete(time=time, bulk=bulk, send_signals=send_signals)
 
     def _delete(self, time=None):
         self.deleted = True
@@ -109,37 +57,149 @@ class SoftDeletable(models.Model):
                 return False
         return False
 
+    @classmethod
+    def cascade_lookups(cls):
+        """
+        Models reached from this one through CASCADE relations, each with the lookups
+        that lead from its rows back to a pk of this model, e.g. for Activity:
+        [(Activity, ['pk']), (Sua, ['activity']), (Application, ['sua__activity']), ...]
+        """
+        lookups = OrderedDict([(cls, ['pk'])])
+        queue = [(cls, '', (cls, ))]
+        while queue:
+            model, path, chain = queue.pop(0)
+            for related in get_candidate_relations_to_delete(model._meta):
+                if related.field.remote_field.on_delete is not models.CASCADE:
+                    continue
+                child = related.related_model
+                if child in chain:
+                    continue
+                child_path = related.field.name + ('__' + path if path else '')
+                lookups.setdefault(child, []).append(child_path)
+                queue.append((child, child_path, chain + (child, )))
+        return [(model, paths) for model, paths in lookups.items() if issubclass(model, SoftDeletable)]
+
     def full_restore(self, using=None):
+        """
+        Restores itself, as well as objects that were deleted along with it if cascade is the
+        deletion strategy. Rows are found by the deleted_at timestamp they share with this
+        object, so each cascade model is restored with one UPDATE.
+        """
         using = using or router.db_for_write(self.__class__, instance=self)
         restore_counter = Counter()
-        if self.deleted:
-            time = self.deleted_at
-        else:
-            return restore_counter
-        self.collector = models.deletion.Collector(using=using)
-        self.collector.collect([self])
-        
+        if not self.deleted:
+            return 0, {}
+        time = self.deleted_at
+
+        with transaction.atomic(using=using, savepoint=False):
+            for model, paths in self.cascade_lookups():
+                condition = Q()
+                for path in paths:
+                    condition |= Q(**{path: self.pk})
+                queryset = model._base_manager.using(using).filter(condition)
+                count = queryset.filter(deleted=True, deleted_at=time).update(deleted=False, deleted_at=None)
+                if count:
+                    restore_counter[model._meta.model_name] += count
+                    post_restore.send(sender=model, queryset=queryset, time=time, using=using)
+
+        self.deleted = False
+        self.deleted_at = None
+        return sum(restore_counter.values()), dict(restore_counter)
+
+
+class SoftDeleteCollector(models.deletion.Collector):
+    """
+    Collects the cascade like Django's Collector, but marks rows as deleted instead of removing them.
+    """
+
+    def sort(self):
+        sorted_models = []
+        concrete_models = set()
+        models = list(self.data)
+        while len(sorted_models) < len(models):
+            found = False
+            for model in models:
+                if model in sorted_models:
+                    continue
+                dependencies = self.dependencies.get(model._meta.concrete_model)
+                if not (dependencies and dependencies.difference(concrete_models)):
+                    sorted_models.append(model)
+                    concrete_models.add(model._meta.concrete_model)
+                    found = True
+            if not found:
+                return
+        self.data = OrderedDict((model, self.data[model])
+                                  for model in sorted_models)
+
+    def soft_delete(self, time=None, bulk=True, send_signals=True):
+        if time is None:
+            time = timezone.now()
+        using = self.using
+        deleted_counter = Counter()
 
-        for model, instances in self.collector.data.items():
-            instances_to_delete = sorted(instances, key=attrgetter("pk"))
+        # only soft deletable rows are marked, other cascades (e.g. derived tables) are kept
+        for model in list(self.data):
+            if not issubclass(model, SoftDeletable):
+                del self.data[model]
+            else:
+                instances = sorted(self.data[model], key=attrgetter("pk"))
+                if bulk:
+                    instances = [instance for instance in instances if not instance.deleted]
+                self.data[model] = instances
 
         self.sort()
 
-        for qs in self.collector.fast_deletes:
-            # TODO make sure the queryset delete has been made a soft delete
-            for qs_instance in qs:
-                restore_counter.update([qs_instance._meta.model_name])
-                qs_instance.restore(time=time)
+        with transaction.atomic(using=using, savepoint=False):
+            # send pre_delete signals
+            if send_signals:
+                for model, obj in self.instances_with_model():
+                    if not model._meta.auto_created:
+                        signals.pre_delete.send(sender=model, instance=obj, using=using)
 
-        for model, instances in self.collector.data.items():
-            for instance in instances:
-                restore_counter.update([instance._meta.model_name])
-                instance.restore(time=time)
+            # fast deletes
+            for qs in self.fast_deletes:
+                if not issubclass(qs.model, SoftDeletable):
+                    continue
+                if bulk:
+                    count = qs.filter(deleted=False).update(deleted=True, deleted_at=time)
+                    if count:
+                        deleted_counter[qs.model._meta.model_name] += count
+                    continue
+                for qs_instance in qs:
+                    deleted_counter.update([qs_instance._meta.model_name])
+                    qs_instance._delete(time=time)
 
-        return sum(restore_counter.values()), dict(restore_counter)
+            for model, instances in self.data.items():
+                if not instances:
+                    continue
+                if bulk:
+                    pks = [instance.pk for instance in instances]
+                    batch_size = connections[using].ops.bulk_batch_size(['pk'], pks) or len(pks)
+                    for i in range(0, len(pks), batch_size):
+                        count = model._base_manager.using(using).filter(
+                            pk__in=pks[i:i + batch_size]
+                        ).update(deleted=True, deleted_at=time)
+                        deleted_counter[model._meta.model_name] += count
+                    for instance in instances:
+                        instance.deleted = True
+                        instance.deleted_at = time
+                else:
+                    for instance in instances:
+                        deleted_counter.update([instance._meta.model_name])
+                        instance._delete(time=time)
+                if send_signals and not model._meta.auto_created:
+                    for instance in instances:
+                        signals.post_delete.send(
+                            sender=model, instance=instance, using=using
+                        )
+                post_soft_delete.send(
+                    sender=model, instances=instances, time=time, using=using
+                )
 
-        """
-        Restores itself, as well as objects that might have been deleted along with it if cascade is the deletion strategy
-        """
-        self.collector = models.deletion.Collector(using=using) 
-        self.collector.collect([self], keep_parents=keep_parents)
+        # update collected instances
+        for model, instances_for_fieldvalues in self.field_updates.items():
+            for (field, value), instances in instances_for_fieldvalues.items():
+                for obj in instances:
+                    setattr(obj, field.attname, value)
+
+        return sum(deleted_counter.values()), dict(deleted_counter)
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# 软删除完成后，每个model发送一次，instances为该model被删除的实例
+post_soft_delete = Signal(providing_args=['instances', 'time', 'using'])
+
+# 级联恢复完成后，每个model发送一次，queryset为该model属于被恢复对象级联范围内的记录
+post_restore = Signal(providing_args=['queryset', 'time', 'using'])
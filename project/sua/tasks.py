@@ -0,0 +1,46 @@
+"""
+后台任务(见project/sua/jobs.py)，在SuaConfig.ready()中登记
+"""
+import os
+
+from project.sua import exports, facets, imports, jobs, merge
+from project.sua.models import Student
+
+
+@jobs.task('sua.export_transcripts')
+def export_transcripts(grade=None, classtype=None, years=None):
+    """
+    导出筛选出的学生的公益时记录ZIP，保存在jobs.files中
+    """
+    students = facets.filter_students(
+        Student.objects.filter(deleted_at=None), {'grade': grade, 'classtype': classtype})
+    name = jobs.files.get_available_name('transcripts/%s.zip' % '-'.join(
+        str(part) for part in ('transcripts', grade, classtype) if part))
+    path = jobs.files.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path, 'wb') as out:
+            for chunk in exports.transcripts_zip(students, years and tuple(years), progress=jobs.progress):
+                out.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return {'file': name, 'students': students.count()}
+
+
+@jobs.task('sua.merge_applications')
+def merge_applications(application_ids, activity_id=None):
+    return merge.merge_applications(application_ids, activity_id)
+
+
+@jobs.task('sua.import_students', max_attempts=1)
+def import_students(file, dry_run=False):
+    """
+    导入上传到jobs.files中的学生文件(见imports.import_students)，完成后删除文件；
+    格式错误等失败不自动重试，修改文件后重新上传
+    """
+    try:
+        with jobs.files.open(file) as upload:
+            return imports.import_students(upload, file, dry_run=dry_run, progress=jobs.progress)
+    finally:
+        jobs.files.delete(file)
@@ -1,3 +1,1240 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import re
+import tempfile
+import time
+import zipfile
+from unittest import mock
+from xml.etree import ElementTree
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.db.models import Sum, signals
+from django.core.files.storage import FileSystemStorage
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from project.sua import bulk, cron, exports, facets, imports, jobs, ledger, merge, navs, nonces, transcript, versions
+from project.sua.api import EXPIRE_TIME, check_signature
+from project.sua.management import dataset
+from project.sua.models import Activity, Application, Job, Nonce, Proof, Publicity, Student, StudentYearHours, Sua
+from project.sua.softdeletes.models import SoftDeleteCollector
+from project.sua.softdeletes.signals import post_soft_delete
+from project.sua.read_serializers import ApplicationReadSerializer
+from project.sua.prefetch import PrefetchListSerializer
+from project.sua.serializers import (
+    ApplicationSerializer, FilterIsPublishedListSerializer, PublicityWithActivitySerializer, StudentSerializer,
+    UserSerializer,
+)
+import project.sua.views.utils.tools as tools
+from project.sua.views.form.serializers import AddStudentSerializer
+from project.sua.views.index import tabs
 
 # Create your tests here.
+
+
+def create_student(number, username=None):
+    user = User.objects.create(username=username or str(number))
+    return Student.objects.create(
+        user=user, number=number, name='学生', classtype='1班', grade=2017, phone='',
+    )
+
+
+def create_activity(owner, **kwargs):
+    kwargs.setdefault('date', datetime.date(2018, 9, 1))
+    kwargs.setdefault('is_valid', True)
+    return Activity.objects.create(owner=owner, title='活动', detail='', group='', **kwargs)
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.student = create_student(2017000001)
+        self.activity = create_activity(self.admin)
+
+    def create_sua(self, hours, **kwargs):
+        kwargs.setdefault('is_valid', True)
+        return Sua.objects.create(
+            owner=self.admin, student=self.student, activity=self.activity,
+            team='', suahours=hours, **kwargs
+        )
+
+    def assertHours(self, student, hours):
+        student.refresh_from_db()
+        self.assertEqual(student.suahours, hours)
+        self.assertEqual(student.hours_between(2018, 2019), hours)
+
+    def test_save_applies_delta(self):
+        sua = self.create_sua(2)
+        self.create_sua(3, is_valid=False)
+        self.assertHours(self.student, 2)
+        sua.suahours = 5
+        sua.save()
+        self.assertHours(self.student, 5)
+        sua.is_valid = False
+        sua.save()
+        self.assertHours(self.student, 0)
+
+    def test_save_moves_hours_between_students(self):
+        sua = self.create_sua(4)
+        other = create_student(2017000002)
+        sua.student = other
+        sua.save()
+        self.assertHours(self.student, 0)
+        self.assertHours(other, 4)
+
+    def test_batch_updates_each_student_once(self):
+        with ledger.batch():
+            for hours in (1, 2, 3):
+                self.create_sua(hours)
+            self.student.refresh_from_db()
+            self.assertEqual(self.student.suahours, 0)
+        self.assertHours(self.student, 6)
+
+    def test_soft_delete_and_restore(self):
+        sua = self.create_sua(2)
+        self.create_sua(3)
+        sua.delete()
+        self.assertHours(self.student, 3)
+        sua.refresh_from_db()
+        sua.full_restore()
+        self.assertHours(self.student, 5)
+        sua.refresh_from_db()
+        sua.suahours = 1
+        sua.save()
+        self.assertHours(self.student, 4)
+
+    def test_save_invalidate_delete(self):
+        sua = self.create_sua(2)
+        self.assertHours(self.student, 2)
+        self.activity.is_valid = False
+        self.activity.save()
+        self.assertHours(self.student, 0)
+        self.activity.is_valid = True
+        self.activity.save()
+        self.assertHours(self.student, 2)
+        sua.delete()
+        self.assertHours(self.student, 0)
+
+    def test_totalhours_is_read_only(self):
+        self.create_sua(2)
+        student = Student.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):  # 只读取suahours，不再求和、保存
+            self.assertEqual(student.totalhours(), 2)
+        serializer = StudentSerializer(student, data={'totalhours': 99}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        self.assertNotIn('totalhours', serializer.validated_data)
+        serializer.save()
+        self.assertHours(self.student, 2)
+
+    def test_suahours_is_read_only(self):
+        self.create_sua(2)
+        student = Student.objects.get(pk=self.student.pk)
+        serializer = StudentSerializer(student, data={'suahours': 99}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertHours(self.student, 2)
+        # 修改学生的表单提交的是打开页面时读到的suahours，不能覆盖之后的台账增量
+        data = {'number': student.number, 'name': '改名', 'suahours': 0, 'grade': 2017,
+                'classtype': '1班', 'phone': '123', 'power': 0, 'user': {'password': '12345678'}}
+        serializer = AddStudentSerializer(student, data=data, context={'request': RequestFactory().get('/')})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(Student.objects.get(pk=student.pk).name, '改名')
+        self.assertHours(self.student, 2)
+
+
+class LedgerConcurrencyTestCase(TransactionTestCase):
+    threads = 8
+    saves = 10
+
+    def test_parallel_saves_are_exact(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        student = create_student(2017000001)
+        activity = create_activity(admin)
+        suas = [
+            Sua.objects.create(
+                owner=admin, student=student, activity=activity, team='', suahours=0, is_valid=True,
+            ) for i in range(self.threads)
+        ]
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def review(sua):
+            try:
+                barrier.wait()
+                for i in range(self.saves):
+                    sua.suahours += 1
+                    sua.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=review, args=(sua,)) for sua in suas]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        student.refresh_from_db()
+        self.assertEqual(student.suahours, self.threads * self.saves)
+        self.assertEqual(student.hours_between(2018, 2019), self.threads * self.saves)
+        self.assertEqual(
+            Sua.objects.filter(student=student).aggregate(total=Sum('added'))['total'],
+            student.suahours,
+        )
+
+    def test_parallel_saves_of_one_sua(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        student = create_student(2017000001)
+        activity = create_activity(admin)
+        pk = Sua.objects.create(
+            owner=admin, student=student, activity=activity, team='', suahours=0, is_valid=True,
+        ).pk
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def review(hours):
+            try:
+                sua = Sua.objects.get(pk=pk)  # 各线程从同一个旧值开始修改同一Sua
+                barrier.wait()
+                sua.suahours = hours
+                sua.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=review, args=(i + 1,)) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        sua = Sua.objects.get(pk=pk)
+        student.refresh_from_db()
+        self.assertEqual(sua.added, sua.suahours)
+        self.assertEqual(student.suahours, sua.suahours)
+        self.assertEqual(student.hours_between(2018, 2019), sua.suahours)
+
+
+class AfterCommitTestCase(TransactionTestCase):
+    def test_after_commit(self):
+        calls = []
+        with transaction.atomic():
+            versions.after_commit(lambda: calls.append(len(calls)))
+            self.assertEqual(calls, [0])
+        self.assertEqual(calls, [0, 1])
+        try:
+            with transaction.atomic():
+                versions.after_commit(lambda: calls.append(len(calls)))
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(calls, [0, 1, 2])
+        versions.after_commit(lambda: calls.append(len(calls)))
+        self.assertEqual(calls, [0, 1, 2, 3, 4])
+
+
+class SoftDeleteTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.proof = Proof.objects.create(owner=self.admin, is_offline=True)
+        self.numbers = iter(range(2017000001, 2017001000))
+
+    def create_activity(self, participants):
+        # 每个参与人有一个Sua和对应的申请
+        activity = create_activity(self.admin)
+        for i in range(participants):
+            student = create_student(next(self.numbers))
+            sua = Sua.objects.create(
+                owner=self.admin, student=student, activity=activity, team='', suahours=1, is_valid=True,
+            )
+            Application.objects.create(sua=sua, owner=student.user, proof=self.proof)
+        return activity
+
+    def connect(self, signal, receiver, **kwargs):
+        signal.connect(receiver, **kwargs)
+        self.addCleanup(signal.disconnect, receiver, **kwargs)
+
+    def test_counter(self):
+        activity = self.create_activity(3)
+        self.assertEqual(activity.delete(), (7, {'activity': 1, 'sua': 3, 'application': 3}))
+        self.assertTrue(activity.deleted)
+        self.assertIsNotNone(activity.pk)
+        self.assertEqual(Sua.objects.filter(activity=activity, deleted=True).count(), 3)
+        self.assertEqual(Application.objects.filter(sua__activity=activity, deleted=True).count(), 3)
+
+    def test_one_update_per_model(self):
+        small, large = self.create_activity(2), self.create_activity(40)
+        with CaptureQueriesContext(connection) as queries:
+            small.delete()
+        updates = [
+            re.match(r'UPDATE "(\w+)"', query['sql']).group(1) for query in queries
+            if query['sql'].startswith('UPDATE') and '"deleted" = ' in query['sql']
+        ]
+        self.assertEqual(sorted(updates), ['sua_activity', 'sua_application', 'sua_sua'])
+        with self.assertNumQueries(len(queries)):  # 查询次数与级联的记录数无关
+            large.delete()
+        self.assertFalse(Sua.objects.filter(activity=large, deleted=False).exists())
+
+    def test_send_signals(self):
+        deletes = []
+        soft_deletes = []
+        receiver = lambda sender, instance, **kwargs: deletes.append(instance.pk)
+        self.connect(signals.pre_delete, receiver, sender=Sua)
+        self.connect(signals.post_delete, receiver, sender=Sua)
+        self.connect(post_soft_delete, lambda sender, instances, **kwargs: soft_deletes.append(sender))
+
+        self.create_activity(2).delete(send_signals=False)
+        self.assertEqual(deletes, [])
+        self.assertEqual(sorted(model.__name__ for model in soft_deletes), ['Activity', 'Application', 'Sua'])
+        self.create_activity(2).delete()
+        self.assertEqual(len(deletes), 4)  # 每个Sua各一次pre_delete、post_delete
+
+    def test_deleted_rows_keep_deleted_at(self):
+        activity = self.create_activity(2)
+        earlier = timezone.now() - datetime.timedelta(days=1)
+        sua = activity.suas.order_by('pk').first()
+        sua.delete(time=earlier)
+        self.assertEqual(activity.delete(), (3, {'activity': 1, 'sua': 1, 'application': 1}))
+        sua.refresh_from_db()
+        self.assertEqual(sua.deleted_at, earlier)
+        self.assertEqual(Application.objects.get(sua=sua).deleted_at, earlier)
+
+    def test_queryset_delete(self):
+        activities = [self.create_activity(2), self.create_activity(3)]
+        queryset = Activity.soft_objects.filter(pk__in=[activity.pk for activity in activities])
+        with mock.patch.object(SoftDeleteCollector, 'soft_delete', autospec=True,
+                               side_effect=SoftDeleteCollector.soft_delete) as soft_delete:
+            self.assertEqual(queryset.delete(), (12, {'activity': 2, 'sua': 5, 'application': 5}))
+        self.assertEqual(soft_delete.call_count, 1)  # 整个queryset由一个collector一起处理
+        self.assertEqual(queryset.delete(), (0, {}))
+        self.assertEqual(Student.objects.filter(deleted=False).aggregate(Sum('suahours'))['suahours__sum'], 0)
+        self.assertFalse(StudentYearHours.objects.filter(suahours__gt=0).exists())
+
+    def test_default_manager_delete(self):
+        # objects.filter(...).delete()仍是Django原来的删除，批量软删除需要使用soft_objects
+        activity = self.create_activity(1)
+        Proof.objects.filter(pk=self.proof.pk).delete()
+        self.assertFalse(Proof.objects.filter(pk=self.proof.pk).exists())
+        self.assertFalse(Application.objects.filter(sua__activity=activity).exists())
+
+    def test_full_restore(self):
+        activity = self.create_activity(3)
+        suas = list(activity.suas.order_by('pk'))
+        suas[0].delete(time=timezone.now() - datetime.timedelta(days=1))  # 先单独删除的不随活动恢复
+        activity.delete()
+        for sua in suas:
+            self.assertEqual(Student.objects.get(pk=sua.student_id).suahours, 0)
+        activity.refresh_from_db()
+        self.assertEqual(activity.full_restore(), (5, {'activity': 1, 'sua': 2, 'application': 2}))
+        self.assertFalse(activity.deleted)
+        for sua in suas:
+            sua.refresh_from_db()
+            hours = 0 if sua.deleted else 1
+            self.assertEqual(sua.deleted, sua == suas[0])
+            self.assertEqual(Application.objects.get(sua=sua).deleted, sua == suas[0])
+            student = Student.objects.get(pk=sua.student_id)
+            self.assertEqual(student.suahours, hours)
+            self.assertEqual(student.hours_between(2018, 2019), hours)
+
+    def test_full_restore_query_count(self):
+        small, large = self.create_activity(2), self.create_activity(40)
+        small.delete()
+        large.delete()
+        small.refresh_from_db()
+        large.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            small.full_restore()
+        with self.assertNumQueries(len(queries)):
+            large.full_restore()
+        self.assertEqual(Sua.objects.filter(activity=large, deleted=False).count(), 40)
+
+
+class NonceStoreTestCase(TestCase):
+    def stores(self):
+        caches['nonces'].clear()
+        self.addCleanup(caches['nonces'].clear)
+        return [nonces.DatabaseNonceStore(), nonces.CacheNonceStore(), nonces.LocalNonceStore()]
+
+    def expire(self, store, now):
+        # DatabaseNonceStore的过期记录由cron.cleanNonce删除，其他存储自己按expire_at过期
+        with mock.patch('time.time', return_value=now):
+            if isinstance(store, nonces.DatabaseNonceStore):
+                cron.cleanNonce()
+
+    def test_add_and_replay(self):
+        now = time.time()
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                self.assertTrue(store.add(1, int(now), now + EXPIRE_TIME))
+                self.assertFalse(store.add(1, int(now), now + EXPIRE_TIME))
+                self.assertTrue(store.add(2, int(now), now + EXPIRE_TIME))
+                self.assertTrue(store.add(1, int(now) + 1, now + EXPIRE_TIME))
+
+    def test_expiry(self):
+        now = time.time()
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                timestamp = int(now)
+                self.assertTrue(store.add(3, timestamp, timestamp + EXPIRE_TIME))
+                self.expire(store, timestamp + EXPIRE_TIME - 1)
+                with mock.patch('time.time', return_value=timestamp + EXPIRE_TIME - 1):
+                    self.assertFalse(store.add(3, timestamp, timestamp + EXPIRE_TIME))
+                self.expire(store, timestamp + EXPIRE_TIME + 1)
+                with mock.patch('time.time', return_value=timestamp + EXPIRE_TIME + 1):
+                    self.assertTrue(store.add(3, timestamp, timestamp + EXPIRE_TIME))
+
+    def test_local_store_evicts_expired(self):
+        store = nonces.LocalNonceStore()
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            for i in range(10):
+                self.assertTrue(store.add(i, int(now), now + i + 1))
+        self.assertEqual(len(store.nonces), 10)
+        with mock.patch('time.time', return_value=now + 5.5):
+            self.assertTrue(store.add(100, int(now), now + EXPIRE_TIME))
+        # 到期的nonce按expire_at从堆顶弹出，没到期的留在堆中
+        self.assertEqual(store.nonces, {(i, int(now)) for i in range(5, 10)} | {(100, int(now))})
+        self.assertEqual(len(store.expiry), 6)
+        self.assertEqual(store.expiry[0][0], now + 6)
+
+    def test_check_signature(self):
+        timestamp = int(time.time())
+
+        def request(nonce, signature=None):
+            if signature is None:
+                signature = Nonce(nonce=nonce, timestamp=timestamp).getSignature()
+            return RequestFactory().get('/', {'nonce': nonce, 'timestamp': timestamp, 'signature': signature})
+
+        store = nonces.LocalNonceStore()
+        with mock.patch('project.sua.nonces.get_store', return_value=store):
+            self.assertTrue(check_signature(request(1)))
+            self.assertFalse(check_signature(request(1)))
+            with mock.patch.object(store, 'add') as add:
+                self.assertFalse(check_signature(request(2, 'bad')))
+            add.assert_not_called()
+            self.assertTrue(check_signature(request(2)))
+
+
+class CleanNonceTestCase(TestCase):
+    @override_settings(NONCE_CLEAN_BATCH_SIZE=10)
+    def test_batches(self):
+        now = int(time.time())
+        Nonce.objects.bulk_create(
+            [Nonce(nonce=i, timestamp=now - EXPIRE_TIME - i) for i in range(25)] +
+            [Nonce(nonce=i, timestamp=now - EXPIRE_TIME + 1 + i % 5) for i in range(7)]
+        )
+        with mock.patch('time.time', return_value=now), mock.patch.object(cron.logger, 'info'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(cron.cleanNonce(), 25)
+        # 10、10、5三批，每批一次SELECT和一次DELETE，最后一批不足10行后不再查询
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE')]), 3)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 3)
+        self.assertEqual(Nonce.objects.count(), 7)
+        self.assertFalse(Nonce.objects.filter(timestamp__lte=now - EXPIRE_TIME).exists())
+        with mock.patch('time.time', return_value=now), mock.patch.object(cron.logger, 'info'):
+            self.assertEqual(cron.cleanNonce(), 0)
+
+
+class PrefetchTestCase(TestCase):
+    def populate(self, applications, prefix):
+        counts = dataset.default_counts(0)
+        counts.update(students=20, applications=applications)
+        return dataset.populate(
+            counts, prefix=prefix, number_base=Student.objects.count() * 1000 + 100000, rebuild=False,
+        )
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_application_list_is_constant(self):
+        request = RequestFactory().get('/')
+        admin = self.populate(5, 'small')['admin']
+
+        def serialize():
+            applications = Application.objects.filter(deleted_at=None).order_by('-created')
+            data = ApplicationSerializer(applications, many=True, context={'request': request}).data
+            return len(data)
+
+        def api():
+            self.assertEqual(self.client.get('/apis/applications/').status_code, 200)
+
+        self.client.force_login(admin)
+        small = self.count_queries(serialize), self.count_queries(api)
+        self.populate(495, 'large')
+        self.assertGreaterEqual(serialize(), 480)
+        self.assertEqual((self.count_queries(serialize), self.count_queries(api)), small)
+
+
+    def test_many_init_keeps_meta(self):
+        request = RequestFactory().get('/')
+        for serializer_class in (StudentSerializer, ApplicationReadSerializer):
+            serializer = serializer_class([], many=True, context={'request': request})
+            self.assertIs(type(serializer), PrefetchListSerializer)
+            self.assertEqual(serializer.child.context, serializer.context)
+            self.assertFalse(hasattr(serializer_class.Meta, 'list_serializer_class'))
+        serializer = PublicityWithActivitySerializer([], many=True, allow_empty=False)
+        self.assertIs(type(serializer), FilterIsPublishedListSerializer)
+        self.assertFalse(serializer.allow_empty)
+
+
+class ReadSerializerTestCase(TestCase):
+    relations = ('suas', 'appeals', 'publicities')  # 只读序列化器输出主键而不是URL
+
+    def strip(self, data):
+        if isinstance(data, list):
+            return [self.strip(item) for item in data]
+        if isinstance(data, dict):
+            return dict((key, self.strip(value)) for key, value in data.items() if key not in self.relations)
+        return data
+
+    def test_same_representation(self):
+        counts = dataset.default_counts(200)
+        dataset.populate(counts, prefix='read')
+        request = RequestFactory().get('/')
+        applications = Application.objects.order_by('pk')
+        expected = self.strip(ApplicationSerializer(applications, many=True, context={'request': request}).data)
+        for application in expected:  # 原先在视图中对日期的处理
+            application['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(application['created']))
+            activity = application['sua']['activity']
+            activity['date'] = tools.Date2String_SHOW(tools.TZString2Date(activity['date']))
+        self.assertEqual(
+            self.strip(ApplicationReadSerializer(applications, many=True, context={'request': request}).data),
+            expected,
+        )
+        sua = Sua.objects.filter(application__isnull=False).first()
+        data = ApplicationReadSerializer(sua.application, context={'request': request}).data
+        self.assertEqual(data['sua']['student']['suas'], list(sua.student.suas.values_list('pk', flat=True)))
+
+
+class FacetsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.students = [create_student(2017000001 + i) for i in range(3)]
+        self.students[2].grade = 2018
+        self.students[2].save()
+        self.activity = create_activity(self.admin)
+
+    def test_counts_and_invalidation(self):
+        Sua.objects.create(
+            owner=self.admin, student=self.students[0], activity=self.activity,
+            team='', suahours=2, is_valid=True,
+        )
+        self.assertEqual(facets.classes(), [
+            {'grade': 2017, 'classtype': '1班', 'students': 2, 'suahours': 2.0},
+            {'grade': 2018, 'classtype': '1班', 'students': 1, 'suahours': 0.0},
+        ])
+        self.assertEqual(facets.student_facets()['classtypes'], [
+            {'classtype': '1班', 'students': 3, 'suahours': 2.0},
+        ])
+        with self.assertNumQueries(0):
+            facets.student_facets()
+
+        Sua.objects.create(
+            owner=self.admin, student=self.students[2], activity=self.activity,
+            team='', suahours=3, is_valid=True,
+        )
+        self.assertEqual(facets.classes()[1]['suahours'], 3.0)
+        self.students[1].delete()
+        self.assertEqual(facets.classes()[0]['students'], 1)
+
+    def test_filter_students(self):
+        students = Student.objects.filter(deleted_at=None)
+        self.assertEqual(facets.filter_students(students, {'grade': '2018'}).count(), 1)
+        self.assertEqual(facets.filter_students(students, {'grade': '2017', 'classtype': '1班'}).count(), 2)
+        self.assertEqual(facets.filter_students(students, {'grade': 'x'}).count(), 0)
+        self.assertEqual(facets.filter_students(students, {}).count(), 3)
+
+
+class StudentSearchTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.students = [create_student(2017000001 + i) for i in range(30)]
+        self.students[0].name = '张三'
+        self.students[0].save()
+        self.activity = create_activity(self.admin)
+        Sua.objects.create(
+            owner=self.admin, student=self.students[1], activity=self.activity, team='', suahours=1,
+        )
+        self.url = '/admin/activities/%d/suas/students/' % self.activity.pk
+        self.client.force_login(self.admin)
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def numbers(self, data):
+        return [student['number'] for student in data['results']]
+
+    def test_search(self):
+        self.assertEqual(self.numbers(self.search(q='张')), [2017000001])
+        self.assertEqual(self.numbers(self.search(q='201700001')), list(range(2017000010, 2017000020)))
+        self.assertEqual(self.numbers(self.search(q='20170000', page_size=3)), [2017000001, 2017000003, 2017000004])
+        self.assertEqual(len(self.search(q='1班', page_size=100)['results']), 29)  # 已参与的学生不出现
+        self.assertEqual(self.search(q='0')['results'], [])
+
+    def test_pages(self):
+        first = self.search(page_size=20)
+        second = self.search(page_size=20, page=2)
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
+        self.assertEqual(len(self.numbers(first) + self.numbers(second)), 29)
+
+    def test_permission(self):
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class MergeTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.target = create_activity(self.admin, date=datetime.date(2019, 9, 1))
+        self.proof = Proof.objects.create(owner=self.admin, is_offline=True)
+
+    def apply(self, student, hours, activity=None):
+        if activity is None:
+            activity = create_activity(student.user, is_created_by_student=True)
+        sua = Sua.objects.create(
+            owner=student.user, student=student, activity=activity, team='', suahours=hours, is_valid=True,
+        )
+        return Application.objects.create(sua=sua, owner=student.user, proof=self.proof)
+
+    def test_merge(self):
+        students = [create_student(2017000001 + i) for i in range(3)]
+        first, second = self.apply(students[0], 2), self.apply(students[1], 3)
+        shared = self.apply(students[2], 1)
+        sibling = self.apply(students[0], 4, activity=shared.sua.activity)  # 未选中，活动应保留
+        report = merge.merge_posted({
+            str(first.pk): 'on', str(second.pk): 'on', str(shared.pk): 'on', '999999': 'on',
+            'activity_id': str(self.target.pk),
+        })
+        self.assertEqual(report['moved'], 3)
+        self.assertEqual(report['missing'], [999999])
+        self.assertEqual(report['deleted_activities'], sorted([first.sua.activity_id, second.sua.activity_id]))
+        self.assertEqual(
+            set(Sua.objects.filter(activity=self.target).values_list('application', flat=True)),
+            {first.pk, second.pk, shared.pk},
+        )
+        self.assertIsNone(Activity.objects.get(pk=shared.sua.activity_id).deleted_at)
+        self.assertIsNotNone(Activity.objects.get(pk=first.sua.activity_id).deleted_at)
+        sibling.sua.refresh_from_db()
+        self.assertIsNone(sibling.sua.deleted_at)
+        students[0].refresh_from_db()
+        self.assertEqual(students[0].hours_between(2019, 2020), 2)
+        self.assertEqual(students[0].suahours, 6)
+
+    def test_default_activity(self):
+        student = create_student(2017000001)
+        first, second = self.apply(student, 1), self.apply(student, 1)
+        report = merge.merge_posted({str(second.pk): 'on', str(first.pk): 'on', 'activity_id': 'None'})
+        self.assertEqual(report['activity'], first.sua.activity_id)
+        self.assertEqual(report['deleted_activities'], [second.sua.activity_id])
+        self.assertEqual(merge.merge_posted({'activity_id': ''})['activity'], None)
+
+    def test_queries_do_not_grow_with_table(self):
+        students = [create_student(2017000001 + i) for i in range(3)]
+
+        def queries(applications):
+            data = dict((str(application.pk), 'on') for application in applications)
+            data['activity_id'] = str(self.target.pk)
+            with CaptureQueriesContext(connection) as captured:
+                merge.merge_posted(data)
+            return len(captured)
+
+        small = queries([self.apply(student, 1) for student in students])
+        for i in range(50):
+            self.apply(students[i % 3], 1)
+        self.assertEqual(queries([self.apply(student, 1) for student in students]), small)
+
+
+class TranscriptTestCase(TestCase):
+    def test_pages(self):
+        first, rest = transcript.rows_per_page(transcript.FIRST_PAGE_TOP), transcript.rows_per_page(transcript.TOP)
+        self.assertEqual([len(page) for page in transcript.pages([])], [0])
+        self.assertEqual([len(page) for page in transcript.pages(range(first + rest + 1))], [first, rest, 1])
+
+    def test_download(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        student = create_student(2017000001)
+        activity = create_activity(admin)
+        for i in range(30):
+            Sua.objects.create(owner=admin, student=student, activity=activity, team='', suahours=1, is_valid=True)
+        self.client.force_login(student.user)
+        response = self.client.get('/suas/export/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = response.content
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', pdf)), len(transcript.pages(range(30))))
+        self.assertIs(transcript.resources(), transcript.resources())
+        self.assertNotIn(b'ASCII85Decode', pdf)
+        self.assertIn(b'/DCTDecode', pdf)  # 学院标志的JPEG数据直接写入
+
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/suas/export/download/').status_code, 403)
+
+
+class TranscriptExportTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.students = [create_student(2017000001 + i) for i in range(4)]
+        self.students[3].grade = 2018
+        self.students[3].save()
+        old = create_activity(self.admin, date=datetime.date(2017, 10, 1))
+        new = create_activity(self.admin, date=datetime.date(2018, 10, 1))
+        for i, student in enumerate(self.students[:3]):
+            for activity in (old, new):
+                Sua.objects.create(
+                    owner=self.admin, student=student, activity=activity, team='', suahours=i + 1, is_valid=True,
+                )
+
+    def test_transcripts(self):
+        students = Student.objects.filter(deleted_at=None)
+        for years in (None, (2018, 2019)):
+            expected = [(
+                student.number, student.name, tools.get_total_hours(student, years),
+                list(tools.get_valid_suas(student, years).order_by('pk').values_list(
+                    'activity__title', 'activity__group', 'suahours')),
+            ) for student in students.order_by('number')]
+            self.assertEqual(list(exports.transcripts(students, years)), expected)
+
+    def test_zip(self):
+        progress = []
+        students = facets.filter_students(Student.objects.filter(deleted_at=None), {'grade': '2017'})
+        data = b''.join(exports.transcripts_zip(students, workers=2, progress=lambda *args: progress.append(args)))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(archive.namelist(), ['%d_学生.pdf' % (2017000001 + i) for i in range(3)])
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+        inline = zipfile.ZipFile(io.BytesIO(b''.join(exports.transcripts_zip(students, pool=False))))
+        self.assertEqual(inline.namelist(), archive.namelist())
+
+    def test_view(self):
+        self.client.force_login(self.admin)
+        with mock.patch.object(exports, 'ProcessPoolExecutor') as pool:  # 请求中不创建进程池
+            response = self.client.get('/admin/students/transcripts/', {'grade': 2018})
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        pool.assert_not_called()
+        self.assertEqual(archive.namelist(), ['2017000004_学生.pdf'])
+        with override_settings(TRANSCRIPT_SYNC_MAX=3):
+            self.assertEqual(self.client.get('/admin/students/transcripts/', {'grade': 2017}).status_code, 200)
+            self.assertEqual(self.client.get('/admin/students/transcripts/').status_code, 400)
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get('/admin/students/transcripts/').status_code, 403)
+
+
+@override_settings(JOBS_EAGER=False, JOB_RETRY_DELAY=0)
+class JobsTestCase(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.task('test.flaky', max_attempts=2)(self.flaky)
+        jobs.task('test.single', concurrency=1)(lambda: None)
+
+    def tearDown(self):
+        jobs.TASKS.pop('test.flaky')
+        jobs.TASKS.pop('test.single')
+
+    def flaky(self, fail):
+        self.calls.append(fail)
+        if len(self.calls) <= fail:
+            raise ValueError('fail %d' % len(self.calls))
+        return {'calls': len(self.calls)}
+
+    def test_retry(self):
+        job = jobs.enqueue('test.flaky', fail=1)
+        self.assertEqual(jobs.run(jobs.claim('a')).status, Job.QUEUED)
+        job = jobs.run(jobs.claim('a'))
+        self.assertEqual((job.status, job.attempts, json_result(job)), (Job.DONE, 2, {'calls': 2}))
+
+        job = jobs.enqueue('test.flaky', fail=5)
+        self.assertEqual(jobs.work('a', burst=True), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(jobs.status(job)['error'], 'ValueError: fail 4')
+
+    def test_concurrency_and_stale(self):
+        first, second = jobs.enqueue('test.single'), jobs.enqueue('test.single')
+        self.assertEqual(jobs.claim('a').pk, first.pk)
+        self.assertIsNone(jobs.claim('b'))  # 达到并发数上限
+        Job.objects.filter(pk=first.pk).update(started=first.created - datetime.timedelta(days=1))
+        self.assertEqual(jobs.claim('b').pk, first.pk)  # worker已退出，重新领取
+
+    def test_merge_and_export(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        student = create_student(2017000001)
+        proof = Proof.objects.create(owner=admin, is_offline=True)
+        activity = create_activity(student.user, is_created_by_student=True)
+        sua = Sua.objects.create(owner=student.user, student=student, activity=activity, team='', suahours=1)
+        application = Application.objects.create(sua=sua, owner=student.user, proof=proof)
+        target = create_activity(admin)
+        self.client.force_login(admin)
+
+        response = self.client.post('/applications/merge', {str(application.pk): 'True', 'activity_id': target.pk})
+        self.assertEqual(Sua.objects.get(pk=sua.pk).activity_id, activity.pk)  # 只提交了任务
+        merge_job = Job.objects.get(name='sua.merge_applications')
+        merge_url = response['Location']
+        self.assertEqual(merge_url, '/applications/merge?job=%d' % merge_job.pk)
+        self.assertContains(self.client.get(merge_url), '合并中')
+        response = self.client.post('/admin/students/transcripts/?grade=2017')
+        self.assertEqual(response.status_code, 202)
+        url = '/jobs/%d/' % response.json()['id']
+        self.assertEqual(self.client.get(url).json()['status'], Job.QUEUED)
+
+        with tempfile.TemporaryDirectory() as root, mock.patch.object(jobs, 'files', FileSystemStorage(root)):
+            self.assertEqual(jobs.work('test', burst=True), 2)
+            self.assertEqual(Sua.objects.get(pk=sua.pk).activity_id, target.pk)
+            self.assertContains(self.client.get(merge_url), '合并完成：1条公益时记录已移动到')
+            self.assertEqual(self.client.get(url).json()['result']['students'], 1)
+            response = self.client.get(url + 'download/')
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(archive.namelist(), ['2017000001_学生.pdf'])
+            self.client.force_login(student.user)
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_merge_from_index(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.post('/?tab=admin_applications', {'activity_id': 'None'})
+        job = Job.objects.get(name='sua.merge_applications')
+        self.assertEqual(response['Location'], '/applications/merge?job=%d&tab=admin_applications' % job.pk)
+        self.assertContains(self.client.get(response['Location']), '合并中')
+
+
+def json_result(job):
+    return jobs.status(job)['result']
+
+
+@override_settings(JOBS_EAGER=False)
+class JobsConcurrencyTestCase(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        jobs.task('test.pair', concurrency=2)(lambda: None)
+
+    def tearDown(self):
+        jobs.TASKS.pop('test.pair')
+
+    def test_parallel_claims(self):
+        for i in range(self.workers):
+            jobs.enqueue('test.pair')
+        claimed, errors = [], []
+        barrier = threading.Barrier(self.workers)
+
+        def work(worker):
+            try:
+                barrier.wait()
+                job = jobs.claim(worker)
+                if job is not None:
+                    claimed.append(job.pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=('w%d' % i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(len(set(claimed)), 2)
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 2)
+
+
+class HoursExportTestCase(TestCase):
+    url = '/admin/students/hours/'
+
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.students = [create_student(2017000001 + i) for i in range(3)]
+        self.students[2].grade = 2018
+        self.students[2].name = '<学生&>'
+        self.students[2].save()
+        for date, hours in ((datetime.date(2017, 10, 1), 1), (datetime.date(2018, 10, 1), 2)):
+            activity = create_activity(self.admin, date=date)
+            for student in self.students[1:]:
+                Sua.objects.create(
+                    owner=self.admin, student=student, activity=activity, team='', suahours=hours, is_valid=True,
+                )
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export().decode('utf-8-sig'))))
+        self.assertEqual(rows, [
+            ['学号', '姓名', '班级', '年级', '2017-2018学年', '2018-2019学年', '总公益时'],
+            ['2017000001', '学生', '1班', '2017', '0.0', '0.0', '0.0'],
+            ['2017000002', '学生', '1班', '2017', '1.0', '2.0', '3.0'],
+            ['2017000003', '<学生&>', '1班', '2018', '1.0', '2.0', '3.0'],
+        ])
+        rows = list(csv.reader(io.StringIO(
+            self.export(grade=2018, year_begin=2018, year_end=2019).decode('utf-8-sig'))))
+        self.assertEqual(rows[1:], [['2017000003', '<学生&>', '1班', '2018', '2.0', '2.0']])
+
+    def test_xlsx(self):
+        archive = zipfile.ZipFile(io.BytesIO(self.export(format='xlsx', grade=2018)))
+        self.assertIsNone(archive.testzip())
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        rows = [[''.join(cell.itertext()) for cell in row] for row in sheet.iter(namespace + 'row')]
+        self.assertEqual(rows[1], ['2017000003', '<学生&>', '1班', '2018', '1.0', '2.0', '3.0'])
+
+    def test_permission(self):
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ImportStudentsTestCase(TestCase):
+    header = ['学号', '姓名', '班级', '年级', '电话', '密码']
+
+    def setUp(self):
+        self.existing = create_student(2018000001)
+
+    def csv_file(self, rows, encoding='utf-8'):
+        out = io.StringIO()
+        csv.writer(out).writerows([self.header] + rows)
+        return io.BytesIO(out.getvalue().encode(encoding))
+
+    def test_import(self):
+        report = imports.import_students(self.csv_file([
+            ['2018000002', '新生', '1班', '2018', '13800000000', 'secret'],
+            ['2018000001', '已存在', '1班', '2018', '', ''],
+            [],
+            ['2018000003', '新生', '2班', '2018', '', ''],
+            ['2018000002', '重复', '1班', '2018', '', ''],
+        ]), 'students.csv', workers=2)
+        self.assertEqual((report['rows'], report['valid'], report['created'], report['errors']), (4, 2, 2, []))
+        self.assertEqual([(d['line'], d['reason']) for d in report['duplicates']], [(3, '学号已存在'), (6, '与第2行重复')])
+        student = Student.objects.get(number=2018000002)
+        self.assertEqual((student.user.username, student.phone, student.suahours), ('2018000002', '13800000000', 0))
+        self.assertTrue(student.user.check_password('secret'))
+        self.assertTrue(Student.objects.get(number=2018000003).user.check_password(imports.DEFAULT_PASSWORD))
+
+        # 重新导入同一个文件时全部跳过
+        report = imports.import_students(self.csv_file([['2018000003', '新生', '2班', '2018', '', '']]), 'students.csv')
+        self.assertEqual((report['created'], report['duplicates'][0]['reason']), (0, '学号已存在'))
+
+    def test_errors(self):
+        report = imports.import_students(self.csv_file([
+            ['2018000002', '新生', '1班', '2018', '', ''],
+            ['abc', '', '1班', '2018', '', ''],
+        ]), 'students.csv')
+        self.assertEqual((report['valid'], report['created']), (1, 0))
+        self.assertEqual(report['errors'][0]['line'], 3)
+        self.assertEqual(sorted(report['errors'][0]['errors']), ['name', 'number'])
+        self.assertFalse(Student.objects.filter(number=2018000002).exists())
+        with self.assertRaises(imports.ImportFileError):
+            list(imports.read_rows(io.BytesIO('学号,姓名\n1,a\n'.encode('utf-8')), 'students.csv'))
+        with self.assertRaises(imports.ImportFileError):
+            list(imports.read_rows(io.BytesIO(b''), 'students.xls'))
+
+    def test_formats(self):
+        rows = [['2018000002', '新生', '1班', '2018', '', '']]
+        self.assertEqual(list(imports.read_rows(self.csv_file(rows, 'gb18030'), 'students.csv'))[0][1]['name'], '新生')
+        # 导出的公益时表格(数字单元格)可以直接导入
+        xlsx = io.BytesIO(b''.join(exports.xlsx_chunks([self.header[:4] + ['总公益时'], [2018000002, '新生', '1班', 2018, 0.0]])))
+        self.assertEqual(list(imports.read_rows(xlsx, 'students.xlsx')), [
+            (2, {'number': '2018000002', 'name': '新生', 'classtype': '1班', 'grade': '2018'}),
+        ])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_view(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        upload = self.csv_file([['2018000002', '新生', '1班', '2018', '', '']])
+        upload.name = 'students.csv'
+        with tempfile.TemporaryDirectory() as root, mock.patch.object(jobs, 'files', FileSystemStorage(root)):
+            response = self.client.post('/admin/students/import/', {'file': upload})
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(os.listdir(os.path.join(root, 'imports')), [])
+        job = Job.objects.get(name='sua.import_students')
+        self.assertEqual((job.status, json_result(job)['created']), (Job.DONE, 1))
+        self.assertContains(self.client.get(response['Location']), '创建了1个学生')
+        self.client.force_login(self.existing.user)
+        self.assertEqual(self.client.get('/admin/students/import/')['Location'], '/?status=403')
+
+
+class BulkSuaTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.students = [create_student(2017000001 + i) for i in range(20)]
+        self.activity = create_activity(self.admin)
+        other = create_activity(self.admin, date=datetime.date(2018, 10, 1))
+        Sua.objects.create(owner=self.admin, student=self.students[0], activity=other, team='', suahours=1, is_valid=True)
+
+    def add(self, entries, activity=None):
+        serializer = bulk.BulkSuaSerializer(data={'suas': entries}, context={'activity': activity or self.activity})
+        if serializer.is_valid():
+            return serializer.save(owner=self.admin)
+        return serializer.errors['suas']
+
+    def test_add(self):
+        entries = [{'student': self.students[0].pk, 'suahours': 2}]
+        entries += [{'number': student.number, 'suahours': 1.5, 'team': 'A'} for student in self.students[1:]]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.add(entries)), 20)
+        self.assertLessEqual(len(queries), 12)  # 与人数无关
+        self.assertEqual(self.activity.suas.filter(team='A', added=1.5).count(), 19)
+        for student, hours in ((self.students[0], 3), (self.students[1], 1.5)):
+            student.refresh_from_db()
+            self.assertEqual((student.suahours, student.hours_between(2018, 2019)), (hours, hours))
+        self.assertEqual(self.students[0].year_hours.get().activities, 2)
+        totals = dict(Student.objects.values_list('pk', 'suahours'))
+        ledger.rebuild()
+        self.assertEqual(dict(Student.objects.values_list('pk', 'suahours')), totals)
+
+        # 活动无效时创建的Sua不计入
+        invalid = create_activity(self.admin, is_valid=False)
+        self.add([{'number': self.students[1].number, 'suahours': 4}], invalid)
+        self.students[1].refresh_from_db()
+        self.assertEqual(self.students[1].suahours, 1.5)
+
+    def test_errors(self):
+        self.add([{'student': self.students[0].pk, 'suahours': 1}])
+        errors = self.add([
+            {'number': self.students[1].number, 'suahours': 1},
+            {'number': 1, 'suahours': 1},
+            {'student': self.students[0].pk, 'suahours': 1},
+            {'student': self.students[1].pk, 'suahours': 1},
+        ])
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {'number': ['学号不存在']})
+        self.assertEqual(errors[2], {'student': ['已参与该活动']})
+        self.assertEqual(errors[3], {'student': ['与第1条重复']})
+        errors = self.add([{'number': self.students[2].number, 'suahours': -1}, {'suahours': 1}])
+        self.assertEqual(sorted(error for entry in errors for error in entry), ['non_field_errors', 'suahours'])
+        self.assertEqual(self.activity.suas.count(), 1)
+
+    def test_views(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/apis/activities/%d/suas/' % self.activity.pk, {'suas': [
+            {'number': self.students[0].number, 'suahours': 2, 'team': 'A'},
+        ]}, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()), (201, {'created': 1}))
+
+        url = '/admin/activities/%d/suas/bulk/' % self.activity.pk
+        response = self.client.post(url, {'text': '%d\t3\tB\n\n%d' % (self.students[1].number, self.students[0].number), 'suahours': 1})
+        self.assertContains(response, '第3行：已参与该活动')
+        response = self.client.post(url, {'text': '%d\t3\tB 组\n%d' % (self.students[1].number, self.students[2].number), 'suahours': 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(self.activity.suas.values_list('student__number', 'suahours', 'team')),
+            [(2017000001, 2, 'A'), (2017000002, 3, 'B 组'), (2017000003, 1, '')],
+        )
+
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get(url)['Location'], '/?status=403')
+        response = self.client.post('/apis/activities/%d/suas/' % self.activity.pk, {'suas': []}, content_type='application/json')
+        self.assertEqual(response['Location'], '/?status=403')
+
+
+class NavTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.student = create_student(2017000001)
+        self.factory = RequestFactory()
+
+    def nav(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        return navs.nav(request)
+
+    def test_cached(self):
+        user = User.objects.get(pk=self.student.user_id)
+        request = self.factory.get('/')
+        self.assertEqual(self.nav(user), {  # URL与原来的UserSerializer、StudentSerializer相同
+            'user': {'url': UserSerializer(user, context={'request': request}).data['url'],
+                     'id': user.pk, 'username': '2017000001', 'is_staff': False},
+            'student': {'url': StudentSerializer(self.student, context={'request': request}).data['url'],
+                        'id': self.student.pk, 'name': '学生', 'power': 0, 'totalhours': 0.0},
+        })
+        with self.assertNumQueries(0):
+            self.nav(user)
+        self.assertEqual(self.nav(self.admin)['student'], {})
+        with self.assertNumQueries(0):
+            self.nav(self.admin)
+
+    def test_invalidate(self):
+        user = User.objects.get(pk=self.student.user_id)
+        self.nav(user)
+        activity = create_activity(self.admin)
+        Sua.objects.create(owner=self.admin, student=self.student, activity=activity, team='', suahours=2, is_valid=True)
+        self.assertEqual(self.nav(user)['student']['totalhours'], 2)
+        bulk.add_suas(create_activity(self.admin), self.admin, [{'student': self.student.pk, 'suahours': 1}])
+        self.assertEqual(self.nav(user)['student']['totalhours'], 3)
+        activity.is_valid = False
+        activity.save()
+        self.assertEqual(self.nav(user)['student']['totalhours'], 1)
+        self.student.name = '改名'
+        self.student.power = 1
+        self.student.save()
+        self.assertEqual((self.nav(user)['student']['name'], self.nav(user)['student']['power']), ('改名', 1))
+
+        self.nav(self.admin)
+        Student.objects.create(user=self.admin, number=1, name='管理员', classtype='', grade=2017, phone='')
+        self.assertEqual(self.nav(self.admin)['student']['name'], '管理员')
+
+
+class FragmentCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.student = create_student(2017000001)
+        self.client.force_login(self.admin)
+
+    def get_tab(self):
+        with CaptureQueriesContext(connection) as queries:
+            content = self.client.get('/tabs/admin_students/').content.decode('utf-8')
+        return content, [query['sql'] for query in queries if 'sua_student' in query['sql']]
+
+    def test_tab(self):
+        content, queries = self.get_tab()
+        self.assertIn('学生', content)
+        self.assertTrue(queries)
+        self.assertEqual(self.get_tab(), (content, []))
+
+        self.student.name = '改名'
+        self.student.save()
+        self.assertIn('改名', self.get_tab()[0])
+        bulk.add_suas(create_activity(self.admin), self.admin, [{'student': self.student.pk, 'suahours': 2.5}])
+        self.assertIn('<td>2.5</td>', self.get_tab()[0])
+        self.student.delete()
+        self.assertNotIn('改名', self.get_tab()[0])
+
+    def test_shared_between_processes(self):
+        # 另一个进程(如run_jobs的worker)中的缓存对象：版本号的变化对web进程可见
+        config = settings.CACHES['default']
+        other = type(caches['default'])(config['LOCATION'], config)
+        before = versions.get([Student])
+        versions.bump(Student)
+        self.assertGreater(other.get(versions._key(Student)), before[0])
+
+    def test_staff_activity_admin(self):
+        # 同时是活动级管理员的管理员只看到自己活动的删除记录，不能与其他管理员共用缓存
+        other = create_student(2016000001, 'other_admin')
+        other.power = 1
+        other.save()
+        other.user.is_staff = True
+        other.user.save()
+        create_activity(self.admin).delete()
+        create_activity(other.user).delete()
+        for user, count in ((self.admin, 2), (other.user, 1), (self.admin, 2)):
+            self.client.force_login(user)
+            content = self.client.get('/tabs/deleted_activities/').content.decode('utf-8')
+            self.assertEqual(content.count('data-target="#confirm_box_revoke_activity_'), count)
+            self.assertEqual(self.client.get('/').context['tab_counts']['deleted_activities'], count)
+
+    def test_bump(self):
+        before = versions.get([Student, Sua])
+        self.assertEqual(versions.get([Student, Sua]), before)
+        bulk.add_suas(create_activity(self.admin), self.admin, [{'student': self.student.pk, 'suahours': 1}])
+        after = versions.get([Student, Sua])
+        self.assertTrue(after[0] > before[0] and after[1] > before[1])
+        cache.clear()  # 版本号丢失后不会回到用过的值
+        self.assertTrue(versions.get([Student])[0] > after[0])
+
+    def test_index(self):
+        activity = create_activity(self.admin)
+        today = timezone.localdate()
+        Publicity.objects.create(owner=self.admin, activity=activity, title='当前公示', content='', contact='',
+                                 is_published=True, begin=today, end=today)
+        Publicity.objects.create(owner=self.admin, activity=activity, title='以后的公示', content='', contact='',
+                                 is_published=True, begin=today + datetime.timedelta(days=1), end=today + datetime.timedelta(days=2))
+        response = self.client.get('/?tab=admin_students')
+        self.assertEqual([publicity['title'] for publicity in response.context['publicities']], ['当前公示'])
+        self.assertContains(response, '2017000001')
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/?tab=admin_students')
+        self.assertEqual(cached.context['publicities'], response.context['publicities'])
+        self.assertEqual(cached.context['active_tab'], response.context['active_tab'])
+        self.assertFalse([query for query in queries if 'sua_publicity' in query['sql']])
+
+
+class TabsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        User.objects.bulk_create([User(username='tab%03d' % i) for i in range(205)])
+        users = User.objects.filter(username__startswith='tab').order_by('username')
+        Student.objects.bulk_create([
+            Student(user=user, number=2018000000 + i, name='学生', classtype='1班', grade=2018, phone='')
+            for i, user in enumerate(users)
+        ])
+        self.activity_admin = create_student(2016000001, 'activity_admin')
+        self.activity_admin.power = 1
+        self.activity_admin.save()
+        self.student = create_student(2016000002, 'student')
+
+    def page(self, **params):
+        request = RequestFactory().get('/tabs/admin_students/', params)
+        request.user = self.admin
+        return tabs.TABS['admin_students'].page('admin_students', request)
+
+    def test_page_size(self):
+        page = self.page()
+        self.assertEqual((len(page['rows']), page['count']), (50, 207))
+        self.assertEqual(page['rows'][0]['number'], 2016000001)
+        page = self.page(page=2, page_size=20)
+        self.assertEqual([row['number'] for row in page['rows']][:1], [2018000018])
+        self.assertEqual(len(page['rows']), 20)
+        self.assertEqual(len(self.page(page_size=1000)['rows']), tabs.MAX_PAGE_SIZE)
+        self.assertEqual(len(self.page(page_size='x')['rows']), tabs.PAGE_SIZE)
+        page = self.page(page=5, grade=2018)  # 最后一页
+        self.assertEqual((len(page['rows']), page['count'], page['query']), (5, 205, 'grade=2018'))
+
+    def test_visible_tabs(self):
+        self.assertEqual(tabs.visible_tabs(self.admin), list(tabs.TABS))
+        self.assertEqual(
+            tabs.visible_tabs(self.activity_admin.user),
+            ['admin_activities', 'admin_applications', 'deleted_activities', 'deleted_applications'],
+        )
+        self.assertEqual(tabs.visible_tabs(self.student.user), [])
+
+    def test_permission(self):
+        for student in (self.activity_admin, self.student):
+            self.client.force_login(student.user)
+            for name in tabs.TABS:
+                if name in tabs.visible_tabs(student.user):
+                    continue
+                with self.subTest(user=student.number, tab=name):
+                    response = self.client.get('/tabs/%s/' % name)  # 403由redirect_exception_handler转为跳转
+                    self.assertEqual((response.status_code, response['Location']), (302, '/?status=403'))
+        self.assertEqual(self.client.get('/tabs/unknown/').status_code, 404)
+        self.client.force_login(self.activity_admin.user)
+        self.assertEqual(self.client.get('/tabs/admin_activities/').status_code, 200)
+
+    def test_counts(self):
+        create_activity(self.activity_admin.user)
+        create_activity(self.activity_admin.user).delete()
+        create_activity(self.admin)
+        self.student.delete()
+        for user in (self.admin, self.activity_admin.user):
+            self.client.force_login(user)
+            response = self.client.get('/')
+            request = response.wsgi_request
+            self.assertEqual(set(response.context['tab_counts']), set(tabs.visible_tabs(user)))
+            for name, count in response.context['tab_counts'].items():
+                with self.subTest(user=user.username, tab=name):
+                    self.assertEqual(count, tabs.TABS[name].queryset(request).count())
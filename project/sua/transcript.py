@@ -0,0 +1,148 @@
+"""
+学生公益时记录(成绩单)的PDF
+
+字体和学院标志在进程内只加载一次(settings.TRANSCRIPT_FONT、TRANSCRIPT_LOGO)；
+TRANSCRIPT_FONT不存在时使用reportlab内置的STSong-Light(CID字体，不嵌入PDF，由阅读器提供)。
+记录较多时自动分页，每页重复表头并标注页码。
+本模块不访问数据库，render_pdf()可以在进程池中执行(见project/sua/exports.py)。
+"""
+import logging
+import os
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger('project.sua.transcript')
+
+FONT_NAME = 'song'
+FALLBACK_FONT = 'STSong-Light'
+
+LEFT = 50  # 第一列文字的横坐标
+COLUMN = 210  # 列宽
+RIGHT = 545
+TOP = 800  # 第二页起表格的上边
+FIRST_PAGE_TOP = 700  # 第一页表格的上边(上方为标题、学号等)
+BOTTOM = 50
+ROW_HEIGHT = 50
+LOGO_SIZE = 90
+LOGO_PIXELS = 250  # 约200dpi
+
+_lock = threading.Lock()
+_resources = None
+
+
+def resources():
+    """
+    返回(字体名, 学院标志的ImageReader)，第一次调用时注册字体、读取图片
+    """
+    global _resources
+    if _resources is None:
+        with _lock:
+            if _resources is None:
+                _resources = _load()
+    return _resources
+
+
+def _load():
+    if os.path.exists(settings.TRANSCRIPT_FONT):
+        pdfmetrics.registerFont(TTFont(FONT_NAME, settings.TRANSCRIPT_FONT))
+        font = FONT_NAME
+    else:
+        logger.warning('%s not found, using %s', settings.TRANSCRIPT_FONT, FALLBACK_FONT)
+        pdfmetrics.registerFont(UnicodeCIDFont(FALLBACK_FONT))
+        font = FALLBACK_FONT
+    # 没有编译rl_accel时ASCII85编码由纯Python完成，占渲染时间的大部分；PDF都是二进制下载，不需要ASCII85。
+    # reportlab只有全局的设置，会影响进程中所有使用reportlab生成的PDF
+    rl_config.useA85 = 0
+    # 原图为724x723的PNG，每份PDF都要重新压缩、编码一遍；缩小后转为JPEG，drawImage把JPEG数据直接写入PDF
+    image = Image.open(settings.TRANSCRIPT_LOGO).convert('RGB')
+    image.thumbnail((LOGO_PIXELS, LOGO_PIXELS), Image.LANCZOS)
+    jpeg = BytesIO()
+    image.save(jpeg, 'JPEG', quality=90)
+    jpeg.seek(0)
+    return font, ImageReader(jpeg)
+
+
+def rows_per_page(top):
+    # 表格上边为top时一页能放下的记录数：表头占60，每条记录占ROW_HEIGHT
+    return (top - 60 - (BOTTOM + ROW_HEIGHT - 15)) // ROW_HEIGHT + 1
+
+
+def pages(rows):
+    """
+    把记录按页分组，第一页的表格在标题下方
+    """
+    rows = list(rows)
+    size = rows_per_page(FIRST_PAGE_TOP)
+    chunks = [rows[:size]]
+    rows = rows[size:]
+    size = rows_per_page(TOP)
+    while rows:
+        chunks.append(rows[:size])
+        rows = rows[size:]
+    return chunks
+
+
+def _draw_table(p, top, rows):
+    p.drawString(LEFT, top - 20, "活动名称")
+    p.drawString(LEFT + COLUMN, top - 20, "活动团体")
+    p.drawString(LEFT + COLUMN * 2, top - 20, "公益时数")
+    location = top - 60
+    for title, group, hours in rows:
+        p.drawString(LEFT, location, str(title))  # 活动主题
+        p.drawString(LEFT + COLUMN, location, str(group))  # 活动团体
+        p.drawString(LEFT + COLUMN * 2, location, str(hours) + 'h')  # 公益时数
+        location -= ROW_HEIGHT
+        p.line(LEFT - 5, location + 15, RIGHT, location + 15)  # 第N横
+    bottom = min(location + 15, top - 45)
+    p.line(LEFT - 5, top, RIGHT, top)  # 第一横
+    p.line(LEFT - 5, top - 45, RIGHT, top - 45)  # 第二横
+    for x in (LEFT - 5, LEFT + COLUMN - 5, LEFT + 2 * COLUMN - 5, RIGHT):  # 竖线
+        p.line(x, top, x, bottom)
+
+
+def render(out, number, name, hours, rows):
+    """
+    把成绩单写入文件对象out。rows为(活动名称, 活动团体, 公益时数)的序列
+    """
+    font, logo = resources()
+    chunks = pages(rows)
+    p = canvas.Canvas(out)
+    p.setTitle('公益时记录')
+    for index, chunk in enumerate(chunks):
+        if index == 0:
+            p.setFont(font, 22)  # 字号
+            p.drawString(LEFT - 5, 780, "公益时记录")  # 标题
+            with _lock:  # 各线程共用logo中的文件对象
+                p.drawImage(logo, 460, 705, LOGO_SIZE, LOGO_SIZE)  # 学院标志
+            p.setFont(font, 15)
+            p.drawString(LEFT - 5, 750, '学号:' + str(number))
+            p.drawString(LEFT + 150, 750, '名字:' + str(name))
+            p.drawString(LEFT - 5, 720, '总公益时数:' + str(hours) + 'h')
+            top = FIRST_PAGE_TOP
+        else:
+            p.setFont(font, 15)
+            top = TOP
+        _draw_table(p, top, chunk)
+        if len(chunks) > 1:
+            p.setFont(font, 10)
+            p.drawCentredString((LEFT + RIGHT) / 2, BOTTOM - 25, '第%d/%d页' % (index + 1, len(chunks)))
+        p.showPage()
+    p.save()
+
+
+def render_pdf(transcript):
+    """
+    transcript为(学号, 姓名, 公益时总数, 记录)，返回PDF的内容
+    """
+    out = BytesIO()
+    render(out, *transcript)
+    return out.getvalue()
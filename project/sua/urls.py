@@ -5,9 +5,10 @@ import project.sua.views.admin.views as admin
 import project.sua.views.student.views as student
 import project.sua.views.form.views as form
 import project.sua.views.form.views2 as form2
+import project.sua.views.jobs.views as jobs
 from project.sua.views.form.base import StudentViewSet
 from project.sua.views.apis import apis, auths
-from project.sua.views.index.views import IndexView
+from project.sua.views.index.views import IndexView, IndexTabView
 
 from rest_framework import routers
 
@@ -39,6 +40,7 @@ rou.register(r'appeals', apis.AppealViewSet, base_name="api-appeal")
 # app_name = 'sua'
 urlpatterns = [
     path('',login_required(IndexView.as_view()), name='index'),
+    path('tabs/<str:name>/',login_required(IndexTabView.as_view())),
     path('suas/export/',login_required(student.SuasExportView.as_view())),
 #    path('', login_required(student.IndexView.as_view()), name='index'),
     path('apis/',include(rou.urls)),
@@ -57,10 +59,17 @@ urlpatterns = [
     path('admin/publicities/<int:pk>/change/',login_required(admin.ChangePublicityView.as_view())),
     path('admin/publicities/<int:pk>/manage/',login_required(admin.ManagePublicityView.as_view())),
     path('admin/activities/<int:pk>/suas/add/',login_required(admin.AddSuaForActivityView.as_view())),
+    path('admin/activities/<int:pk>/suas/bulk/',login_required(admin.BulkAddSuaForActivityView.as_view())),
+    path('admin/activities/<int:pk>/suas/students/',login_required(admin.SearchStudentsForActivityView)),
     path('admin/suas/<int:pk>/change/',login_required(admin.ChangeSuaForActivityView.as_view())),
+    path('admin/students/transcripts/',login_required(admin.ExportTranscriptsView)),
+    path('admin/students/hours/',login_required(admin.ExportHoursView)),
+    path('admin/students/import/',login_required(admin.ImportStudentsView.as_view())),
     path('applications/merge',login_required(admin.ApplicationsMergeView.as_view())),
     path('admin/activities/<int:pk>/check/',login_required(admin.CheckTheActivityView)),
     path('admin/publicities/<int:pk>/check/',login_required(admin.CheckThePublicityView)),
     path('admin/suas/<int:pk>/check/',login_required(admin.CheckTheSuaView)),
     path('students/<int:pk>/changepassword/',login_required(student.ChangePasswordView.as_view())),
+    path('jobs/<int:pk>/',login_required(jobs.JobView)),
+    path('jobs/<int:pk>/download/',login_required(jobs.JobFileView)),
 ]
@@ -0,0 +1,78 @@
+"""
+按模型的版本号缓存页面片段和序列化结果
+
+MODELS中的每个模型在缓存中有一个版本号。记录保存、删除、软删除、恢复时由signals/handlers.py调用bump()，
+不发送信号的批量写入(QuerySet.update、bulk_create)由写入的代码调用bump()。
+cached()的缓存键包含相关模型当前的版本号，数据变化后旧的缓存不会再被读到，到期后由缓存清除。
+多进程部署时CACHES['default']需要是各进程共享的缓存，否则其他进程最多在FRAGMENT_CACHE_TIMEOUT内显示旧的数据。
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from project.sua.models import Activity, Appeal, Application, Publicity, Student, Sua
+
+MODELS = (Student, Activity, Sua, Application, Appeal, Publicity)
+VERSION_KEY = 'sua:version:%s'
+FRAGMENT_KEY = 'sua:fragment:%s:%s'
+
+
+def _key(model):
+    return VERSION_KEY % model._meta.label_lower
+
+
+def _initial():
+    # 版本号丢失(缓存重启或被清除)后从当前时间(毫秒)重新开始，不会回到用过的版本号
+    return int(time.time() * 1000)
+
+
+def get(models):
+    """
+    models当前的版本号列表
+    """
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _incr(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def after_commit(fn):
+    """
+    使缓存失效：立即调用fn()，所在事务提交后再调用一次(不在事务中时on_commit会立即再调用)。
+    事务提交前其他请求读到的仍是旧数据，可能在第一次调用后把旧数据重新写入缓存，
+    提交后的第二次调用清除这些旧数据；只在提交后调用则事务执行期间会一直读到修改前的缓存
+    """
+    fn()
+    transaction.on_commit(fn)
+
+
+def bump(*models):
+    keys = [_key(model) for model in models]
+    after_commit(lambda: _incr(keys))
+
+
+def cached(name, models, parts, compute, timeout=None):
+    """
+    返回compute()的结果，按name、parts(可repr的请求参数等)和models的版本号缓存
+    """
+    digest = hashlib.md5(repr((parts, get(models))).encode('utf-8')).hexdigest()
+    key = FRAGMENT_KEY % (name, digest)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout or settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
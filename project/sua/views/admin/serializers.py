@@ -1,11 +1,12 @@
 from rest_framework import serializers
+from project.sua.prefetch import PrefetchMixin
 from project.sua.serializers import PublicityWithActivitySerializer
 from project.sua.serializers import PublicitySerializer
 from project.sua.serializers import StudentSerializer
 from project.sua.serializers import SuaSerializer
 from project.sua.models import Activity, Appeal, Proof, Sua, Application, Publicity,Student
 
-class ActivityForAdminSerializer(serializers.HyperlinkedModelSerializer):
+class ActivityForAdminSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     publicities = PublicityWithActivitySerializer(many=True)
 
     class Meta:
@@ -13,13 +14,13 @@ class ActivityForAdminSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'title', 'date', 'detail', 'group', 'is_valid', 'suas', 'publicities', 'id')
 
 
-class AdminAppealSerializer(serializers.HyperlinkedModelSerializer):
+class AdminAppealSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Appeal
         fields = ('url', 'status','feedback',)
 
-class AdminPublicitySerializer(serializers.HyperlinkedModelSerializer):
+class AdminPublicitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     publicity = PublicitySerializer()
     student = StudentSerializer()
 
@@ -28,13 +29,13 @@ class AdminPublicitySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url','content','student','publicity')
 
 
-class ProofforApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class ProofforApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Proof
         fields = ('url', 'is_offline', 'proof_file')
 
 
-class AdminApplicationMassageSerializer(serializers.HyperlinkedModelSerializer):
+class AdminApplicationMassageSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     proof = ProofforApplicationsSerializer()
     sua = SuaSerializer()
     class Meta:
@@ -42,13 +43,13 @@ class AdminApplicationMassageSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'proof', 'sua',)
 
 
-class SuaforApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class SuaforApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Sua
         fields = ('url', 'is_valid')
 
 
-class AdminApplicationSerializer(serializers.HyperlinkedModelSerializer):
+class AdminApplicationSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Application
         fields = ('url', 'status','feedback', )
@@ -57,20 +58,20 @@ class AdminApplicationSerializer(serializers.HyperlinkedModelSerializer):
 #    class Meta:
 #        model = Student
 #        fields = ('name','number')
-class AdminAddSuaForActivitySerializer(serializers.HyperlinkedModelSerializer):
+class AdminAddSuaForActivitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 #    students = studentwithnumberSerializer()
     class Meta:
         model = Sua
         fields = ('url', 'student', 'team', 'suahours',)
 
 
-class PublicityWithActivitySerializer(serializers.HyperlinkedModelSerializer):
+class PublicityWithActivitySerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Publicity
         fields = ('url', 'created', 'title', 'content', 'contact', 'is_published', 'begin', 'end', 'id')
 
-class AdminActivitySerializer(serializers.ModelSerializer):
+class AdminActivitySerializer(PrefetchMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Activity
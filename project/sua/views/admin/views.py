@@ -12,6 +12,13 @@ from project.sua.serializers import AppealSerializer
 from project.sua.serializers import StudentSerializer
 from project.sua.serializers import ActivitySerializer
 from project.sua.serializers import ActivityWithSuaSerializer
+from project.sua.read_serializers import StudentReadSerializer
+from project.sua.read_serializers import AppealReadSerializer
+from project.sua.read_serializers import ApplicationReadSerializer
+from project.sua.read_serializers import ActivityReadSerializer
+from project.sua.read_serializers import ActivityForAdminReadSerializer
+from project.sua.read_serializers import PublicityReadSerializer
+from project.sua.read_serializers import StudentPickerSerializer
 
 from .serializers import AdminAddSuaForActivitySerializer
 from .serializers import AdminApplicationSerializer
@@ -31,7 +38,22 @@ from .serializers import PublicityWithActivitySerializer
 
 from project.sua.permissions import IsAdminUserOrActivity
 
-from django.http import HttpResponseRedirect, Http404
+from project.sua import bulk
+from project.sua import exports
+from project.sua import facets
+from project.sua import imports
+from project.sua import jobs
+from project.sua import merge
+from project.sua.prefetch import optimize
+from project.sua.views.index import tabs
+from project.sua.views.jobs.views import get_job
+
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
 
 
 class IndexView(BaseView, NavMixin):
@@ -51,59 +73,45 @@ class IndexView(BaseView, NavMixin):
 #        else:
         deleteds = {}
         student_set = Student.objects.filter(deleted_at=None).order_by('number')  # 获取所有学生信息
-        student_data = StudentSerializer(  # 序列化所有学生信息
+        student_data = StudentReadSerializer(  # 序列化所有学生信息
             student_set,
             many=True,
             context={'request': request}
         )
 
-        deleteds['students'] = tools.get_deleteds(Student, StudentSerializer, request)
+        deleteds['students'] = tools.get_deleteds(Student, StudentReadSerializer, request)
 
         appeal_set = Appeal.objects.filter(deleted_at=None).order_by(
             'is_checked', '-created')  # 获取在公示期内的所有申诉
-        appeal_data = AppealSerializer(  # 序列化申诉
+        appeal_data = AppealReadSerializer(  # 序列化申诉
             appeal_set,
             many=True,
             context={'request': request}
         )
         appeals = appeal_data.data
-        for appeal in appeals:
-            appeal['created'] = tools.DateTime2String_SHOW(
-                tools.TZString2DateTime(appeal['created']))
 
-        deleteds['appeals'] = tools.get_deleteds(Appeal, AppealSerializer, request)
+        deleteds['appeals'] = tools.get_deleteds(Appeal, AppealReadSerializer, request)
 
         application_set = Application.objects.filter(deleted_at=None).order_by('is_checked', '-created')# 获取所有申请,按时间的倒序排序
-        application_data = ApplicationSerializer(  # 序列化所有申请
+        application_data = ApplicationReadSerializer(  # 序列化所有申请
             application_set,
             many=True,
             context={'request': request}
         )
         applications = application_data.data
-        for application in applications:
-            application['created'] = tools.DateTime2String_SHOW(
-                tools.TZString2DateTime(application['created']))
 
-        deleteds['applications'] = tools.get_deleteds(Application, ApplicationSerializer, request)
+        deleteds['applications'] = tools.get_deleteds(Application, ApplicationReadSerializer, request)
 
         activity_set = Activity.objects.filter(
             deleted_at=None).order_by('-created')  # 获取所有当前管理员创建的活动
-        activity_data = ActivityForAdminSerializer(  # 序列化所有所有当前管理员创建的活动
+        activity_data = ActivityForAdminReadSerializer(  # 序列化所有所有当前管理员创建的活动
             activity_set,
             many=True,
             context={'request': request}
         )
 
-        deleteds['activities'] = tools.get_deleteds(Activity, ActivitySerializer, request)
+        deleteds['activities'] = tools.get_deleteds(Activity, ActivityReadSerializer, request)
         activities = activity_data.data
-        for activity in activities:
-            activity['date'] = tools.Date2String_SHOW(
-                tools.TZString2DateTime(activity['date']))
-            for publicity in activity['publicities']:
-                publicity['begin'] = tools.DateTime2String_SHOW(
-                    tools.TZString2DateTime(publicity['begin']))
-                publicity['end'] = tools.DateTime2String_SHOW(
-                    tools.TZString2DateTime(publicity['end']))
 
         # deleteds.sort(key=tools.sort_by_deletedAt, reverse=True)
 
@@ -119,24 +127,8 @@ class IndexView(BaseView, NavMixin):
         })
         return serialized
     def deserialize(self, request, *args, **kwargs):
-        merge_applications = []
-        applications = Application.objects.filter(deleted_at=None,).all()
-        for application in applications:
-            if str(application.id) in request.data:
-                merge_applications.append(application)
-        if 'activity_id' in request.data:
-            activity = Activity.objects.filter(id=request.data['activity_id'],deleted_at=None).get()
-        elif bool(merge_applications):
-            activity = merge_applications[0].sua.activity
-        print(activity)
-        for i in range(len(merge_applications)):
-            sua = Sua.objects.filter(deleted_at=None,application=merge_applications[i]).update(activity=activity)
-            print(sua)
-            #sua.save(activity=activity)
-            #else:
-                #return False
-
-        self.url="/admin"
+        job = merge.enqueue_posted(request.data, request.user)
+        self.url = merge.STATUS_URL % job.pk
         return True
 
 class AppealView(BaseView, NavMixin):
@@ -368,18 +360,11 @@ class ManagePublicityView(BaseView, NavMixin):
             deleted_at=None,
             activity=activity
         ).order_by('-is_published', '-created')
-        publicity_data = PublicitySerializer(  # 序列化公示
+        publicity_data = PublicityReadSerializer(  # 序列化公示
             publicity_set,
             many=True,
             context={'request': request}
         )
-        for publicity in publicity_data.data:
-            publicity['created'] = tools.DateTime2String_SHOW(
-                tools.TZString2DateTime(publicity['created']))
-            publicity['begin'] = tools.DateTime2String_SHOW(
-                tools.TZString2DateTime(publicity['begin']))
-            publicity['end'] = tools.DateTime2String_SHOW(
-                tools.TZString2DateTime(publicity['end']))
 
         serialized.update({
             'activity': activity,
@@ -409,32 +394,21 @@ class AddSuaForActivityView(BaseView, NavMixin):
     }
     def serialize(self, request, *args, **kwargs):
         activity_id = kwargs['pk']
-        activity = Activity.objects.filter(deleted_at=None,id=activity_id).get()
+        activity = optimize(
+            Activity.objects.filter(deleted_at=None,id=activity_id),
+            ActivityWithSuaSerializer,
+        ).get()
         serialized = super(AddSuaForActivityView, self).serialize(request)
         activitySerializer = ActivityWithSuaSerializer(
             activity,
             context={'request': request}
         )
-        students = []
-        filter_students = []
-        for sua in activity.suas.filter(deleted_at=None):
-            filter_students.append(sua.student)
-        for student in Student.objects.filter(deleted_at=None):
-            if student not in filter_students:
-                studentSerializer = StudentSerializer(
-                    instance=student,
-                    context={'request': request}
-                )
-                students.append(studentSerializer.data)
-
-        # print(students)
-
         suaSerializer = AdminAddSuaForActivitySerializer(
             context={'request': request})
         serialized.update({
             'activity': activitySerializer.data,
             'serializer': suaSerializer,
-            'students': students,
+            'search_url': '/admin/activities/%d/suas/students/' % activity.id,  # 学生由页面按输入搜索
         })
         return serialized
 
@@ -463,6 +437,196 @@ class AddSuaForActivityView(BaseView, NavMixin):
             return False
 
 
+class BulkAddSuaForActivityView(BaseView, NavMixin):
+    """
+    批量添加参与人：每行"学号 公益时数 组别"(以空格、逗号或制表符分隔，可以直接从表格中复制)，
+    公益时数和组别可以省略，使用表单中的默认值。所有行一起校验，见project/sua/bulk.py
+    """
+    template_name = 'sua/admin_sua_bulk_add.html'
+    components = {
+        'nav': 'nav',
+    }
+    errors = None
+
+    def get_activity(self, request, pk):
+        activity = Activity.objects.filter(deleted_at=None, id=pk).first()
+        if activity is None:
+            raise Http404
+        user = request.user
+        if not (user.is_staff or (hasattr(user, 'student') and user.student.power == 1 and activity.owner_id == user.id)):
+            raise PermissionDenied
+        return activity
+
+    def serialize(self, request, *args, **kwargs):
+        activity = self.get_activity(request, kwargs['pk'])
+        serialized = super(BulkAddSuaForActivityView, self).serialize(request)
+        serialized.update({
+            'activity': activity,
+            'data': request.data if request.method == 'POST' else {},
+            'errors': self.errors,
+        })
+        return serialized
+
+    def deserialize(self, request, *args, **kwargs):
+        activity = self.get_activity(request, kwargs['pk'])
+        lines, entries = [], []
+        for line, text in enumerate(request.data.get('text', '').splitlines(), 1):
+            values = [value for value in re.split(r'[\s,，]+', text.strip()) if value]
+            if not values:
+                continue
+            lines.append(line)
+            entries.append({
+                'number': values[0],
+                'suahours': values[1] if len(values) > 1 else request.data.get('suahours', ''),
+                'team': ' '.join(values[2:]) if len(values) > 2 else request.data.get('team', ''),
+            })
+        serializer = bulk.BulkSuaSerializer(data={'suas': entries}, context={'request': request, 'activity': activity})
+        if not serializer.is_valid():
+            self.errors = bulk_errors(serializer.errors['suas'], lines)
+            return False
+        serializer.save(owner=request.user)
+        self.url = '/activities/%d/' % activity.pk
+        return True
+
+
+def bulk_errors(errors, lines):
+    # BulkSuaSerializer的错误，各条目的错误前加上行号
+    if isinstance(errors, dict):
+        return [message for messages in errors.values() for message in messages]
+    messages = []
+    for index, error in enumerate(errors):
+        if not isinstance(error, dict):
+            messages.append(error)
+        elif error:
+            messages.append('第%d行：%s' % (lines[index], '；'.join(
+                message for field in error.values() for message in field)))
+    return messages
+
+
+STUDENT_SEARCH_PAGE_SIZE = 20
+STUDENT_SEARCH_MAX_PAGE_SIZE = 100
+
+
+def SearchStudentsForActivityView(request, *args, **kwargs):
+    """
+    添加参与人时搜索学生：?q=学号前缀/姓名/班级，可用grade、classtype筛选，?page=页码；
+    已参与该活动的学生不会出现在结果中。返回JSON
+    """
+    activity = Activity.objects.filter(deleted_at=None, id=kwargs['pk']).first()
+    if activity is None:
+        raise Http404
+    user = request.user
+    if not (user.is_staff or (hasattr(user, 'student') and user.student.power == 1 and activity.owner_id == user.id)):
+        raise PermissionDenied
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        size = min(max(int(request.GET.get('page_size', STUDENT_SEARCH_PAGE_SIZE)), 1), STUDENT_SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'detail': 'invalid page'}, status=400)
+    participants = Sua.objects.filter(activity=activity, deleted_at=None).values('student_id')
+    students = facets.filter_students(Student.objects.filter(deleted_at=None), request.GET)
+    students = facets.search_students(students, request.GET.get('q', '')).exclude(
+        pk__in=participants,  # NOT IN子查询，由数据库排除已参与的学生
+    ).order_by('number')
+    rows = list(students[(page - 1) * size:page * size + 1])  # 多取一行判断是否还有下一页
+    return JsonResponse({
+        'results': StudentPickerSerializer(rows[:size], many=True, context={'request': request}).data,
+        'page': page,
+        'has_next': len(rows) > size,
+    })
+
+
+def ExportTranscriptsView(request):
+    """
+    按grade、classtype及year_begin、year_end(学年区间)筛选学生，导出每个学生的公益时记录PDF，打包为ZIP。
+    POST提交后台任务(sua.export_transcripts)，返回任务状态，完成后从/jobs/<id>/download/下载；
+    GET在请求中直接输出ZIP，只用于不超过TRANSCRIPT_SYNC_MAX个学生，更多时返回400
+    """
+    if not request.user.is_staff:
+        raise PermissionDenied
+    if request.method == 'POST':
+        job = jobs.enqueue(
+            'sua.export_transcripts', owner=request.user,
+            grade=request.GET.get('grade'), classtype=request.GET.get('classtype'),
+            years=tools.get_academic_years(request),
+        )
+        return JsonResponse(jobs.status(job), status=202)
+    students = facets.filter_students(Student.objects.filter(deleted_at=None), request.GET)
+    if students.count() > settings.TRANSCRIPT_SYNC_MAX:
+        return HttpResponseBadRequest('学生超过%d个，请用“导出公益时记录”提交后台任务' % settings.TRANSCRIPT_SYNC_MAX)
+    response = StreamingHttpResponse(
+        exports.transcripts_zip(students, tools.get_academic_years(request), pool=False),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = 'attachment; filename=transcripts.zip'
+    return response
+
+
+EXPORT_FORMATS = {
+    'csv': (exports.csv_chunks, 'text/csv; charset=utf-8'),
+    'xlsx': (exports.xlsx_chunks, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def ExportHoursView(request):
+    """
+    导出学生各学年的公益时，筛选条件与首页的学生标签页相同，可加year_begin、year_end限定学年；
+    ?format=csv(默认)或xlsx
+    """
+    students = tabs.students(request)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise Http404
+    chunks, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        chunks(exports.hours_table(students, tools.get_academic_years(request))),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = 'attachment; filename=hours.%s' % export_format
+    return response
+
+
+class ImportStudentsView(BaseView, NavMixin):
+    """
+    上传CSV/XLSX文件批量创建学生，导入作为后台任务(sua.import_students)执行；
+    提交后跳转到?job=<id>，页面显示任务的进度和报告
+    """
+    template_name = 'sua/admin_students_import.html'
+    components = {
+        'nav': 'nav',
+    }
+    error = None
+
+    def serialize(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        serialized = super(ImportStudentsView, self).serialize(request)
+        job = None
+        if request.GET.get('job', '').isdigit():
+            job = jobs.status(get_job(request, int(request.GET['job'])))
+        serialized.update({
+            'job': job,
+            'error': self.error,
+            'columns': imports.COLUMNS,
+        })
+        return serialized
+
+    def deserialize(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        upload = request.data.get('file')
+        if not upload or os.path.splitext(upload.name)[1].lower() not in ('.csv', '.xlsx'):
+            self.error = '请选择CSV或XLSX文件'
+            return False
+        name = jobs.files.save('imports/%s' % os.path.basename(upload.name), upload)
+        job = jobs.enqueue(
+            'sua.import_students', owner=request.user,
+            file=name, dry_run=bool(request.data.get('dry_run')),
+        )
+        self.url = '/admin/students/import/?job=%d' % job.pk
+        return True
+
+
 class ChangeSuaForActivityView(BaseView, NavMixin):
     template_name = 'sua/admin_sua_add.html'
     components = {
@@ -567,42 +731,24 @@ class ApplicationsMergeView(BaseView, NavMixin):
             context={'request':request},
             )
         application_set = Application.objects.filter(deleted_at=None, is_checked=False).order_by('created')# 获取所有申请,按时间的倒序排序
-        applications_data = ApplicationSerializer(  # 序列化所有申请
+        applications_data = ApplicationReadSerializer(  # 序列化所有申请
             application_set,
             many=True,
             context={'request':request},
             )
-        for application in applications_data.data:
-            application['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(application['created']))
         serialized = super(ApplicationsMergeView, self).serialize(request)
+        job = None
+        if request.GET.get('job', '').isdigit():  # 提交后跳转到?job=<id>，显示合并任务的状态和报告
+            job = jobs.status(get_job(request, int(request.GET['job'])))
         serialized.update({
             'activities': activities_data.data,
             'applications': applications_data.data,
+            'job': job,
         })
 
         return serialized
 
     def deserialize(self, request, *args, **kwargs):
-        merge_applications = []
-        applications = Application.objects.filter(deleted_at=None,).all()
-        for application in applications:
-            if str(application.id) in request.data:
-                merge_applications.append(application)
-        #print(request.data)
-        if 'activity_id' in request.data:
-            if request.data['activity_id'] in ['None', ''] and bool(merge_applications):
-                activity = merge_applications[0].sua.activity
-            else:
-                activity = Activity.objects.filter(id=request.data['activity_id'],deleted_at=None).get()
-
-        #print(activity)
-        #print(merge_applications)
-        for i in range(len(merge_applications)):
-            sua = Sua.objects.filter(deleted_at=None,application=merge_applications[i]).get()
-            old_activity = sua.activity
-            Sua.objects.filter(deleted_at=None,application=merge_applications[i]).update(activity=activity)
-            if old_activity != activity and old_activity.is_created_by_student:
-                old_activity.delete()
-
-        self.url="/"
+        job = merge.enqueue_posted(request.data, request.user)
+        self.url = merge.STATUS_URL % job.pk
         return True
@@ -1,5 +1,10 @@
-from rest_framework import viewsets
-from project.sua.permissions import IsAdminUserOrReadOnly
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import detail_route
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from project.sua.bulk import BulkSuaSerializer
+from project.sua.permissions import IsAdminUserOrActivity, IsAdminUserOrReadOnly
+from project.sua.prefetch import PrefetchQuerySetMixin
 
 from django.contrib.auth.models import User
 
@@ -7,35 +12,48 @@ from project.sua.models import Student,Proof,Sua,Activity,Publicity,Application,
 
 from project.sua.views.apis.serializer import *
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (IsAdminUserOrReadOnly,)
 
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Student.objects.filter(deleted_at=None)
     serializer_class = StudentSerializer
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Activity.objects.filter(deleted_at=None)
     serializer_class = ActivitySerializer
 
-class PublicityViewSet(viewsets.ModelViewSet):
+    @detail_route(methods=['post'], permission_classes=(permissions.IsAuthenticated, IsAdminUserOrActivity))
+    def suas(self, request, pk=None):
+        """
+        批量添加参与人：{"suas": [{"student": id或"number": 学号, "team": 组别, "suahours": 公益时数}, ...]}，
+        见project/sua/bulk.py；有任何一条不合法时不添加，返回各条的错误
+        """
+        activity = get_object_or_404(self.queryset, pk=pk)  # 不需要get_queryset()的预取
+        self.check_object_permissions(request, activity)
+        serializer = BulkSuaSerializer(data=request.data, context={'request': request, 'activity': activity})
+        serializer.is_valid(raise_exception=True)
+        suas = serializer.save(owner=request.user)
+        return Response({'created': len(suas)}, status=status.HTTP_201_CREATED)
+
+class PublicityViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Publicity.objects.filter(deleted_at=None)
     serializer_class = PublicitySerializer
 
-class SuaViewSet(viewsets.ModelViewSet):
+class SuaViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Sua.objects.filter(deleted_at=None)
     serializer_class = SuaSerializer
 
-class ApplicationViewSet(viewsets.ModelViewSet):
+class ApplicationViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Application.objects.filter(deleted_at=None)
     serializer_class = ApplicationSerializer
 
-class AppealViewSet(viewsets.ModelViewSet):
+class AppealViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Appeal.objects.filter(deleted_at=None)
     serializer_class = AppealSerializer
 
-class ProofViewSet(viewsets.ModelViewSet):
+class ProofViewSet(PrefetchQuerySetMixin, viewsets.ModelViewSet):
     queryset = Proof.objects.filter(deleted_at=None)
     serializer_class = ProofSerializer
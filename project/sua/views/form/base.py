@@ -9,11 +9,13 @@ from rest_framework.decorators import list_route, detail_route
 from rest_framework.renderers import TemplateHTMLRenderer
 
 from project.sua.models import Student
+from project.sua.prefetch import PrefetchQuerySetMixin
 from project.sua.views.form.serializers import AddStudentSerializer
 
 import project.sua.views.utils.tools as tools
 
 class BaseViewSet(
+    PrefetchQuerySetMixin,
     viewsets.GenericViewSet,
 
 ):
@@ -21,6 +21,7 @@ class AddStudentSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Student
         fields = ('url', 'number', 'name', 'suahours', 'grade', 'classtype', 'phone', 'user', 'id','power')
+        read_only_fields = ('suahours',)  # 由台账(project.sua.ledger)维护
 
     def create(self, validated_data):
         user_data = validated_data.pop('user')
@@ -38,7 +39,6 @@ class AddStudentSerializer(serializers.HyperlinkedModelSerializer):
         user.save()
         instance.number = validated_data.get('number',instance.number)
         instance.name = validated_data.get('name',instance.name)
-        instance.suahours = validated_data.get('suahours',instance.suahours)
         instance.grade = validated_data.get('grade',instance.grade)
         instance.classtype = validated_data.get('classtype',instance.classtype)
         instance.phone = validated_data.get('phone',instance.phone)
@@ -0,0 +1,194 @@
+"""
+首页管理端的标签页(学生、活动、申请、申诉及各类删除记录)
+
+每个标签页对应一个可筛选的查询，由IndexTabView分页渲染表格行，页面打开标签页时才加载；
+IndexView只渲染各标签页的记录数。表格行的HTML和记录数按请求参数及表格用到的模型的版本号缓存(见versions)。
+"""
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from project.sua import facets, versions
+from project.sua.models import Activity, Application, Student, Appeal, Publicity, Sua
+from project.sua.read_serializers import ApplicationReadSerializer
+from project.sua.read_serializers import AppealReadSerializer
+from project.sua.read_serializers import ActivityReadSerializer
+from project.sua.read_serializers import ActivityForAdminReadSerializer
+from project.sua.read_serializers import StudentReadSerializer
+import project.sua.views.utils.tools as tools
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def is_activity_admin(user):
+    return hasattr(user, 'student') and user.student.power == 1
+
+
+def students(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    student_set = Student.objects.filter(deleted_at=None).order_by('number')
+    return facets.filter_students(student_set, request.GET)
+
+
+def activities(request):
+    user = request.user
+    if user.is_staff:
+        return Activity.objects.filter(
+            deleted_at=None,
+            is_created_by_student=False,
+        ).order_by('-created')  # 所有管理员创建的活动
+    if is_activity_admin(user):
+        return Activity.objects.filter(
+            owner=user,
+            deleted_at=None,
+            is_created_by_student=False,
+        ).order_by('-created')  # 该活动级管理员创建的活动
+    raise PermissionDenied
+
+
+def applications(request):
+    user = request.user
+    if user.is_staff:
+        return Application.objects.filter(deleted_at=None).order_by('is_checked', '-created')
+    if is_activity_admin(user):
+        return Application.objects.filter(
+            sua__activity__owner=user,
+            sua__activity__is_created_by_student=False,
+            deleted_at=None,
+        ).order_by('-created')  # 该学生创建的活动的申请
+    raise PermissionDenied
+
+
+def appeals(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return Appeal.objects.filter(deleted_at=None).order_by('is_checked', '-created')
+
+
+def deleteds(model):
+    def queryset(request):
+        deleted_set = tools.get_deleteds_queryset(model, request)
+        if deleted_set is None:
+            raise PermissionDenied
+        return deleted_set
+    return queryset
+
+
+def show_deleted_at(row, instance):
+    row['deleted_at'] = tools.DateTime2String_SHOW(instance.deleted_at)
+
+
+class Tab(object):
+    def __init__(self, id, queryset, serializer, template, models, show=None, per_user=False):
+        self.id = id  # 所在标签页的id，用于页面内的?from=链接
+        self.queryset = queryset
+        self.serializer = serializer
+        self.template = template
+        self.models = models  # 表格行用到的模型，其中任一模型的记录变化后缓存失效
+        self.show = show
+        self.per_user = per_user  # 管理员看到的记录也可能不同，按用户缓存
+
+    def cache_parts(self, request):
+        # 查询取决于用户(管理员看到的相同，per_user的标签页除外)和请求参数，行中的链接是带域名的绝对地址
+        user = request.user
+        return (
+            self.template,
+            'staff' if user.is_staff and not self.per_user else user.pk,
+            request.build_absolute_uri('/'),
+            sorted(request.GET.lists()),
+        )
+
+    def count(self, request):
+        return versions.cached('tab_count', self.models, self.cache_parts(request),
+                               lambda: self.queryset(request).count())
+
+    def render(self, name, request):
+        """
+        一页表格行的HTML
+        """
+        html = versions.cached('tab', self.models, self.cache_parts(request),
+                               lambda: render_to_string(self.template, {'tab': self.page(name, request)}))
+        return mark_safe(html)
+
+    def page(self, name, request):
+        paginator = Paginator(self.queryset(request), page_size(request))
+        page = paginator.get_page(request.GET.get('page'))
+        rows = self.serializer(page.object_list, many=True, context={'request': request}).data
+        if self.show is not None:
+            for row, instance in zip(rows, page.object_list):
+                self.show(row, instance)
+        return {
+            'name': name,
+            'id': self.id,
+            'rows': rows,
+            'page': page,
+            'count': paginator.count,
+            'query': query_string(request),
+        }
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('page_size', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def query_string(request):
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('tab', None)
+    return query.urlencode()
+
+
+TABS = {
+    'admin_students': Tab(
+        'admin_students', students, StudentReadSerializer,
+        'sua/adminindex_tabs/students_rows.html', (Student, Sua, Appeal),
+    ),
+    'admin_activities': Tab(
+        'admin_activities', activities, ActivityForAdminReadSerializer,
+        'sua/adminindex_tabs/activities_rows.html', (Activity, Sua, Publicity),
+    ),
+    'admin_applications': Tab(
+        'admin_applications', applications, ApplicationReadSerializer,
+        'sua/adminindex_tabs/applications_rows.html', versions.MODELS,
+    ),
+    'admin_appeals': Tab(
+        'admin_appeals', appeals, AppealReadSerializer,
+        'sua/adminindex_tabs/appeals_rows.html', (Appeal, Publicity, Activity, Sua, Student),
+    ),
+    'deleted_students': Tab(
+        'admin_deleteds', deleteds(Student), StudentReadSerializer,
+        'sua/adminindex_tabs/deleted_students_rows.html', (Student, Sua, Appeal), show_deleted_at,
+    ),
+    'deleted_activities': Tab(
+        'admin_deleteds', deleteds(Activity), ActivityReadSerializer,
+        'sua/adminindex_tabs/deleted_activities_rows.html', (Activity, Sua, Publicity), show_deleted_at,
+        per_user=True,  # 同时是活动级管理员的管理员只看到自己活动的删除记录(tools.get_deleteds_queryset)
+    ),
+    'deleted_applications': Tab(
+        'admin_deleteds', deleteds(Application), ApplicationReadSerializer,
+        'sua/adminindex_tabs/deleted_applications_rows.html', versions.MODELS, show_deleted_at,
+        per_user=True,
+    ),
+    'deleted_appeals': Tab(
+        'admin_deleteds', deleteds(Appeal), AppealReadSerializer,
+        'sua/adminindex_tabs/deleted_appeals_rows.html', (Appeal, Publicity, Activity, Sua, Student), show_deleted_at,
+    ),
+}
+
+
+def visible_tabs(user):
+    """
+    当前用户可以查看的标签页
+    """
+    if user.is_staff:
+        return list(TABS)
+    if is_activity_admin(user):
+        return ['admin_activities', 'admin_applications', 'deleted_activities', 'deleted_applications']
+    return []
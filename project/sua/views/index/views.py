@@ -1,21 +1,27 @@
-from project.sua.models import Publicity,Activity,Application,Student,Appeal
+from project.sua.models import Publicity,Activity,Application,Student,Appeal,Sua
 
-from project.sua.serializers import PublicitySerializer
-from project.sua.serializers import SuaSerializer
-from project.sua.serializers import ApplicationSerializer
-from project.sua.serializers import AppealSerializer
+from project.sua.read_serializers import PublicityReadSerializer
+from project.sua.read_serializers import SuaReadSerializer
+from project.sua.read_serializers import ApplicationReadSerializer
+from project.sua.read_serializers import AppealReadSerializer
 from project.sua.serializers import AddAppealSerializer
 from project.sua.serializers import ActivitySerializer
 from project.sua.serializers import StudentSerializer
 
-from project.sua.views.admin.serializers import ActivityForAdminSerializer
-
+from project.sua import facets
+from project.sua import merge
+from project.sua import versions
+from project.sua.prefetch import optimize
+from project.sua.views.index import tabs
 from project.sua.views.utils.base import BaseView
 from project.sua.views.utils.mixins import NavMixin
 import project.sua.views.utils.tools as tools
 
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.http import HttpResponse
+
 from django.utils import timezone
-import datetime
 
 class IndexView(BaseView, NavMixin):
     template_name = 'sua/index.html'
@@ -27,207 +33,100 @@ class IndexView(BaseView, NavMixin):
         serialized = super(IndexView, self).serialize(request)
 
         user = request.user
-        deleteds = {}
-        publicity_set = Publicity.objects.filter(  # 获取在公示期内的所有公示
-            deleted_at=None,
-            is_published=True,
-            begin__lte=timezone.now(),
-            end__gte=timezone.now()
+        today = timezone.localdate()
+        publicities = versions.cached(  # 未结束的公示的序列化结果，按公示期筛选出在公示期内的
+            'publicities',
+            (Publicity, Activity, Sua, Student, Appeal),
+            request.build_absolute_uri('/'),
+            lambda: self.publicities(request, today),
         )
-        publicity_data = PublicitySerializer(  # 序列化公示
-            publicity_set,
-            many=True,
-            context={'request': request}
-        )
-
-        publicities = publicity_data.data
-        for publicity in publicities:
-            publicity['begin'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(publicity['begin']))
-            publicity['end'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(publicity['end']))
 
         serialized.update({
-            'publicities':publicities,
+            'publicities':[row for begin, end, row in publicities if begin <= today <= end],
             })
 
-        if user.is_staff or user.student.power == 1:
-
-            if user.is_staff:
-                application_set = Application.objects.filter(deleted_at=None).order_by('is_checked', '-created')# 获取所有申请,按时间的倒序排序
-            elif user.student.power == 1:
-                application_set = Application.objects.filter(
-                sua__activity__owner=user,
-                sua__activity__is_created_by_student=False,
-                deleted_at=None).order_by('-created')# 获取该学生创建的活动的申请
-
-            application_data = ApplicationSerializer(  # 序列化所有申请
-                application_set,
-                many=True,
-                context={'request': request}
-            )
-            applications = application_data.data
-            for application in applications:
-                application['created'] = tools.DateTime2String_SHOW(
-                    tools.TZString2DateTime(application['created']))
-            deleteds['applications'] = tools.get_deleteds(Application, ApplicationSerializer, request)
-
-            if user.is_staff:
-                activity_set = Activity.objects.filter(
-                    deleted_at=None,
-                    is_created_by_student=False,
-                    ).order_by('-created')  # 获取所有当前管理员创建的活动
-            elif user.student.power == 1:
-                activity_set = Activity.objects.filter(
-                    owner=user,
-                    deleted_at=None,
-                    is_created_by_student=False,
-                    ).order_by('-created')                # 获取该活动级管理员创建的活动
-
-            activity_data = ActivityForAdminSerializer(  # 序列化所有所有当前管理员创建的活动
-                activity_set,
-                many=True,
-                context={'request': request}
-            )
-
-            activities = activity_data.data
-            for activity in activities:
-                activity['date'] = tools.Date2String_SHOW(
-                    tools.TZString2DateTime(activity['date']))
-                for publicity in activity['publicities']:
-                    publicity['begin'] = tools.DateTime2String_SHOW(
-                        tools.TZString2DateTime(publicity['begin']))
-                    publicity['end'] = tools.DateTime2String_SHOW(
-                        tools.TZString2DateTime(publicity['end']))
-            deleteds['activities'] = tools.get_deleteds(Activity, ActivitySerializer, request)
-
+        names = tabs.visible_tabs(user)
+        if names:  # 管理端标签页只渲染记录数，表格由IndexTabView按需加载
+            active = request.GET.get('tab')
             serialized.update({
-                'admin_applications':applications,
-                'admin_activities':activities,
+                'tab_counts': dict((name, tabs.TABS[name].count(request)) for name in names),
+                'active_tab': {
+                    'name': active,
+                    'query': tabs.query_string(request),
+                    'html': tabs.TABS[active].render(active, request),
+                } if active in names else None,
             })
 
         if user.is_staff:
-            classtypes =set([])
-            grades =set([])
-            student_all = Student.objects.filter(deleted_at=None,).order_by('number') #获取所有学生
-            for student in student_all:
-                classtypes.add(student.classtype)
-                grades.add(student.grade)
-
-            if 'classtype' and 'grade' in request.GET:
-                classtype = request.GET.get('classtype')
-                grade = request.GET.get('grade')
-                student_set = Student.objects.filter(deleted_at=None,classtype=classtype,grade=grade).order_by('number')
-            else:
-                student_set = Student.objects.filter(deleted_at=None,).order_by('number')  # 获取筛选的学生
-
-            student_data = StudentSerializer(  # 序列化所有学生信息
-                student_set,
-                many=True,
-                context={'request': request}
-            )
-
-            deleteds['students'] = tools.get_deleteds(Student, StudentSerializer, request)
-
-            appeal_set = Appeal.objects.filter(deleted_at=None).order_by(
-                'is_checked', '-created')  # 获取在公示期内的所有申诉
-            appeal_data = AppealSerializer(  # 序列化申诉
-                appeal_set,
-                many=True,
-                context={'request': request}
-            )
-            appeals = appeal_data.data
-            for appeal in appeals:
-                appeal['created'] = tools.DateTime2String_SHOW(
-                    tools.TZString2DateTime(appeal['created']))
-
-            deleteds['appeals'] = tools.get_deleteds(Appeal, AppealSerializer, request)
-
             serialized.update({
-                'admin_appeals': appeals,
-                'admin_students': student_data.data,
-                'classtypes':classtypes,
-                'grades':grades,
+                'student_facets': facets.student_facets(),
             })
 
         if hasattr(user,'student'):
 
             student = user.student
 
-            application_data = ApplicationSerializer(  # 序列化当前用户的所有申请
+            application_data = ApplicationReadSerializer(  # 序列化当前用户的所有申请
                 user.applications.filter(deleted_at=None).order_by('-created'),
                 many=True,
                 context={'request': request}
             )
 
-            applications = application_data.data
-            for application in applications:
-                application['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(application['created']))
-
-            if 'year_begin' not in request.GET:
-                sua_data = SuaSerializer(  # 序列化当前学生的所有公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True),
-                    many=True,
-                    context={'request': request}
-                )
-            else:
-                year_begin = int(request.GET['year_begin'])
-                year_end = int(request.GET['year_end'])
-                start_date = datetime.date(year_begin, 8, 1)
-                end_date = datetime.date(year_end, 8, 1)
-                sua_data = SuaSerializer(# 序列化当前学生的某段学年的公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,
-                        activity__is_valid=True,
-                        activity__date__range=(start_date, end_date)
-                    ),
-                    many=True,
-                    context={'request': request}
-                )
+            years = tools.get_academic_years(request)
+            sua_data = SuaReadSerializer(  # 序列化当前学生的(某段学年的)公益时记录
+                tools.get_valid_suas(student, years),
+                many=True,
+                context={'request': request}
+            )
+            if years is not None:
                 serialized.update({
-                    'year_begin':year_begin,
-                    'year_end':year_end
+                    'year_begin':years[0],
+                    'year_end':years[1],
                 })
-            suas = sua_data.data
-            # print(suas)
-            for sua in suas:
-                sua['activity']['date'] = tools.Date2String_SHOW(tools.TZString2Date(sua['activity']['date']))
-
-            appeal_data = AppealSerializer(  # 序列化当前学生的所有申诉
+            appeal_data = AppealReadSerializer(  # 序列化当前学生的所有申诉
                 student.appeals.filter(deleted_at=None),
                 many=True,
                 context={'request': request}
             )
 
-            appeals = appeal_data.data
-            for appeal in appeals:
-                appeal['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(appeal['created']))
-
             serialized.update({
-                'applications': applications,
+                'applications': application_data.data,
                 'suas': sua_data.data,
                 'appeals': appeal_data.data,
             })
-        serialized.update({
-            'deleteds': deleteds,
-        })
         return serialized
 
+    def publicities(self, request, today):
+        publicity_set = list(optimize(Publicity.objects.filter(  # 获取未结束的所有公示
+            deleted_at=None,
+            is_published=True,
+            end__gte=today
+        ), PublicityReadSerializer()))
+        publicity_data = PublicityReadSerializer(  # 序列化公示
+            publicity_set,
+            many=True,
+            context={'request': request}
+        )
+        return [
+            (publicity.begin, publicity.end, row)
+            for publicity, row in zip(publicity_set, publicity_data.data)
+        ]
+
     def deserialize(self, request, *args, **kwargs):
         if request.user.is_staff:
-            merge_applications = []
-            applications = Application.objects.filter(deleted_at=None,).all()
-            for application in applications:
-                if str(application.id) in request.data:
-                    merge_applications.append(application)
-            if 'activity_id' in request.data:
-                activity = Activity.objects.filter(id=request.data['activity_id'],deleted_at=None).get()
-            elif bool(merge_applications):
-                activity = merge_applications[0].sua.activity
-            #print(activity)
-            for i in range(len(merge_applications)):
-                sua = Sua.objects.filter(deleted_at=None,application=merge_applications[i]).update(activity=activity)
-            #    print(sua)
-                #sua.save(activity=activity)
-                #else:
-                    #return False
-            #print(1)
-            self.url=""
+            job = merge.enqueue_posted(request.data, request.user)
+            self.url = merge.STATUS_URL % job.pk
             return True
+
+
+class IndexTabView(BaseView):
+    """
+    首页管理端标签页的一页表格行，?page=页码，其余参数作为筛选条件
+    """
+    def get(self, request, *args, **kwargs):
+        name = kwargs['name']
+        if name not in tabs.TABS:
+            raise Http404
+        if name not in tabs.visible_tabs(request.user):
+            raise PermissionDenied
+        return HttpResponse(tabs.TABS[name].render(name, request))
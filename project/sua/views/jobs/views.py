@@ -0,0 +1,39 @@
+import os
+
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, JsonResponse
+
+from project.sua import jobs
+from project.sua.models import Job
+
+
+def get_job(request, pk):
+    # 只有任务的提交者和管理员可以查看
+    job = Job.objects.filter(pk=pk).first()
+    if job is None:
+        raise Http404
+    if not (request.user.is_staff or job.owner_id == request.user.id):
+        raise PermissionDenied
+    return job
+
+
+def JobView(request, *args, **kwargs):
+    """
+    任务状态，页面轮询直到status为done或failed
+    """
+    job = get_job(request, kwargs['pk'])
+    return JsonResponse(jobs.status(job))
+
+
+def JobFileView(request, *args, **kwargs):
+    """
+    下载已完成的任务生成的文件
+    """
+    job = get_job(request, kwargs['pk'])
+    result = jobs.status(job)['result']
+    if job.status != Job.DONE or not isinstance(result, dict) or not result.get('file'):
+        raise Http404
+    response = FileResponse(jobs.files.open(result['file']), content_type='application/octet-stream')
+    response['Content-Length'] = jobs.files.size(result['file'])
+    response['Content-Disposition'] = 'attachment; filename=%s' % os.path.basename(result['file'])
+    return response
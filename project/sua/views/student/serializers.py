@@ -1,29 +1,30 @@
 from rest_framework import serializers
+from project.sua.prefetch import PrefetchMixin
 from project.sua.models import Activity, Proof, Sua, Application
 
 
-class DEActivityForAddApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class DEActivityForAddApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Activity
         fields = ('url','title', 'detail', 'group', 'date')
 
 
-class DESuaForAddApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class DESuaForAddApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Sua
         fields = ('url','team', 'suahours')
 
 
-class DEProofForAddApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class DEProofForAddApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Proof
         fields = ('url','is_offline', 'proof_file')
 
 
-class DEAddApplicationsSerializer(serializers.HyperlinkedModelSerializer):
+class DEAddApplicationsSerializer(PrefetchMixin, serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Application
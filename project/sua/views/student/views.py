@@ -1,7 +1,5 @@
-import os
-import datetime
-
 from django.utils import timezone
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse
 from django.contrib.auth import authenticate
 
@@ -27,10 +25,8 @@ import project.sua.views.utils.tools as tools
 from project.sua.views.form.serializers import AddPublicitySerializer
 
 from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
 
-from reportlab.pdfbase.ttfonts import TTFont
+from project.sua import transcript
 
 from django.contrib.auth.models import User
 
@@ -79,28 +75,16 @@ class IndexView(BaseView, NavMixin):
 
         if hasattr(user, 'student'):  # 判断当前用户是否为学生
             student = user.student
-            if 'year_begin' not in request.GET:
-                sua_data = SuaSerializer(  # 序列化当前学生的所有公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True),
-                    many=True,
-                    context={'request': request}
-                )
-            else:
-                year_begin = int(request.GET['year_begin'])
-                year_end = int(request.GET['year_end'])
-                start_date = datetime.date(year_begin, 8, 1)
-                end_date = datetime.date(year_end, 8, 1)
-                sua_data = SuaSerializer(# 序列化当前学生的某段学年的公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,
-                        activity__is_valid=True,
-                        activity__date__range=(start_date, end_date)
-                    ),
-                    many=True,
-                    context={'request': request}
-                )
+            years = tools.get_academic_years(request)
+            sua_data = SuaSerializer(  # 序列化当前学生的(某段学年的)公益时记录
+                tools.get_valid_suas(student, years),
+                many=True,
+                context={'request': request}
+            )
+            if years is not None:
                 serialized.update({
-                    'year_begin':year_begin,
-                    'year_end':year_end
+                    'year_begin':years[0],
+                    'year_end':years[1],
                 })
             suas = sua_data.data
             # print(suas)
@@ -204,130 +188,42 @@ class SuasExportView(BaseView,NavMixin):
         user = request.user
         if hasattr(user, 'student'):  # 判断当前用户是否为学生
             student = user.student
-            if 'year_begin' not in request.GET:
-                sua_data = SuaSerializer(  # 序列化当前学生的所有公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True),
-                    many=True,
-                    context={'request': request}
-                )
-            else:
-                year_begin = int(request.GET['year_begin'])
-                year_end = int(request.GET['year_end'])
-                start_date = datetime.date(year_begin, 8, 1)
-                end_date = datetime.date(year_end, 8, 1)
-                sua_data = SuaSerializer(# 序列化当前学生的某段学年的公益时记录
-                    student.suas.filter(deleted_at=None,is_valid=True,
-                        activity__is_valid=True,
-                        activity__date__range=(start_date, end_date)
-                    ),
-                    many=True,
-                    context={'request': request}
-                )
+            years = tools.get_academic_years(request)
+            sua_data = SuaSerializer(  # 序列化当前学生的(某段学年的)公益时记录
+                tools.get_valid_suas(student, years),
+                many=True,
+                context={'request': request}
+            )
+            if years is not None:
                 serialized.update({
-                    'year_begin':year_begin,
-                    'year_end':year_end
+                    'year_begin':years[0],
+                    'year_end':years[1],
                     })
-            # print(IndexView)
-            # sua_data = SuaSerializer(# 序列化当前学生的某学年的公益时记录
-            #     student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True,),
-            #     many=True,
-            #     context={'request': request}
-            #     )
 
         serialized.update({
             'suas': sua_data.data,
             'name':student.name,
             'number':student.number,
-            'hours':student.totalhours,
+            'hours':tools.get_total_hours(student, years),
             })
 
 
         return serialized
 
 def Download(request):
-
-    pdfmetrics.registerFont(TTFont('song', os.getcwd() + '/project/sua/views/student/STSONG.ttf'))
     user = request.user
-    if hasattr(user, 'student'):  # 判断当前用户是否为学生
-        student = user.student
-        if 'year_begin' not in request.GET:
-            sua_data = SuaSerializer(  # 序列化当前学生的所有公益时记录
-                student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True),
-                many=True,
-                context={'request': request}
-            )
-            #for sua in sua_data.data:
-                #sua['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(sua['created']))
-        else:
-            year_begin = int(request.GET['year_begin'])
-            year_end = int(request.GET['year_end'])
-            start_date = datetime.date(year_begin, 8, 1)
-            end_date = datetime.date(year_end, 8, 1)
-            sua_data = SuaSerializer(# 序列化当前学生的某段学年的公益时记录
-                student.suas.filter(deleted_at=None,is_valid=True,
-                    activity__is_valid=True,
-                    activity__date__range=(start_date, end_date)
-                ),
-                many=True,
-                context={'request': request}
-            )
-            #for sua in sua_data.data:
-                #sua['created'] = tools.DateTime2String_SHOW(tools.TZString2DateTime(sua['created']))
-    # student = user.student
-    # # Filename = 'str(student.name)'
-
-    # sua_data = SuaSerializer(# 序列化当前学生的所有公益时记录
-    #     student.suas.filter(deleted_at=None,is_valid=True,activity__is_valid=True),
-    #     many=True,
-    #     context={'request': request}
-    # )
-
-
-    response = HttpResponse(content_type='application/pdf')
+    if not hasattr(user, 'student'):  # 只有学生有公益时记录
+        raise PermissionDenied
+    student = user.student
+    years = tools.get_academic_years(request)
+    rows = tools.get_valid_suas(student, years).values_list(  # 当前学生的(某段学年的)公益时记录
+        'activity__title', 'activity__group', 'suahours',
+    )
+
+    # reportlab在save()时才生成整个PDF，一份记录只有几十KB，直接作为响应内容返回
+    pdf = transcript.render_pdf((user, student.name, tools.get_total_hours(student, years), rows))
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename=公益时'
-
-    buffer = BytesIO()
-    zuo = 50
-    kuan = 210
-    you = 545
-    p = canvas.Canvas(buffer)
-
-    p.filename = student.name
-
-    p.setFont("song", 22)#字号
-    p.drawString(zuo-5,780,"公益时记录",)#标题
-    p.drawImage('project/sua/static/sua/images/logo-icon.png',460,705,width=90,height=90)#学院标志
-    p.setFont("song", 15) #字号
-    p.drawString(zuo-5,750,'学号:'+str(user))#学号
-    p.drawString(zuo+150,750,'名字:'+str(student.name))#名字
-    p.drawString(zuo-5,720,'总公益时数:'+str(student.suahours)+'h')#总公益时
-
-    location = 640
-    p.drawString(zuo,680,"活动名称")
-    p.drawString(zuo+kuan,680,"活动团体")
-    p.drawString(zuo+kuan*2,680,"公益时数")
-    for sua in sua_data.data:
-        p.drawString(zuo,location,str(sua['activity']['title']))#活动主题
-        p.drawString(zuo+kuan,location,str(sua['activity']['group']))#活动团体
-        p.drawString(zuo+kuan*2,location,str(sua['suahours'])+'h')#公益时数
-        location -= 50
-        p.line(zuo-5,location+15,you,location+15)#第N横
-
-
-    p.line(zuo-5,700,you,700)#第一横
-    p.line(zuo-5,655,you,655)#第二横
-    p.line(zuo-5,700,zuo-5,location+15)#第一丨
-    p.line(you,700,you,location+15)#第四丨
-    p.line(zuo+kuan-5,700,zuo+kuan-5,location+15)#第二丨
-    p.line(zuo+2*kuan-5,700,zuo+2*kuan-5,location+15)#第三丨
-
-
-    p.showPage()
-    p.save()
-
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
     return response
 
 
@@ -52,5 +52,5 @@ class BaseView(APIView):
             return None
         args = self.request.META.get('QUERY_STRING', '')
         if args:
-            url = "%s?%s" % (url, args)
+            url = "%s%s%s" % (url, '&' if '?' in url else '?', args)
         return url
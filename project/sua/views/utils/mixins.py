@@ -1,17 +1,10 @@
-from project.sua.serializers import UserSerializer, StudentSerializer
+from project.sua import navs
 import project.sua.views.utils.tools as tools
 
 
 class NavMixin(object):
     def nav(self, request, *args, **kwargs):
-        navs = {}
-        user = request.user
-        student = None
-        if hasattr(user, 'student'):
-            student = user.student
-        userSerializer = UserSerializer(user, context={'request': request})
-        studentSerializer = StudentSerializer(student, context={'request': request})
-        navs['user'] = userSerializer.data
-        navs['student'] = studentSerializer.data
-        navs['YEAR_CHOICES'] = tools.YEAR_CHOICES
-        return navs
+        # 用户和学生的字段见project/sua/navs.py，学生部分按学生缓存
+        serialized = navs.nav(request)
+        serialized['YEAR_CHOICES'] = tools.YEAR_CHOICES
+        return serialized
@@ -42,8 +42,10 @@ def DateTime2String_VALUE(date):
     return date.strftime(DATETIME_FORMAT_VALUE)
 
 
-def get_deleteds(model, serializer, request):
+def get_deleteds_queryset(model, request):
+    # 当前用户可以查看的删除记录，没有权限时返回None
     user = request.user
+    set = None
     if user.is_staff:
         set = model.objects.order_by('-deleted_at').exclude(deleted_at=None)
     if hasattr(user,'student'):
@@ -52,7 +54,11 @@ def get_deleteds(model, serializer, request):
                 set = model.objects.filter(owner=user).order_by('-deleted_at').exclude(deleted_at=None)
             elif model == myModels.Application:
                 set = model.objects.filter(sua__activity__owner=user).order_by('-deleted_at').exclude(deleted_at=None)
-            
+    return set
+
+
+def get_deleteds(model, serializer, request):
+    set = get_deleteds_queryset(model, request)
     set_data = serializer(
         set,
         many=True,
@@ -74,6 +80,29 @@ def sort_by_deletedAt(elem):
 
 
 
+def get_academic_years(request):
+    # 从请求参数中读取学年区间(year_begin, year_end)，没有指定则返回None
+    if 'year_begin' not in request.GET:
+        return None
+    return int(request.GET['year_begin']), int(request.GET['year_end'])
+
+
+def get_valid_suas(student, years=None):
+    # 学生的有效公益时记录，years不为None时只取该学年区间内的记录
+    suas = student.get_suas()
+    if years is not None:
+        start_date, end_date = myModels.academic_year_dates(*years)
+        suas = suas.filter(activity__date__gte=start_date, activity__date__lt=end_date)
+    return suas
+
+
+def get_total_hours(student, years=None):
+    # 学生的公益时总数，years不为None时从学年汇总表读取该学年区间的总数
+    if years is None:
+        return student.suahours
+    return student.hours_between(*years)
+
+
 #计算传入的suas列表的公益时数总和
 def TotalSuahours(suas):
     total_suahours = 0